@@ -8,13 +8,19 @@ import os
 import socket
 import sqlite3
 import time
+import threading
 import uuid
+from collections import OrderedDict
 from contextlib import contextmanager
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
 
 SCHEMA_VERSION = 3
 PROMPT_VERSION = 1
+# 每个线程按数据库路径缓存连接；worker 流式写入时避免反复建连和编译语句。
+POOL_SIZE_PER_THREAD = 4
+STATEMENT_CACHE_SIZE = 256
+_pool_local = threading.local()
 YOUTUBE_HOSTS = {
     'youtube.com',
     'www.youtube.com',
@@ -183,18 +189,117 @@ def source_key(extractor, extractor_id):
     return f'{str(extractor).strip().lower()}:{str(extractor_id).strip()}'
 
 
+class _PooledConnection:
+    def __init__(self, db_path):
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(
+            db_path,
+            timeout=10,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.execute('PRAGMA busy_timeout = 10000')
+        self.pid = os.getpid()
+        self.identity = _file_identity(db_path)
+        self.in_use = False
+
+    def close(self):
+        try:
+            self.connection.close()
+        except sqlite3.Error:
+            pass
+
+
+def _file_identity(db_path):
+    try:
+        stat_result = os.stat(db_path)
+    except OSError:
+        return None
+    return stat_result.st_dev, stat_result.st_ino
+
+
+def _thread_pool():
+    pool = getattr(_pool_local, 'connections', None)
+    if pool is None or getattr(_pool_local, 'pid', None) != os.getpid():
+        # fork 后继承的连接不能在子进程中继续使用，直接丢弃而不是关闭。
+        pool = OrderedDict()
+        _pool_local.connections = pool
+        _pool_local.pid = os.getpid()
+    return pool
+
+
+def _checkout(db_path):
+    """取出当前线程缓存的连接；数据库文件被替换或连接失效时重新打开。"""
+    pool = _thread_pool()
+    pooled = pool.get(db_path)
+    if pooled is not None:
+        if pooled.in_use:
+            return None
+        if pooled.identity is not None and pooled.identity == _file_identity(db_path):
+            pool.move_to_end(db_path)
+            return pooled
+        pooled.close()
+        del pool[db_path]
+    pooled = _PooledConnection(db_path)
+    pool[db_path] = pooled
+    for path in [
+        path for path, cached in pool.items()
+        if path != db_path and not cached.in_use
+    ]:
+        if len(pool) <= POOL_SIZE_PER_THREAD:
+            break
+        pool.pop(path).close()
+    return pooled
+
+
+def close_connections():
+    """关闭当前线程缓存的全部连接。"""
+    pool = _thread_pool()
+    for pooled in pool.values():
+        if not pooled.in_use:
+            pooled.close()
+    pool.clear()
+
+
 @contextmanager
 def connect(db_path):
-    directory = os.path.dirname(os.path.abspath(db_path))
-    os.makedirs(directory, exist_ok=True)
-    connection = sqlite3.connect(db_path, timeout=10)
-    connection.row_factory = sqlite3.Row
-    connection.execute('PRAGMA foreign_keys = ON')
-    connection.execute('PRAGMA busy_timeout = 10000')
+    """返回当前线程复用的连接；嵌套调用时临时打开独立连接。
+
+    退出时若仍有未提交事务则回滚，保持与每次新建连接相同的语义。
+    """
+    pooled = _checkout(db_path)
+    if pooled is None:
+        pooled = _PooledConnection(db_path)
+        try:
+            yield pooled.connection
+        finally:
+            pooled.close()
+        return
+
+    pooled.in_use = True
+    connection = pooled.connection
+    healthy = True
     try:
         yield connection
+    except sqlite3.Error:
+        healthy = False
+        raise
     finally:
-        connection.close()
+        pooled.in_use = False
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error:
+            healthy = False
+        if healthy and pooled.identity is None:
+            pooled.identity = _file_identity(db_path)
+        if not healthy or pooled.identity is None:
+            pooled.close()
+            pool = _thread_pool()
+            if pool.get(db_path) is pooled:
+                del pool[db_path]
 
 
 def init_db(db_path):
@@ -429,7 +534,8 @@ def create_url_job(db_path, request_url, normalized_url, profile_key):
         )
         job = db.execute('SELECT * FROM ai_summary_jobs WHERE id = ?', (job_id,)).fetchone()
         db.commit()
-        return {'summary': None, 'job': dict(job)}
+    notify_workers(db_path)
+    return {'summary': None, 'job': dict(job)}
 
 
 def create_local_job(
@@ -479,7 +585,8 @@ def create_local_job(
         )
         job = db.execute('SELECT * FROM ai_summary_jobs WHERE id = ?', (job_id,)).fetchone()
         db.commit()
-        return {'summary': None, 'job': dict(job)}
+    notify_workers(db_path)
+    return {'summary': None, 'job': dict(job)}
 
 
 def get_job(db_path, job_id):
@@ -497,6 +604,51 @@ def get_job(db_path, job_id):
         return job
 
 
+def wakeup_socket_path(db_path):
+    return f'{db_path}.wakeup.sock'
+
+
+def notify_workers(db_path):
+    """通知等待中的 worker 有新任务；没有 worker 监听时静默忽略。"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as notifier:
+            notifier.setblocking(False)
+            notifier.sendto(b'1', wakeup_socket_path(db_path))
+        return True
+    except OSError:
+        return False
+
+
+def next_job_due_at(db_path):
+    """只读查询下一次需要领取任务的时间：最早可执行的排队任务或最早过期的租约。"""
+    with connect(db_path) as db:
+        row = db.execute(
+            """
+            SELECT MIN(due_at) FROM (
+                SELECT MIN(next_attempt_at) AS due_at FROM ai_summary_jobs
+                WHERE status = 'queued'
+                UNION ALL
+                SELECT MIN(lease_until) FROM ai_summary_jobs
+                WHERE status IN ('resolving', 'downloading_subtitle', 'generating')
+                  AND lease_until IS NOT NULL
+            )
+            """
+        ).fetchone()
+        return row[0]
+
+
+def get_job_marker(db_path, job_id):
+    """只读取判断任务是否变化所需的字段，不取出总结正文。"""
+    with connect(db_path) as db:
+        row = db.execute(
+            'SELECT status, stream_revision, updated_at FROM ai_summary_jobs WHERE id = ?',
+            (job_id,),
+        ).fetchone()
+        return tuple(row) if row else None
+
+
 def claim_next_job(db_path, worker_id, lease_seconds=180):
     timestamp = now_ts()
     with connect(db_path) as db:
@@ -666,11 +818,15 @@ def fail_or_retry_job(
     error_message,
     retryable,
     max_attempts=3,
+    retry_after=None,
 ):
+    """记录失败；可重试时按指数退避重新排队，retry_after 为接口要求的最短等待秒数。"""
     timestamp = now_ts()
     retry = retryable and attempts < max_attempts
     if retry:
         delay = 5 * (4 ** max(0, attempts - 1))
+        if retry_after is not None:
+            delay = max(delay, int(retry_after))
         status = 'queued'
         completed_at = None
         next_attempt_at = timestamp + delay
@@ -10,13 +10,16 @@ import shutil
 import socket
 import subprocess
 import tempfile
+import threading
 import time
 import uuid
+from email.utils import parsedate_to_datetime
 
 import requests
 from werkzeug.utils import safe_join
 
 import ai_summary_store as store
+import ytdlp_engine
 from config_util import load_config
 from downloader import (
     SUBTITLE_LANGUAGE_PREFERENCES,
@@ -41,6 +44,101 @@ SUBTITLE_TIMESTAMP_PATTERN = re.compile(
 SUBTITLE_MAX_CHARS = 120000
 JOB_LEASE_SECONDS = 600
 SUBTITLE_EXTENSIONS = {'.ass', '.srt', '.ssa', '.ttml', '.vtt'}
+# 有唤醒套接字时空闲最长等待时间；套接字不可用时的轮询间隔。
+IDLE_WAIT_SECONDS = 30
+POLL_FALLBACK_SECONDS = 1
+
+
+class ProviderRateLimiter:
+    """单个 AI 接口（base_url + model）的令牌桶。
+
+    rate_per_minute 为 0 时不限制请求速率；收到 429 时按 Retry-After
+    暂停该接口的全部请求，避免并发 worker 继续撞限流。
+    """
+
+    def __init__(self, rate_per_minute, burst):
+        self.rate_per_second = max(0.0, float(rate_per_minute or 0)) / 60
+        self.capacity = max(1, int(burst or 1))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, current_time):
+        if self.rate_per_second:
+            elapsed = current_time - self.updated_at
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_second)
+        self.updated_at = current_time
+
+    def reserve(self):
+        """占用一个令牌并返回需要等待的秒数。"""
+        with self.lock:
+            current_time = time.monotonic()
+            wait_seconds = max(0.0, self.blocked_until - current_time)
+            if not self.rate_per_second:
+                return wait_seconds
+            self._refill(current_time)
+            self.tokens -= 1
+            if self.tokens < 0:
+                wait_seconds = max(wait_seconds, -self.tokens / self.rate_per_second)
+            return wait_seconds
+
+    def acquire(self):
+        wait_seconds = self.reserve()
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+    def block_for(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+_provider_limiters = {}
+_provider_limiters_lock = threading.Lock()
+
+
+def provider_limiter():
+    key = (
+        str(config.get('AI_API_BASE_URL') or '').strip(),
+        str(config.get('AI_API_MODEL') or '').strip(),
+    )
+    with _provider_limiters_lock:
+        limiter = _provider_limiters.get(key)
+        if limiter is None:
+            limiter = ProviderRateLimiter(
+                config.get('AI_API_RATE_LIMIT_PER_MINUTE', 0),
+                worker_concurrency(),
+            )
+            _provider_limiters[key] = limiter
+        return limiter
+
+
+def worker_concurrency():
+    try:
+        return max(1, int(config.get('AI_SUMMARY_WORKER_CONCURRENCY', 1)))
+    except (TypeError, ValueError):
+        return 1
+
+
+def parse_retry_after(response):
+    """解析 Retry-After 的秒数或 HTTP 日期格式；缺失或非法时返回 None。"""
+    if response is None:
+        return None
+    value = str(response.headers.get('Retry-After') or '').strip()
+    if not value:
+        return None
+    try:
+        return max(0, int(float(value)))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0, int(retry_at.timestamp() - time.time()))
 
 
 class JobFailure(Exception):
@@ -74,12 +172,7 @@ def run_yt_dlp_metadata(source_url, conf_path=None):
         source_url,
     ]
     try:
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            timeout=120,
-        )
+        result = ytdlp_engine.run(command, config, timeout=120)
     except (OSError, subprocess.TimeoutExpired) as exc:
         raise JobFailure('extractor_unavailable', '暂时无法读取页面信息', True) from exc
     if result.returncode != 0:
@@ -167,12 +260,7 @@ def download_subtitles(source_url, language, destination_dir, conf_path=None):
         source_url,
     ]
     try:
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            timeout=180,
-        )
+        result = ytdlp_engine.run(command, config, timeout=180)
     except (OSError, subprocess.TimeoutExpired) as exc:
         raise JobFailure('subtitle_download_failed', '字幕下载暂时失败', True) from exc
     if result.returncode != 0:
@@ -425,6 +513,9 @@ def generate_and_save(job, prepared):
         last_stream_write['time'] = current_time
         last_stream_write['length'] = len(partial_markdown)
 
+    waited = provider_limiter().acquire()
+    if waited:
+        logger.info('AI 接口限流，等待 %.1f 秒: job_id=%s', waited, job['id'])
     try:
         summary = app_module.request_ai_summary(
             title,
@@ -476,10 +567,10 @@ def process_job(job):
         shutil.rmtree(temp_dir, ignore_errors=True)
 
 
-def run_once():
+def run_once(worker_id=WORKER_ID):
     job = store.claim_next_job(
         config['AI_SUMMARY_DB_PATH'],
-        WORKER_ID,
+        worker_id,
         lease_seconds=JOB_LEASE_SECONDS,
     )
     if not job:
@@ -510,6 +601,9 @@ def run_once():
     except requests.HTTPError as exc:
         status_code = exc.response.status_code if exc.response is not None else None
         retryable = status_code == 429 or (status_code is not None and status_code >= 500)
+        retry_after = parse_retry_after(exc.response) if status_code == 429 else None
+        if retry_after is not None:
+            provider_limiter().block_for(retry_after)
         retry = store.fail_or_retry_job(
             config['AI_SUMMARY_DB_PATH'],
             job['id'],
@@ -517,6 +611,7 @@ def run_once():
             'ai_request_failed' if retryable else 'ai_request_rejected',
             'AI 接口请求失败' if retryable else 'AI 接口拒绝了总结请求',
             retryable,
+            retry_after=retry_after,
         )
         logger.warning(
             'AI 总结接口 HTTP 失败，任务%s%s (status=%s)',
@@ -552,22 +647,137 @@ def run_once():
     return True
 
 
+class JobWakeup:
+    """等待新任务通知：监听 <数据库>.wakeup.sock 上的 Unix 数据报。
+
+    Web 端创建任务后发送一个字节唤醒 worker；套接字不可用（平台不支持、
+    路径过长或已有其他 worker 监听）时退化为短间隔轮询。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.path = store.wakeup_socket_path(db_path)
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.listener = None
+        self.stopped = False
+        try:
+            self.listener = self._bind()
+        except OSError as exc:
+            logger.warning('无法监听 AI 任务唤醒套接字，改为轮询: %s (%s)', self.path, exc)
+        if self.listener is not None:
+            threading.Thread(
+                target=self._receive,
+                name='ai-summary-wakeup',
+                daemon=True,
+            ).start()
+
+    @property
+    def max_idle_seconds(self):
+        return IDLE_WAIT_SECONDS if self.listener is not None else POLL_FALLBACK_SECONDS
+
+    def _bind(self):
+        if not hasattr(socket, 'AF_UNIX'):
+            return None
+        if os.path.exists(self.path):
+            if store.notify_workers(self.db_path):
+                logger.info('其他 AI 总结 worker 正在监听唤醒套接字，当前进程使用轮询')
+                return None
+            os.unlink(self.path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            listener.bind(self.path)
+        except OSError:
+            listener.close()
+            raise
+        return listener
+
+    def _receive(self):
+        while not self.stopped:
+            try:
+                self.listener.recv(64)
+            except OSError:
+                if self.stopped:
+                    return
+                time.sleep(1)
+                continue
+            self.notify()
+
+    def notify(self):
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+
+    def wait(self, seen_generation, timeout):
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.generation != seen_generation or self.stopped,
+                timeout=max(0, timeout),
+            )
+
+    def close(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.listener is not None:
+            self.listener.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def seconds_until_next_job(db_path, max_idle_seconds):
+    """根据 next_attempt_at 与租约到期时间计算需要休眠的秒数。"""
+    due_at = store.next_job_due_at(db_path)
+    if due_at is None:
+        return max_idle_seconds
+    return min(max_idle_seconds, max(0, due_at - time.time()))
+
+
+def worker_loop(worker_id, wakeup, stop_event):
+    """单个并发槽位：有到期任务时领取，否则等待唤醒或下一次到期时间。"""
+    db_path = config['AI_SUMMARY_DB_PATH']
+    while not stop_event.is_set():
+        seen_generation = wakeup.generation
+        try:
+            delay = seconds_until_next_job(db_path, wakeup.max_idle_seconds)
+            if delay <= 0:
+                if run_once(worker_id):
+                    continue
+                # 任务已被其他槽位领取，或租约刚好到期尚未满足严格小于条件。
+                delay = 1
+        except Exception:
+            logger.exception('AI 总结 worker 领取任务失败: %s', worker_id)
+            delay = 1
+        wakeup.wait(seen_generation, delay)
+
+
 def main():
     store.init_db(config['AI_SUMMARY_DB_PATH'])
-    logger.info('AI 总结 worker 已启动: %s', WORKER_ID)
-    last_cleanup = 0
-    while True:
-        timestamp = store.now_ts()
-        if timestamp - last_cleanup >= 86400:
+    concurrency = worker_concurrency()
+    logger.info('AI 总结 worker 已启动: %s (并发 %s)', WORKER_ID, concurrency)
+    stop_event = threading.Event()
+    wakeup = JobWakeup(config['AI_SUMMARY_DB_PATH'])
+    for index in range(concurrency):
+        threading.Thread(
+            target=worker_loop,
+            args=(f'{WORKER_ID}/{index}', wakeup, stop_event),
+            name=f'ai-summary-worker-{index}',
+            daemon=True,
+        ).start()
+    try:
+        while True:
             removed = store.cleanup_jobs(
                 config['AI_SUMMARY_DB_PATH'],
                 config.get('AI_SUMMARY_JOB_RETENTION_DAYS', 30),
             )
             if removed:
                 logger.info('已清理 %s 条过期 AI 总结任务', removed)
-            last_cleanup = timestamp
-        if not run_once():
-            time.sleep(1)
+            stop_event.wait(86400)
+    finally:
+        stop_event.set()
+        wakeup.close()
 
 
 if __name__ == '__main__':
@@ -1,18 +1,22 @@
 #!venv/bin/python
-from flask import Flask, request, render_template, redirect, url_for, send_from_directory, jsonify, abort, Response, stream_with_context
+from flask import Flask, request, render_template, redirect, url_for, send_from_directory, jsonify, abort, Response, stream_with_context, g, has_request_context
 import os
 import glob
 import html
 import time
 import json
 import re
+import sqlite3
 import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from urllib.parse import parse_qs, unquote, urlparse
 import hashlib
 import hmac
 from werkzeug.utils import safe_join
-from config_util import load_config
+from config_util import QUEUE_SNAPSHOT_FILENAME, load_config
 import random
 import string
 import pytz
@@ -20,7 +24,18 @@ from datetime import datetime
 import requests
 from requests.auth import HTTPBasicAuth
 from log_util import setup_logger
+from event_log import read_event
 import ai_summary_store
+import task_store
+import media_index
+import ytdlp_engine
+from task_progress import (
+    AUDIO_EXTENSIONS,
+    VIDEO_EXTENSIONS,
+    TaskProgressCursor,
+    progress_snapshot_path,
+    read_progress_snapshot,
+)
 import click
 from flask.cli import with_appcontext
 
@@ -46,25 +61,35 @@ URLS_DIR = config["URLS_DIR"]
 FILES_DIR = config["FILES_DIR"]
 # 兼容历史任务中曾使用过的数字随机后缀，同时限制为安全文件名字符。
 TASK_ID_PATTERN = re.compile(r'^[va][A-Za-z0-9_-]{1,127}$')
+PLAYLIST_JOB_ID_PATTERN = re.compile(r'^p[A-Za-z0-9_-]{1,127}$')
 TASK_STATE_EXTENSIONS = (
     ('.ok', 'completed'),
     ('.fail', 'failed'),
     ('.downloading', 'downloading'),
     ('.txt', 'queued'),
 )
+# 单次 /api/task_info 超过该耗时（毫秒）时记录警告，便于观察大批量轮询的尾延迟。
+TASK_INFO_SLOW_MS = 1000
+# /api/task_stream 的刷新节奏；同一任务的状态在 TTL 内被所有订阅者共享。
+TASK_STREAM_INTERVAL_SECONDS = 1.0
+TASK_STREAM_KEEPALIVE_SECONDS = 15
+TASK_STREAM_MAX_TASKS = 500
+# 订阅播放列表任务时会自动加入其逐集任务，总数不超过该上限。
+TASK_STREAM_MAX_EXPANDED_TASKS = 2000
+TASK_INFO_CACHE_TTL_SECONDS = 1.0
+TASK_INFO_CACHE_MAX_ENTRIES = 4096
+_task_info_cache = {}
+_task_info_cache_lock = threading.Lock()
+# /api/video_info 结果按规范化 URL 缓存；同一 URL 的并发请求只执行一次 yt-dlp。
+VIDEO_INFO_TIMEOUT_SECONDS = 60
+VIDEO_INFO_CACHE_TTL_SECONDS = 600
+VIDEO_INFO_CACHE_MAX_ENTRIES = 256
+# 每个 AI 总结任务只由一个观察线程读取数据库，订阅者数量不影响数据库负载。
+AI_SUMMARY_STREAM_POLL_SECONDS = 0.2
+_ai_summary_watchers = {}
+_ai_summary_watchers_lock = threading.Lock()
 DOWNLOADER_LOG_INITIAL_BYTES = 64 * 1024
 DOWNLOADER_LOG_MAX_BYTES = 128 * 1024
-PROGRESS_MARKER = 'PYDL_PROGRESS|'
-ANSI_ESCAPE_PATTERN = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]')
-DEFAULT_PROGRESS_PATTERN = re.compile(
-    r'\[download\]\s+(?P<percent>\d+(?:\.\d+)?)%'
-    r'(?:\s+of(?:\s+~)?\s+(?P<total>.+?))?'
-    r'(?:\s+at\s+(?P<speed>.+?))?'
-    r'(?:\s+ETA\s+(?P<eta>\S+))?$'
-)
-SUBTITLE_EXTENSIONS = {'ass', 'lrc', 'srt', 'ssa', 'ttml', 'vtt'}
-AUDIO_EXTENSIONS = {'aac', 'flac', 'm4a', 'mp3', 'ogg', 'opus', 'wav'}
-VIDEO_EXTENSIONS = {'avi', 'flv', 'mkv', 'mov', 'mp4', 'webm'}
 AUDIO_MIME_TYPES = {
     'aac': 'audio/aac',
     'flac': 'audio/flac',
@@ -140,11 +165,150 @@ def get_current_time():
 
 # 播放列表解析超时（秒）。解析依赖网络与 cookies，超时后明确报错而不是静默降级。
 PLAYLIST_RESOLVE_TIMEOUT_SECONDS = 60
+# 同一播放列表/频道标签页在 TTL 内重复提交直接复用解析结果。
+PLAYLIST_CACHE_TTL_SECONDS = 300
+PLAYLIST_CACHE_MAX_ENTRIES = 64
+# 频道标签页按发布时间倒序排列；上次结果不超过该时长时只解析首页并拼接新条目。
+PLAYLIST_INCREMENTAL_TABS = {'videos', 'shorts', 'streams'}
+PLAYLIST_INCREMENTAL_PAGE_SIZE = 30
+PLAYLIST_INCREMENTAL_MAX_AGE_SECONDS = 24 * 3600
+# 播放列表在后台线程中流式解析，每凑满一批或间隔一段时间就创建一批任务。
+PLAYLIST_JOB_WORKERS = 2
+PLAYLIST_JOB_BATCH_SIZE = 25
+PLAYLIST_JOB_FLUSH_SECONDS = 1.0
+PLAYLIST_JOB_TIMEOUT_SECONDS = 600
+# 解析中的任务超过该时长没有进展，视为进程重启等原因中断。
+PLAYLIST_JOB_STALE_SECONDS = PLAYLIST_JOB_TIMEOUT_SECONDS + 60
+_playlist_job_executor = ThreadPoolExecutor(
+    max_workers=PLAYLIST_JOB_WORKERS,
+    thread_name_prefix='playlist-job',
+)
 
 # 频道主页下被视为内容列表的标签页；community/about/search 等不算
 CHANNEL_CONTENT_TABS = {'videos', 'shorts', 'streams', 'podcasts', 'releases'}
 
 
+class SingleFlightCache:
+    """带 TTL 与容量上限（LRU 淘汰）的结果缓存；同一键的并发请求只加载一次。
+
+    过期记录在被淘汰前仍保留，供增量解析作为基准读取。加载失败或结果
+    不满足 should_cache 时不写入缓存，但会共享给同时等待的请求。
+    """
+
+    def __init__(self, ttl_seconds, max_entries, wait_timeout):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'shared': 0, 'evictions': 0}
+
+    def get(self, key, loader, should_cache=None):
+        """返回 (value, cache_status)；cache_status 为 hit、shared 或 miss。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[2], 'hit'
+        flight, leader = self.join(key)
+        if not leader:
+            return self.wait(flight), 'shared'
+
+        try:
+            value = loader()
+        except BaseException as exc:
+            self.complete(key, flight, error=exc)
+            raise
+        self.complete(
+            key,
+            flight,
+            value,
+            cache=should_cache is None or should_cache(value),
+        )
+        return value, 'miss'
+
+    def join(self, key):
+        """登记或加入同一键正在进行的加载，返回 (flight, leader)。
+
+        leader 为 True 时由调用方加载并调用 complete()；否则用 wait() 取得
+        leader 的结果。get() 与自行加载的调用方（如后台流式解析）共用同一张表。
+        """
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = {'done': threading.Event(), 'value': None, 'error': None}
+                self._inflight[key] = flight
+                self._stats['misses'] += 1
+            else:
+                self._stats['shared'] += 1
+        return flight, leader
+
+    def wait(self, flight, timeout=None):
+        """等待 leader 完成并返回其结果；leader 失败时抛出同一异常。"""
+        if not flight['done'].wait(self.wait_timeout if timeout is None else timeout):
+            raise TimeoutError('等待同一请求的结果超时')
+        if flight['error'] is not None:
+            raise flight['error']
+        return flight['value']
+
+    def complete(self, key, flight, value=None, error=None, cache=False):
+        """结束 join() 登记的加载：按需写入缓存并唤醒等待者。"""
+        flight['value'] = value
+        flight['error'] = error
+        if error is None and cache:
+            self.put(key, value)
+        with self._lock:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+        flight['done'].set()
+
+    def put(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def peek(self, key, max_age_seconds):
+        """读取不超过 max_age_seconds 的记录（可能已过 TTL），不存在返回 None。"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[1] <= max_age_seconds:
+            return entry[2]
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for key in self._stats:
+                self._stats[key] = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+            }
+
+
+_video_info_cache = SingleFlightCache(
+    VIDEO_INFO_CACHE_TTL_SECONDS,
+    VIDEO_INFO_CACHE_MAX_ENTRIES,
+    VIDEO_INFO_TIMEOUT_SECONDS + 5,
+)
+_playlist_cache = SingleFlightCache(
+    PLAYLIST_CACHE_TTL_SECONDS,
+    PLAYLIST_CACHE_MAX_ENTRIES,
+    PLAYLIST_RESOLVE_TIMEOUT_SECONDS * 2 + 5,
+)
+
+
 def _is_channel_content_path(path):
     """判断 YouTube 路径是否为频道主页或内容标签页（可逐集解析的列表）。"""
     path = (path or '').lower().rstrip('/')
@@ -205,12 +369,13 @@ def looks_like_playlist(url):
     return False
 
 
-def resolve_playlist_urls(url, conf_path):
+def resolve_playlist_urls(url, conf_path, playlist_end=None):
     """使用 yt-dlp flat-playlist 模式提取播放列表各条目 URL。
 
     Args:
         url (str): 播放列表 URL。
         conf_path (str): yt-dlp 配置文件路径（含 cookies 等）。
+        playlist_end (int): 只解析前若干条（按需翻页），None 表示全部。
 
     Returns:
         tuple: (urls, error)。成功时 urls 为条目 URL 列表、error 为 None；
@@ -223,13 +388,14 @@ def resolve_playlist_urls(url, conf_path):
         '--print', '%(id)s|%(webpage_url)s',
         '--no-warnings',
         '--ignore-errors',
-        url,
     ]
+    if playlist_end:
+        cmd += ['--lazy-playlist', '--playlist-end', str(playlist_end)]
+    cmd.append(url)
     try:
-        result = subprocess.run(
+        result = ytdlp_engine.run(
             cmd,
-            capture_output=True,
-            text=True,
+            config,
             timeout=PLAYLIST_RESOLVE_TIMEOUT_SECONDS,
         )
     except (OSError, subprocess.TimeoutExpired) as exc:
@@ -242,18 +408,136 @@ def resolve_playlist_urls(url, conf_path):
 
     urls = []
     for line in result.stdout.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.split('|', 1)
-        if len(parts) != 2:
-            continue
-        entry_url = parts[1].strip()
-        if entry_url and entry_url.lower() != 'na':
+        entry_url = parse_playlist_entry(line)
+        if entry_url:
             urls.append(entry_url)
     return urls, None
 
 
+def parse_playlist_entry(line):
+    """解析一行 `id|webpage_url` 输出，返回条目 URL；无效行返回 None。"""
+    parts = line.strip().split('|', 1)
+    if len(parts) != 2:
+        return None
+    entry_url = parts[1].strip()
+    if not entry_url or entry_url.lower() == 'na':
+        return None
+    return entry_url
+
+
+class PlaylistResolveError(Exception):
+    pass
+
+
+def iter_playlist_urls(url, conf_path, playlist_end):
+    """流式解析播放列表：yt-dlp 每翻一页就产出该页条目 URL。
+
+    调用方提前停止迭代时结束 yt-dlp；解析失败或超时抛出 PlaylistResolveError。
+    """
+    cmd = [
+        'yt-dlp',
+        '--config-location', conf_path,
+        '--flat-playlist',
+        '--lazy-playlist',
+        '--playlist-end', str(playlist_end),
+        '--print', '%(id)s|%(webpage_url)s',
+        '--no-warnings',
+        '--ignore-errors',
+        url,
+    ]
+    try:
+        process = ytdlp_engine.popen(cmd, config)
+    except OSError as exc:
+        raise PlaylistResolveError(f"解析播放列表失败: {exc}") from exc
+    timed_out = threading.Event()
+
+    def kill_on_timeout():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(PLAYLIST_JOB_TIMEOUT_SECONDS, kill_on_timeout)
+    timer.daemon = True
+    timer.start()
+    last_error = ''
+    try:
+        for line in process.stdout:
+            entry_url = parse_playlist_entry(line)
+            if entry_url:
+                yield entry_url
+            elif line.startswith('ERROR:'):
+                last_error = line.strip()
+        returncode = process.wait()
+    finally:
+        timer.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    if timed_out.is_set():
+        raise PlaylistResolveError(
+            f"解析播放列表超时（{PLAYLIST_JOB_TIMEOUT_SECONDS} 秒）"
+        )
+    if returncode != 0:
+        raise PlaylistResolveError(
+            f"解析播放列表失败 (yt-dlp 退出码 {returncode}): {last_error}"
+        )
+
+
+def playlist_cache_key(url):
+    """按播放列表 ID 或频道 + 标签页生成缓存键，同一列表的不同链接形式共享结果。"""
+    url = url.strip()
+    parsed = urlparse(url)
+    list_ids = [value for value in parse_qs(parsed.query).get('list', []) if value]
+    if list_ids:
+        return f'list:{list_ids[0]}'
+    path = parsed.path.rstrip('/')
+    segments = [segment for segment in path.split('/') if segment]
+    if segments and _is_channel_content_path(path):
+        if segments[0].startswith('@'):
+            owner, rest = segments[0].lower(), segments[1:]
+        else:
+            owner, rest = '/'.join(segments[:2]), segments[2:]
+        tab = rest[0].lower() if rest else ''
+        return f'channel:{owner}:{tab}'
+    return url
+
+
+def merge_incremental_playlist(page_urls, previous_urls):
+    """把首页中比上次最新条目更新的部分接到上次结果之前。
+
+    首页中找不到上次的最新条目（新增过多或列表被重排）时返回 None，
+    由调用方回退为完整解析。
+    """
+    if not previous_urls or previous_urls[0] not in page_urls:
+        return None
+    known = set(previous_urls)
+    newer = page_urls[:page_urls.index(previous_urls[0])]
+    return [entry for entry in newer if entry not in known] + list(previous_urls)
+
+
+def load_playlist_urls(url, key, conf_path):
+    """解析播放列表；频道标签页有近期结果时先尝试只解析首页。"""
+    tab = key.rsplit(':', 1)[-1] if key.startswith('channel:') else None
+    if tab in PLAYLIST_INCREMENTAL_TABS:
+        previous = _playlist_cache.peek(key, PLAYLIST_INCREMENTAL_MAX_AGE_SECONDS)
+        if previous:
+            page_urls, error = resolve_playlist_urls(
+                url,
+                conf_path,
+                playlist_end=PLAYLIST_INCREMENTAL_PAGE_SIZE,
+            )
+            merged = None if error else merge_incremental_playlist(page_urls, previous[0])
+            if merged is not None:
+                return merged, None
+    return resolve_playlist_urls(url, conf_path)
+
+
+def playlist_max_items():
+    max_items = config.get("PLAYLIST_MAX_ITEMS", 500)
+    if not isinstance(max_items, int) or max_items <= 0:
+        max_items = 500
+    return max_items
+
+
 def expand_task_urls(url):
     """将提交的 URL 展开为待下载的 URL 列表。
 
@@ -266,13 +550,18 @@ def expand_task_urls(url):
     if not looks_like_playlist(url):
         return [url], None
 
-    urls, error = resolve_playlist_urls(url, _pick_ytdlp_conf('video'))
+    key = playlist_cache_key(url)
+    (urls, error), cache_status = _playlist_cache.get(
+        key,
+        lambda: load_playlist_urls(url, key, _pick_ytdlp_conf('video')),
+        should_cache=lambda result: result[1] is None and bool(result[0]),
+    )
     if error:
         return None, error
+    if cache_status != 'miss':
+        app.logger.info("播放列表解析复用缓存 (%s): %s", cache_status, key)
 
-    max_items = config.get("PLAYLIST_MAX_ITEMS", 500)
-    if not isinstance(max_items, int) or max_items <= 0:
-        max_items = 500
+    max_items = playlist_max_items()
     if len(urls) > max_items:
         return None, (
             f"播放列表包含 {len(urls)} 个视频，超过上限 {max_items}"
@@ -283,87 +572,322 @@ def expand_task_urls(url):
     return urls, None
 
 
-def create_tasks(urls, types):
+def submit_playlist_job(url, types, force=False):
+    """登记播放列表后台解析任务并立即返回任务 ID；台账不可用时返回 None。"""
+    ledger = task_ledger_path()
+    if not ledger:
+        return None
+    for _attempt in range(5):
+        job_id = f"p{get_current_time().strftime('%Y%m%d%H%M%S')}{random_str(3)}"
+        try:
+            task_store.create_playlist_job(ledger, job_id, url, types)
+            break
+        except sqlite3.IntegrityError:
+            continue
+        except sqlite3.Error as exc:
+            app.logger.warning("登记播放列表任务失败: %s", exc)
+            return None
+    else:
+        return None
+    _playlist_job_executor.submit(run_playlist_job, ledger, job_id, url, types, force)
+    return job_id
+
+
+def run_playlist_job(ledger, job_id, url, types, force=False):
+    """后台解析播放列表，按批创建逐集任务并登记到播放列表任务下。
+
+    未指定 force 时，已排队、下载中或已下载过的视频复用已有任务。
+    """
+    max_items = playlist_max_items()
+    key = playlist_cache_key(url)
+    pending = []
+    resolved = []
+    last_flush = time.monotonic()
+
+    def flush():
+        nonlocal last_flush
+        if pending:
+            existing = {} if force else find_duplicate_tasks(pending, types)
+            task_ids = create_tasks(pending, types, existing=existing, group=job_id)
+            task_store.add_playlist_tasks(ledger, job_id, task_ids)
+            pending.clear()
+        last_flush = time.monotonic()
+
+    def accept(entry_url):
+        resolved.append(entry_url)
+        pending.append(entry_url)
+        if (
+            len(pending) >= PLAYLIST_JOB_BATCH_SIZE
+            or time.monotonic() - last_flush >= PLAYLIST_JOB_FLUSH_SECONDS
+        ):
+            flush()
+
+    error = None
+    truncated = False
+    # 截断时多看到的一个条目：与其他请求共享结果时据此判断列表超过上限
+    overflow = []
+    flight = None
+    try:
+        cached = _playlist_cache.peek(key, PLAYLIST_CACHE_TTL_SECONDS)
+        if not cached:
+            # 同一列表正由其他后台任务或同步请求解析时等待其结果，不重复枚举
+            flight, leader = _playlist_cache.join(key)
+            if not leader:
+                shared = _playlist_cache.wait(flight, PLAYLIST_JOB_TIMEOUT_SECONDS + 5)
+                flight = None
+                if shared[1]:
+                    raise PlaylistResolveError(shared[1])
+                cached = shared
+                app.logger.info("播放列表解析复用进行中的结果: %s", key)
+        tab = key.rsplit(':', 1)[-1] if key.startswith('channel:') else None
+        base = None
+        if not cached and tab in PLAYLIST_INCREMENTAL_TABS:
+            base = _playlist_cache.peek(key, PLAYLIST_INCREMENTAL_MAX_AGE_SECONDS)
+        if cached:
+            entries = iter(cached[0])
+        else:
+            entries = iter_playlist_urls(url, _pick_ytdlp_conf('video'), max_items + 1)
+        try:
+            for entry_url in entries:
+                if base and entry_url == base[0][0]:
+                    # 已解析到上次的最新条目，其余条目直接沿用上次结果
+                    seen = set(resolved)
+                    for known_url in base[0]:
+                        if known_url in seen:
+                            continue
+                        if len(resolved) >= max_items:
+                            truncated = True
+                            overflow.append(known_url)
+                            break
+                        accept(known_url)
+                    break
+                if len(resolved) >= max_items:
+                    truncated = True
+                    overflow.append(entry_url)
+                    break
+                accept(entry_url)
+        finally:
+            close = getattr(entries, 'close', None)
+            if close:
+                close()
+        flush()
+        if truncated:
+            error = (
+                f"播放列表超过上限 {max_items}，只创建了前 {max_items} 个视频的任务"
+                f"（可在 config.json 中调整 PLAYLIST_MAX_ITEMS）"
+            )
+        elif not resolved:
+            error = "播放列表解析结果为空，请检查链接是否为公开播放列表"
+        if flight is not None:
+            # 截断的结果不完整，只共享给等待者而不写入缓存
+            _playlist_cache.complete(
+                key,
+                flight,
+                (resolved + overflow, None if resolved else error),
+                cache=bool(resolved) and not truncated,
+            )
+            flight = None
+    except PlaylistResolveError as exc:
+        error = str(exc)
+    except Exception as exc:
+        app.logger.exception("播放列表后台解析失败: %s", job_id)
+        error = f"解析播放列表失败: {exc}"
+    if flight is not None:
+        _playlist_cache.complete(key, flight, ([], error))
+    try:
+        flush()
+    except Exception as exc:
+        app.logger.warning("创建播放列表剩余任务失败: %s (%s)", job_id, exc)
+    try:
+        task_store.finish_playlist_job(ledger, job_id, error=error, truncated=truncated)
+    except sqlite3.Error as exc:
+        app.logger.warning("更新播放列表任务状态失败: %s (%s)", job_id, exc)
+    app.logger.info(
+        "播放列表解析结束: %s，共 %d 个视频%s",
+        job_id,
+        len(resolved),
+        f"，{error}" if error else "",
+    )
+
+
+def playlist_job_info(job_id, job, ledger_tasks):
+    """汇总播放列表任务：解析状态、逐集任务 ID 与各状态数量。"""
+    if job is None:
+        return {
+            "task": job_id,
+            "kind": "playlist",
+            "exists": False,
+            "state": "missing",
+            "msg": "Playlist job not found",
+        }
+    resolve_state = job["state"]
+    msg = job["error"] or ''
+    if (
+        resolve_state == 'resolving'
+        and time.time() - job["updated_at"] > PLAYLIST_JOB_STALE_SECONDS
+    ):
+        resolve_state = 'failed'
+        msg = '播放列表解析已中断，请重新提交'
+
+    counts = {state: 0 for state in task_store.TASK_STATES}
+    for task in job["tasks"]:
+        state = (ledger_tasks.get(task) or {}).get("state", 'queued')
+        counts[state] = counts.get(state, 0) + 1
+    total = len(job["tasks"])
+    finished = counts['completed'] + counts['failed']
+    if resolve_state == 'resolving':
+        state = 'resolving'
+    elif total and finished < total:
+        state = 'downloading'
+    elif counts['completed']:
+        state = 'completed'
+    else:
+        state = 'failed'
+    return {
+        "task": job_id,
+        "kind": "playlist",
+        "exists": True,
+        "state": state,
+        "resolve_state": resolve_state,
+        "url": job["url"],
+        "types": job["types"],
+        "tasks": job["tasks"],
+        "total": total,
+        "counts": counts,
+        "truncated": job["truncated"],
+        "msg": msg,
+        "progress": {
+            "phase": state,
+            "stage": state,
+            "percent": round(finished * 100 / total, 1) if total else 0.0,
+        },
+    }
+
+
+def get_playlist_infos(job_ids):
+    ledger = task_ledger_path()
+    jobs = {}
+    ledger_tasks = {}
+    if ledger:
+        try:
+            jobs = task_store.get_playlist_jobs(ledger, job_ids)
+            child_ids = [task for job in jobs.values() for task in job["tasks"]]
+            if child_ids:
+                ledger_tasks = task_store.get_tasks(ledger, child_ids)
+        except sqlite3.Error as exc:
+            app.logger.warning("读取播放列表任务失败: %s", exc)
+    return [playlist_job_info(job_id, jobs.get(job_id), ledger_tasks) for job_id in job_ids]
+
+
+def is_playlist_job_id(task):
+    return isinstance(task, str) and PLAYLIST_JOB_ID_PATTERN.fullmatch(task) is not None
+
+
+def task_ledger_path():
+    """返回当前 URLS_DIR 的任务台账路径；台账不可用时返回 None。"""
+    try:
+        return task_store.open_ledger(URLS_DIR)
+    except (OSError, sqlite3.Error, RuntimeError) as exc:
+        app.logger.warning("打开任务台账失败，回退到任务文件状态: %s", exc)
+        return None
+
+
+def is_truthy_flag(value):
+    """解析 JSON 布尔值或表单中的 1/true/on 开关。"""
+    if isinstance(value, str):
+        return value.strip().lower() in {'1', 'true', 'yes', 'on'}
+    return value is True
+
+
+def is_existing_result_file(filename):
+    """台账中的产物文件名仍指向 FILES_DIR 内的文件；越界或非法文件名视为不存在。"""
+    if not isinstance(filename, str):
+        return False
+    filepath = safe_join(FILES_DIR, filename)
+    return bool(filepath) and os.path.isfile(filepath)
+
+
+def find_duplicate_tasks(urls, types):
+    """查找与已有任务指向同一媒体的 (URL, 类型)，返回 {(url, type): task_id}。
+
+    排队或下载中的任务直接复用；已完成的任务只有产物仍在 FILES_DIR 中时才复用。
+    """
+    ledger = task_ledger_path()
+    keys = {url: task_store.media_key(url) for url in urls}
+    if not ledger or not any(keys.values()):
+        return {}
+    duplicates = {}
+    try:
+        for t in types:
+            candidates = task_store.find_media_tasks(ledger, t, keys.values())
+            for url, key in keys.items():
+                for task in candidates.get(key, ()):
+                    if task["state"] != 'completed' or any(
+                        is_existing_result_file(filename)
+                        for filename in task["result_files"] or ()
+                    ):
+                        duplicates[(url, t)] = task["task_id"]
+                        break
+    except sqlite3.Error as exc:
+        app.logger.warning("查询重复任务失败: %s", exc)
+        return {}
+    return duplicates
+
+
+def create_tasks(urls, types, existing=None, group=None):
     """创建下载任务并返回任务ID列表
 
     Args:
         urls (list): 要下载的 URL 列表（播放列表已展开为逐集 URL）。
         types (list): 下载类型列表，可以是 ['video'] 或 ['audio'] 或两者都有
+        existing (dict | None): find_duplicate_tasks 的结果；命中的 URL
+            直接返回已有任务 ID，不再创建任务文件。
+        group (str | None): 播放列表提交的分组标识，下载器据此在多个
+            播放列表之间轮流调度；单个 URL 提交为 None。
 
     Returns:
-        list: 创建的任务ID列表
+        list: 任务ID列表，顺序与 urls × types 一致
     """
+    existing = existing or {}
     task_ids = []
+    ledger_rows = []
+    planned = set()
+    # 同一批次内指向同一媒体的 URL 只创建一个任务
+    created_by_key = {}
     current_time = get_current_time()
     for url in urls:
         for t in types:
+            key = task_store.media_key(url)
+            reused = existing.get((url, t)) or created_by_key.get((key, t))
+            if reused:
+                task_ids.append(reused)
+                continue
             # 同一秒内创建多个任务时保证 task_id 唯一，避免覆盖已有任务文件
             while True:
                 timestamp = current_time.strftime('%Y%m%d%H%M%S') + random_str(3)
                 prefix = 'v' if t == 'video' else 'a'
                 task_id = f"{prefix}{timestamp}"
                 filename = os.path.join(URLS_DIR, f"{task_id}.txt")
-                if not os.path.exists(filename):
+                if task_id not in planned and not os.path.exists(filename):
                     break
+            planned.add(task_id)
             task_ids.append(task_id)
-            with open(filename, 'w') as f:
-                f.write(url)
+            ledger_rows.append((task_id, t, url))
+            if key:
+                created_by_key[(key, t)] = task_id
+    # 先登记台账再写任务文件，下载器发现任务文件时即可读到分组信息
+    ledger = task_ledger_path()
+    if ledger and ledger_rows:
+        try:
+            task_store.create_tasks(ledger, ledger_rows, group_id=group)
+        except sqlite3.Error as exc:
+            app.logger.warning("登记任务台账失败: %s", exc)
+    for task_id, _mode, url in ledger_rows:
+        with open(os.path.join(URLS_DIR, f"{task_id}.txt"), 'w') as f:
+            f.write(url)
     return task_ids
 
 
-def classify_download_stage(extension, vcodec, acodec):
-    """根据 yt-dlp 当前产物信息识别正在下载的媒体阶段。"""
-    extension = (extension or '').strip().lower()
-    vcodec = (vcodec or '').strip().lower()
-    acodec = (acodec or '').strip().lower()
-    empty_codecs = {'', 'na', 'none', 'null', 'unknown'}
-    has_video = vcodec not in empty_codecs
-    has_audio = acodec not in empty_codecs
-
-    if extension in SUBTITLE_EXTENSIONS:
-        return 'download_subtitles'
-    if has_video and not has_audio:
-        return 'download_video'
-    if has_audio and not has_video:
-        return 'download_audio'
-    if has_video and has_audio:
-        return 'download_media'
-    if extension in AUDIO_EXTENSIONS:
-        return 'download_audio'
-    if extension in VIDEO_EXTENSIONS:
-        return 'download_video'
-    return 'downloading'
-
-
-def detect_processing_stage(line):
-    """从 yt-dlp 后处理日志识别合并、嵌入字幕等阶段。"""
-    if '[EmbedSubtitle]' in line:
-        return 'embed_subtitles'
-    if '[Merger]' in line or 'Merging formats into' in line:
-        return 'merge_media'
-    if '[ExtractAudio]' in line:
-        return 'extract_audio'
-    if '[Metadata]' in line:
-        return 'write_metadata'
-    if any(marker in line for marker in (
-        '[VideoConvertor]',
-        '[VideoRemuxer]',
-        '[Fixup',
-        '[ThumbnailsConvertor]',
-        '[MoveFiles]',
-    )):
-        return 'postprocessing'
-    return None
-
-
-def normalize_progress_value(value):
-    """将 yt-dlp 的不可用占位值统一转换为空字符串。"""
-    normalized = (value or '').strip()
-    if normalized.upper() in {'NA', 'N/A', 'NONE', 'NULL', 'UNKNOWN'}:
-        return ''
-    return normalized
-
-
 def valid_nonnegative_number(value):
     """返回有效的非负数；布尔值和非法数据返回 None。"""
     if isinstance(value, bool):
@@ -377,102 +901,220 @@ def valid_nonnegative_number(value):
     return number
 
 
-def select_primary_result_file(filenames, task_type):
+def select_primary_result_file(filenames, task_type, files_listing=None):
     """从本地可用产物中选择最大的主媒体文件。"""
     extensions = AUDIO_EXTENSIONS if task_type == 'audio' else VIDEO_EXTENSIONS
     candidates = []
     for filename in filenames:
         extension = os.path.splitext(filename)[1].lower().lstrip('.')
-        filepath = safe_join(FILES_DIR, filename)
-        if extension not in extensions or not filepath or not os.path.isfile(filepath):
+        if extension not in extensions:
             continue
-        candidates.append((os.path.getsize(filepath), filename))
+        size = result_file_size(filename, files_listing)
+        if size is None:
+            continue
+        candidates.append((size, filename))
     if not candidates:
         return None
     return max(candidates)[1]
 
 
-def parse_task_progress(log_path):
-    """从任务日志末尾提取 yt-dlp 最近一次下载进度。"""
-    if not os.path.isfile(log_path):
-        return {}
+def list_files_dir():
+    """扫描一次 FILES_DIR，返回 {文件名: DirEntry}，供批量任务查询复用。"""
+    listing = {}
+    try:
+        with os.scandir(FILES_DIR) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        listing[entry.name] = entry
+                except OSError:
+                    continue
+    except OSError as exc:
+        app.logger.warning("读取文件目录失败: %s (%s)", FILES_DIR, exc)
+    return listing
+
+
+def result_file_size(filename, files_listing=None):
+    """返回 FILES_DIR 中产物的字节数；文件不存在或路径不安全时返回 None。"""
+    if files_listing is not None:
+        entry = files_listing.get(filename)
+        if entry is None:
+            return None
+        try:
+            return entry.stat().st_size
+        except OSError:
+            return None
+    filepath = safe_join(FILES_DIR, filename)
+    if not filepath or not os.path.isfile(filepath):
+        return None
+    return os.path.getsize(filepath)
+
 
+def list_task_files(task_ids):
+    """扫描一次 URLS_DIR，返回所请求任务的 {task_id: (state, path)}。"""
+    wanted = set(task_ids)
+    states = dict(TASK_STATE_EXTENSIONS)
+    priorities = {
+        extension: index
+        for index, (extension, _) in enumerate(TASK_STATE_EXTENSIONS)
+    }
+    found = {}
     try:
-        with open(log_path, 'rb') as log_file:
-            log_file.seek(0, os.SEEK_END)
-            file_size = log_file.tell()
-            log_file.seek(max(0, file_size - 128 * 1024))
-            content = log_file.read().decode('utf-8', errors='replace')
+        with os.scandir(URLS_DIR) as entries:
+            for entry in entries:
+                stem, extension = os.path.splitext(entry.name)
+                if stem not in wanted or extension not in states:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                previous = found.get(stem)
+                if previous is None or priorities[extension] < priorities[previous[0]]:
+                    found[stem] = (extension, entry.path)
     except OSError as exc:
-        app.logger.warning("读取任务进度日志失败: %s (%s)", log_path, exc)
+        app.logger.warning("读取任务目录失败: %s (%s)", URLS_DIR, exc)
+    return {
+        task: (states[extension], path)
+        for task, (extension, path) in found.items()
+    }
+
+
+TASK_PROGRESS_TAIL_BYTES = 128 * 1024
+TASK_PROGRESS_CACHE_SIZE = 256
+_task_progress_cursors = OrderedDict()
+_task_progress_lock = threading.Lock()
+
+
+def parse_task_progress(log_path):
+    """提取任务日志中 yt-dlp 最近一次下载进度。
+
+    每个日志保留一个游标，按 (设备, inode) 识别文件，按大小与 mtime 判断
+    是否有新内容，只解析新追加的字节；日志被截断或替换时从末尾 128 KiB 重新开始。
+    全局锁只保护游标表的查找与淘汰，读文件在各游标自己的锁内进行。
+    """
+    try:
+        stat_result = os.stat(log_path)
+    except OSError:
+        with _task_progress_lock:
+            _task_progress_cursors.pop(log_path, None)
+        return {}
+    if not os.path.isfile(log_path):
         return {}
 
-    lines = [
-        ANSI_ESCAPE_PATTERN.sub('', line).strip()
-        for line in content.splitlines()
-    ]
-    processing_stage = None
-    for line in reversed(lines):
-        if processing_stage is None:
-            processing_stage = detect_processing_stage(line)
-
-        if line.startswith(PROGRESS_MARKER):
-            fields = line[len(PROGRESS_MARKER):].split('|')
-            if len(fields) < 6:
-                continue
-            status, percent_text, downloaded, total, speed, eta = fields[:6]
-            percent_match = re.search(r'\d+(?:\.\d+)?', percent_text)
-            progress = {
-                "phase": status.strip(),
-                "downloaded": normalize_progress_value(downloaded),
-                "total": normalize_progress_value(total),
-                "speed": normalize_progress_value(speed),
-                "eta": normalize_progress_value(eta),
-                "stage": processing_stage or 'downloading',
-            }
-            if len(fields) >= 10 and processing_stage is None:
-                extension, _format_id, vcodec, acodec = fields[6:10]
-                progress["stage"] = classify_download_stage(
-                    extension,
-                    vcodec,
-                    acodec,
+    with _task_progress_lock:
+        cursor = _task_progress_cursors.get(log_path)
+        if cursor is None:
+            cursor = TaskProgressCursor()
+            _task_progress_cursors[log_path] = cursor
+            while len(_task_progress_cursors) > TASK_PROGRESS_CACHE_SIZE:
+                _task_progress_cursors.popitem(last=False)
+        else:
+            _task_progress_cursors.move_to_end(log_path)
+
+    identity = (stat_result.st_dev, stat_result.st_ino)
+    tail_offset = max(0, stat_result.st_size - TASK_PROGRESS_TAIL_BYTES)
+    with cursor.lock:
+        if (
+            cursor.identity == identity
+            and cursor.size == stat_result.st_size
+            and cursor.mtime_ns == stat_result.st_mtime_ns
+        ):
+            return dict(cursor.result)
+        if (
+            cursor.identity != identity
+            or stat_result.st_size < cursor.offset
+            or stat_result.st_size - cursor.offset > TASK_PROGRESS_TAIL_BYTES
+        ):
+            cursor.reset(identity, tail_offset)
+
+        try:
+            with open(log_path, 'rb') as log_file:
+                # 连同游标前的少量字节一起读取，用于识别同一 inode 被截断后重写。
+                log_file.seek(cursor.offset - len(cursor.anchor))
+                chunk = log_file.read(
+                    stat_result.st_size - cursor.offset + len(cursor.anchor)
                 )
-            if percent_match:
-                progress["percent"] = min(100.0, float(percent_match.group()))
-            return progress
-
-        match = DEFAULT_PROGRESS_PATTERN.search(line)
-        if match:
-            progress = {
-                "phase": "downloading",
-                "percent": min(100.0, float(match.group('percent'))),
-                "stage": processing_stage or "downloading",
-            }
-            for key in ('total', 'speed', 'eta'):
-                value = match.group(key)
-                if value:
-                    progress[key] = value.strip()
-            return progress
-    if processing_stage:
-        return {
-            "phase": "processing",
-            "percent": 100.0,
-            "stage": processing_stage,
-        }
-    return {}
+                if not chunk.startswith(cursor.anchor):
+                    cursor.reset(identity, tail_offset)
+                    log_file.seek(cursor.offset)
+                    chunk = log_file.read(stat_result.st_size - cursor.offset)
+                else:
+                    chunk = chunk[len(cursor.anchor):]
+        except OSError as exc:
+            app.logger.warning("读取任务进度日志失败: %s (%s)", log_path, exc)
+            cursor.reset(None, 0)
+            with _task_progress_lock:
+                if _task_progress_cursors.get(log_path) is cursor:
+                    del _task_progress_cursors[log_path]
+            return {}
+
+        complete_length = chunk.rfind(b'\n') + 1
+        if complete_length:
+            cursor.anchor = chunk[max(0, complete_length - 64):complete_length]
+        complete = chunk[:complete_length].decode('utf-8', errors='replace')
+        pending = chunk[complete_length:].decode('utf-8', errors='replace')
+        cursor.feed(complete.splitlines())
+        cursor.offset += complete_length
+        cursor.size = cursor.offset + len(chunk) - complete_length
+        cursor.mtime_ns = stat_result.st_mtime_ns
+        cursor.result = cursor.snapshot(pending.splitlines())
+        return dict(cursor.result)
+
+
+def cached_task_infos(task_ids):
+    """在短 TTL 内复用任务状态，多个订阅同一批任务的客户端只触发一次计算。"""
+    cache_scope = (URLS_DIR, FILES_DIR, config["LOG_DIR"])
+    now = time.monotonic()
+    results = {}
+    with _task_info_cache_lock:
+        for task in task_ids:
+            entry = _task_info_cache.get((cache_scope, task))
+            if entry and entry[0] > now:
+                results[task] = entry[1]
+    missing = [task for task in dict.fromkeys(task_ids) if task not in results]
+    if missing:
+        infos = get_task_infos(missing)
+        expires_at = time.monotonic() + TASK_INFO_CACHE_TTL_SECONDS
+        with _task_info_cache_lock:
+            if len(_task_info_cache) + len(missing) > TASK_INFO_CACHE_MAX_ENTRIES:
+                for key in [
+                    key for key, entry in _task_info_cache.items()
+                    if entry[0] <= now
+                ]:
+                    del _task_info_cache[key]
+            if len(_task_info_cache) + len(missing) > TASK_INFO_CACHE_MAX_ENTRIES:
+                _task_info_cache.clear()
+            for task, info in zip(missing, infos):
+                _task_info_cache[(cache_scope, task)] = (expires_at, info)
+                results[task] = info
+    return [results[task] for task in task_ids]
+
+
+def is_terminal_task_info(info):
+    return not info.get("exists") or info.get("state") in {'completed', 'failed', 'missing'}
+
+
+def read_task_progress(task):
+    """优先读取 downloader 发布的进度快照，旧任务回退为解析任务日志。"""
+    progress = read_progress_snapshot(
+        progress_snapshot_path(config["LOG_DIR"], task)
+    )
+    if progress is not None:
+        return progress
+    return parse_task_progress(os.path.join(config["LOG_DIR"], f"{task}.log"))
 
 
-def recover_task_files_from_logs(task):
-    """从 downloader 移动日志恢复旧任务的最终产物文件名。"""
+def read_move_log_lines():
+    """读取各 downloader.log 轮转文件末尾的文件移动记录，最新的在前。"""
     log_pattern = os.path.join(config["LOG_DIR"], 'downloader.log*')
     log_paths = sorted(
         glob.glob(log_pattern),
         key=lambda path: os.path.getmtime(path),
         reverse=True,
     )
-    recovered_files = []
-    files_root = os.path.realpath(FILES_DIR)
-
+    move_lines = []
     for log_path in log_paths:
         try:
             with open(log_path, 'rb') as log_file:
@@ -482,40 +1124,163 @@ def recover_task_files_from_logs(task):
                 content = log_file.read().decode('utf-8', errors='replace')
         except OSError:
             continue
+        move_lines.extend(
+            line for line in reversed(content.splitlines())
+            if '已移动文件:' in line and ' -> ' in line
+        )
+    return move_lines
 
-        for line in reversed(content.splitlines()):
-            if task not in line or '已移动文件:' not in line or ' -> ' not in line:
-                continue
-            destination = line.rsplit(' -> ', 1)[1].strip()
-            destination_realpath = os.path.realpath(destination)
-            try:
-                inside_files_dir = (
-                    os.path.commonpath([files_root, destination_realpath])
-                    == files_root
-                )
-            except ValueError:
-                inside_files_dir = False
-            if not inside_files_dir or not os.path.isfile(destination_realpath):
-                continue
-            filename = os.path.basename(destination_realpath)
-            if filename not in recovered_files:
-                recovered_files.append(filename)
+
+def read_task_events(task, events=None):
+    """按台账中的偏移索引读取任务的结构化事件，按写入顺序返回。"""
+    ledger = task_ledger_path()
+    if not ledger:
+        return []
+    try:
+        entries = task_store.get_task_events(ledger, task, events)
+    except sqlite3.Error as exc:
+        app.logger.warning("读取任务事件索引失败: %s (%s)", task, exc)
+        return []
+    records = []
+    missing_segments = set()
+    for entry in entries:
+        segment = entry["segment"]
+        # 分段已被轮转删除（索引尚未清理）时跳过，同一分段只检查一次
+        if segment in missing_segments:
+            continue
+        if not os.path.isfile(os.path.join(config["LOG_DIR"], segment)):
+            missing_segments.add(segment)
+            continue
+        record = read_event(config["LOG_DIR"], segment, entry["offset"])
+        # 索引与内容不符时跳过
+        if record and record.get("task") == task and record.get("event") == entry["event"]:
+            records.append(record)
+    return records
+
+
+def recover_task_files_from_events(task):
+    """从事件日志的 moved 事件恢复任务产物文件名。"""
+    recovered_files = []
+    for record in read_task_events(task, events=('moved',)):
+        filename = record.get("file")
+        if (
+            isinstance(filename, str)
+            and filename == os.path.basename(filename)
+            and filename not in recovered_files
+        ):
+            recovered_files.append(filename)
     return recovered_files
 
 
-def get_task_info(task):
-    """读取单个任务的生命周期状态与最近下载进度。"""
-    if not isinstance(task, str) or not TASK_ID_PATTERN.fullmatch(task):
-        return {"task": task, "exists": False, "msg": "Invalid task id"}
+def recover_task_files_from_logs(task, move_log_lines=None):
+    """从 downloader 移动日志恢复旧任务的最终产物文件名。"""
+    if move_log_lines is None:
+        move_log_lines = read_move_log_lines()
+    recovered_files = []
+    files_root = os.path.realpath(FILES_DIR)
+
+    for line in move_log_lines:
+        if task not in line:
+            continue
+        destination = line.rsplit(' -> ', 1)[1].strip()
+        destination_realpath = os.path.realpath(destination)
+        try:
+            inside_files_dir = (
+                os.path.commonpath([files_root, destination_realpath])
+                == files_root
+            )
+        except ValueError:
+            inside_files_dir = False
+        if not inside_files_dir or not os.path.isfile(destination_realpath):
+            continue
+        filename = os.path.basename(destination_realpath)
+        if filename not in recovered_files:
+            recovered_files.append(filename)
+    return recovered_files
+
+
+def find_task_file(task, expected_state=None):
+    """返回单个任务的 (state, path)；没有任务文件时返回 (None, None)。
 
-    task_path = None
-    state = None
+    expected_state 为台账中的状态，先检查对应的文件，一致时只需一次 stat。
+    """
+    extensions = {state: extension for extension, state in TASK_STATE_EXTENSIONS}
+    if expected_state in extensions:
+        candidate_path = os.path.join(URLS_DIR, f"{task}{extensions[expected_state]}")
+        if os.path.isfile(candidate_path):
+            return expected_state, candidate_path
     for extension, candidate_state in TASK_STATE_EXTENSIONS:
         candidate_path = os.path.join(URLS_DIR, f"{task}{extension}")
         if os.path.isfile(candidate_path):
-            task_path = candidate_path
-            state = candidate_state
-            break
+            return candidate_state, candidate_path
+    return None, None
+
+
+def build_task_snapshot(task_ids):
+    """为一批任务一次性读取台账、URLS_DIR 与 FILES_DIR，供 get_task_info 共用。"""
+    valid_ids = [
+        task for task in task_ids
+        if isinstance(task, str) and TASK_ID_PATTERN.fullmatch(task)
+    ]
+    ledger_tasks = {}
+    ledger = task_ledger_path() if valid_ids else None
+    if ledger:
+        try:
+            ledger_tasks = task_store.get_tasks(ledger, valid_ids)
+        except sqlite3.Error as exc:
+            app.logger.warning("批量读取任务台账失败: %s", exc)
+    return {
+        "ledger": ledger_tasks,
+        # 任务文件是状态的事实来源，台账只用于补充 URL 等信息，因此全部扫描
+        "task_files": list_task_files(valid_ids) if valid_ids else {},
+        "files": list_files_dir() if valid_ids else {},
+        "move_log_lines": None,
+    }
+
+
+def get_task_infos(task_ids):
+    """批量读取任务状态：所有任务共享同一份目录快照。"""
+    playlist_ids = [task for task in task_ids if is_playlist_job_id(task)]
+    playlists = {}
+    if playlist_ids:
+        playlists = {info["task"]: info for info in get_playlist_infos(playlist_ids)}
+    snapshot = build_task_snapshot(task_ids)
+    return [
+        playlists[task] if task in playlists else get_task_info(task, snapshot=snapshot)
+        for task in task_ids
+    ]
+
+
+def get_task_info(task, snapshot=None):
+    """读取单个任务的生命周期状态与最近下载进度。
+
+    Args:
+        task (str): 任务 ID。
+        snapshot (dict | None): build_task_snapshot 生成的批量快照；
+            为空时按单个任务直接查询台账和文件。
+    """
+    if is_playlist_job_id(task):
+        return get_playlist_infos([task])[0]
+    if not isinstance(task, str) or not TASK_ID_PATTERN.fullmatch(task):
+        return {"task": task, "exists": False, "msg": "Invalid task id"}
+
+    ledger_task = None
+    if snapshot is not None:
+        ledger_task = snapshot["ledger"].get(task)
+    else:
+        ledger = task_ledger_path()
+        if ledger:
+            try:
+                ledger_task = task_store.get_task(ledger, task)
+            except sqlite3.Error as exc:
+                app.logger.warning("读取任务台账失败: %s (%s)", task, exc)
+
+    # 任务文件才是状态的事实来源：台账写入可能失败，任务也可能被手工改名重新
+    # 排队或删除，台账状态与文件不一致时以文件为准，文件不存在即视为缺失。
+    if snapshot is not None:
+        state, task_path = snapshot["task_files"].get(task, (None, None))
+    else:
+        state, task_path = find_task_file(task, ledger_task["state"] if ledger_task else None)
 
     if not task_path:
         return {
@@ -525,16 +1290,20 @@ def get_task_info(task):
             "msg": "Task file not found",
         }
 
-    try:
-        with open(task_path, 'r') as task_file:
-            url = task_file.read().strip()
-    except OSError as exc:
-        return {
-            "task": task,
-            "exists": False,
-            "state": "missing",
-            "msg": f"Read error: {exc}",
-        }
+    if ledger_task:
+        url = ledger_task["url"]
+    else:
+        # 台账中没有记录的任务（如台账建立后手工放入的任务文件）从任务文件读取 URL。
+        try:
+            with open(task_path, 'r') as task_file:
+                url = task_file.read().strip()
+        except OSError as exc:
+            return {
+                "task": task,
+                "exists": False,
+                "state": "missing",
+                "msg": f"Read error: {exc}",
+            }
 
     timestamp = task[1:15]
     try:
@@ -551,9 +1320,7 @@ def get_task_info(task):
             "stage": "completed",
         }
     else:
-        progress = parse_task_progress(
-            os.path.join(config["LOG_DIR"], f"{task}.log")
-        )
+        progress = read_task_progress(task)
     if state == 'queued':
         progress = {
             "percent": 0.0,
@@ -579,22 +1346,44 @@ def get_task_info(task):
         "state": state,
         "progress": progress,
     }
+    if ledger_task and ledger_task.get("attempts"):
+        task_info["attempts"] = ledger_task["attempts"]
+        task_info["last_error"] = ledger_task.get("last_error")
     if state == 'completed':
-        result_path = os.path.join(URLS_DIR, f"{task}.result.json")
-        try:
-            with open(result_path, 'r') as result_file:
-                result_data = json.load(result_file)
-        except (OSError, json.JSONDecodeError):
-            result_data = {}
+        if ledger_task and ledger_task["result_files"] is not None:
+            result_data = {
+                "files": ledger_task["result_files"],
+                "summary": ledger_task["summary"] or {},
+            }
+        else:
+            result_path = os.path.join(URLS_DIR, f"{task}.result.json")
+            try:
+                with open(result_path, 'r') as result_file:
+                    result_data = json.load(result_file)
+            except (OSError, json.JSONDecodeError):
+                result_data = {}
 
+        files_listing = snapshot["files"] if snapshot is not None else None
         result_files = result_data.get("files", [])
         if not result_files:
-            result_files = recover_task_files_from_logs(task)
+            result_files = recover_task_files_from_events(task)
+        if not result_files:
+            # 事件日志上线前的旧任务回退为扫描 downloader.log
+            move_log_lines = None
+            if snapshot is not None:
+                if snapshot["move_log_lines"] is None:
+                    snapshot["move_log_lines"] = read_move_log_lines()
+                move_log_lines = snapshot["move_log_lines"]
+            result_files = recover_task_files_from_logs(task, move_log_lines)
 
         available_files = []
         for filename in result_files:
             if not isinstance(filename, str):
                 continue
+            if files_listing is not None:
+                if filename in files_listing:
+                    available_files.append(filename)
+                continue
             filepath = safe_join(FILES_DIR, filename)
             if filepath and os.path.isfile(filepath):
                 available_files.append(filename)
@@ -621,10 +1410,13 @@ def get_task_info(task):
             primary_filename = select_primary_result_file(
                 available_files,
                 task_type,
+                files_listing,
             )
             if primary_filename:
-                primary_path = safe_join(FILES_DIR, primary_filename)
-                final_size_bytes = os.path.getsize(primary_path)
+                final_size_bytes = result_file_size(
+                    primary_filename,
+                    files_listing,
+                )
 
         if final_size_bytes is not None:
             progress["final_size_bytes"] = final_size_bytes
@@ -678,23 +1470,76 @@ def normalize_subtitle_language(language):
     return SUBTITLE_LANGUAGE_ALIASES.get(normalized, normalized)
 
 
+def media_index_path():
+    try:
+        return media_index.open_index(config["MEDIA_INDEX_DB_PATH"])
+    except (KeyError, OSError, sqlite3.Error, RuntimeError) as exc:
+        app.logger.warning("打开媒体索引失败，直接调用 ffprobe: %s", exc)
+        return None
+
+
+def file_matches_stat(filepath, file_mtime_ns, file_size):
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return False
+    return stat.st_mtime_ns == file_mtime_ns and stat.st_size == file_size
+
+
+def prefetch_media_index(filepaths):
+    """页面渲染前一次性读取所有文件的索引记录，后续探测直接命中内存。"""
+    db_path = media_index_path()
+    if not db_path or not has_request_context():
+        return
+    try:
+        g.media_probes = media_index.get_probes(db_path, filepaths)
+    except sqlite3.Error as exc:
+        app.logger.warning("批量读取媒体索引失败: %s", exc)
+
+
+def load_media_probe(filepath, kind, file_mtime_ns, file_size):
+    """返回 ffprobe 原始结果：先查磁盘索引，未命中时运行 ffprobe 并写回索引。"""
+    db_path = None
+    if file_matches_stat(filepath, file_mtime_ns, file_size):
+        db_path = media_index_path()
+    if db_path:
+        prefetched = g.get('media_probes') if has_request_context() else None
+        if prefetched is not None:
+            cached = prefetched.get((media_index.index_key(filepath), kind))
+            if cached and cached[:2] == (file_mtime_ns, file_size):
+                return cached[2]
+        else:
+            try:
+                payload = media_index.get_probe(
+                    db_path, filepath, kind, file_mtime_ns, file_size,
+                )
+            except sqlite3.Error as exc:
+                app.logger.warning("读取媒体索引失败: %s (%s)", filepath, exc)
+                payload = None
+            if payload is not None:
+                return payload
+
+    payload = media_index.run_probe(kind, filepath, runner=subprocess.run)
+    if db_path:
+        try:
+            media_index.save_probe(
+                db_path, filepath, kind, file_mtime_ns, file_size, payload,
+            )
+        except sqlite3.Error as exc:
+            app.logger.warning("写入媒体索引失败: %s (%s)", filepath, exc)
+    return payload
+
+
 @lru_cache(maxsize=256)
 def _probe_embedded_subtitles(filepath, file_mtime_ns, file_size):
     """读取 MP4 的内嵌字幕流；文件属性参数用于自动失效缓存。"""
-    del file_mtime_ns, file_size
     try:
-        result = subprocess.run(
-            [
-                "ffprobe", "-v", "error", "-select_streams", "s",
-                "-show_entries", "stream=index:stream_tags=language,title",
-                "-of", "json", filepath,
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
-            timeout=15,
-        )
-        streams = json.loads(result.stdout).get("streams", [])
+        streams = load_media_probe(
+            filepath,
+            'subtitle_streams',
+            file_mtime_ns,
+            file_size,
+        ).get("streams", [])
     except (FileNotFoundError, subprocess.SubprocessError, json.JSONDecodeError) as exc:
         app.logger.warning("读取视频字幕流失败，已跳过字幕: %s (%s)", filepath, exc)
         return ()
@@ -939,34 +1784,137 @@ def ai_summary_job_payload(job, legacy=False):
     }, 202
 
 
+class AiSummaryJobWatcher:
+    """单个 AI 总结任务的共享观察者。
+
+    每个任务只有一个后台线程读取 SQLite；marker 变化时才读取完整任务，
+    再通过 Condition 唤醒所有订阅该任务的浏览器连接。
+    """
+
+    def __init__(self, db_path, job_id):
+        self.key = (db_path, job_id)
+        self.db_path = db_path
+        self.job_id = job_id
+        self.condition = threading.Condition()
+        self.subscribers = 0
+        self.version = 0
+        self.job = None
+        self.finished = False
+
+    def publish(self, job, finished=False):
+        with self.condition:
+            self.job = job
+            self.finished = finished
+            self.version += 1
+            self.condition.notify_all()
+
+    def run(self):
+        last_marker = None
+        while True:
+            with _ai_summary_watchers_lock:
+                if self.subscribers == 0:
+                    _ai_summary_watchers.pop(self.key, None)
+                    return
+            try:
+                marker = ai_summary_store.get_job_marker(self.db_path, self.job_id)
+                job = None
+                if marker is not None and marker != last_marker:
+                    job = ai_summary_store.get_job(self.db_path, self.job_id)
+            except sqlite3.Error as exc:
+                app.logger.warning("读取 AI 总结任务失败: %s (%s)", self.job_id, exc)
+                time.sleep(AI_SUMMARY_STREAM_POLL_SECONDS)
+                continue
+            if marker is None or (marker != last_marker and job is None):
+                finished = True
+                self.publish(None, finished=True)
+            elif marker != last_marker:
+                finished = job['status'] in {'completed', 'failed'}
+                self.publish(job, finished=finished)
+                last_marker = marker
+            else:
+                finished = False
+            if finished:
+                with _ai_summary_watchers_lock:
+                    if _ai_summary_watchers.get(self.key) is self:
+                        del _ai_summary_watchers[self.key]
+                return
+            time.sleep(AI_SUMMARY_STREAM_POLL_SECONDS)
+
+    def wait(self, seen_version, timeout):
+        """等待新版本；返回 (version, job, finished)，超时则 version 不变。"""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.version != seen_version,
+                timeout=timeout,
+            )
+            return self.version, self.job, self.finished
+
+
+def subscribe_ai_summary_job(db_path, job_id):
+    key = (db_path, job_id)
+    with _ai_summary_watchers_lock:
+        watcher = _ai_summary_watchers.get(key)
+        if watcher is None:
+            watcher = AiSummaryJobWatcher(db_path, job_id)
+            _ai_summary_watchers[key] = watcher
+            threading.Thread(
+                target=watcher.run,
+                name=f'ai-summary-watch-{job_id}',
+                daemon=True,
+            ).start()
+        watcher.subscribers += 1
+        return watcher
+
+
+def unsubscribe_ai_summary_job(watcher):
+    with _ai_summary_watchers_lock:
+        watcher.subscribers -= 1
+
+
 def ai_summary_job_stream(job_id, legacy=False):
     """将 SQLite 中的任务增量以 NDJSON 持续发送给浏览器。"""
-    initial = ai_summary_store.get_job(config['AI_SUMMARY_DB_PATH'], job_id)
+    db_path = config['AI_SUMMARY_DB_PATH']
+    initial = ai_summary_store.get_job(db_path, job_id)
     if not initial:
         return ai_summary_api_response({'success': False, 'message': 'AI 总结任务不存在'}, 404)
 
     @stream_with_context
     def generate():
-        last_marker = None
+        payload, _ = ai_summary_job_payload(initial, legacy=legacy)
+        yield json.dumps(payload, ensure_ascii=False) + '\n'
+        if initial['status'] in {'completed', 'failed'}:
+            return
+        last_marker = (
+            initial['status'],
+            initial.get('stream_revision') or 0,
+            initial.get('updated_at'),
+        )
         last_keepalive = time.monotonic()
-        while True:
-            job = ai_summary_store.get_job(config['AI_SUMMARY_DB_PATH'], job_id)
-            if not job:
-                payload = {'success': False, 'status': 'missing', 'message': 'AI 总结任务不存在'}
-                yield json.dumps(payload, ensure_ascii=False) + '\n'
-                return
-            marker = (job['status'], job.get('stream_revision') or 0, job.get('updated_at'))
-            if marker != last_marker:
-                payload, _ = ai_summary_job_payload(job, legacy=legacy)
-                yield json.dumps(payload, ensure_ascii=False) + '\n'
-                last_marker = marker
-                last_keepalive = time.monotonic()
-            if job['status'] in {'completed', 'failed'}:
-                return
-            if time.monotonic() - last_keepalive >= 15:
-                yield json.dumps({'type': 'keepalive'}) + '\n'
-                last_keepalive = time.monotonic()
-            time.sleep(0.2)
+        watcher = subscribe_ai_summary_job(db_path, job_id)
+        try:
+            seen_version = 0
+            while True:
+                timeout = max(0, 15 - (time.monotonic() - last_keepalive))
+                version, job, finished = watcher.wait(seen_version, timeout)
+                if version != seen_version:
+                    seen_version = version
+                    if not job:
+                        payload = {'success': False, 'status': 'missing', 'message': 'AI 总结任务不存在'}
+                        yield json.dumps(payload, ensure_ascii=False) + '\n'
+                        return
+                    marker = (job['status'], job.get('stream_revision') or 0, job.get('updated_at'))
+                    if marker != last_marker:
+                        payload, _ = ai_summary_job_payload(job, legacy=legacy)
+                        yield json.dumps(payload, ensure_ascii=False) + '\n'
+                        last_marker = marker
+                        last_keepalive = time.monotonic()
+                    if finished:
+                        return
+                if time.monotonic() - last_keepalive >= 15:
+                    yield json.dumps({'type': 'keepalive'}) + '\n'
+                    last_keepalive = time.monotonic()
+        finally:
+            unsubscribe_ai_summary_job(watcher)
 
     response = Response(generate(), content_type='application/x-ndjson; charset=utf-8')
     response.headers['Cache-Control'] = 'no-store, private'
@@ -1120,21 +2068,13 @@ def build_media_display_metadata(tags):
 @lru_cache(maxsize=256)
 def _probe_media_metadata(filepath, file_mtime_ns, file_size):
     """一次读取播放器需要的媒体标签；文件属性用于缓存自动失效。"""
-    del file_mtime_ns, file_size
     try:
-        result = subprocess.run(
-            [
-                'ffprobe', '-v', 'error',
-                '-show_entries',
-                'format_tags=title,artist,album,date,genre,description,synopsis,purl,comment',
-                '-of', 'json', filepath,
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
-            timeout=15,
+        payload = load_media_probe(
+            filepath,
+            'format_tags',
+            file_mtime_ns,
+            file_size,
         )
-        payload = json.loads(result.stdout)
         raw_tags = payload.get('format', {}).get('tags', {})
     except (FileNotFoundError, subprocess.SubprocessError, json.JSONDecodeError) as exc:
         app.logger.warning("读取媒体 metadata 失败，使用默认信息: %s (%s)", filepath, exc)
@@ -1355,6 +2295,7 @@ def index():
     if request.method == 'POST':
         url = request.form.get('url')
         types = request.form.getlist('type')
+        force = is_truthy_flag(request.form.get('force'))
 
         # 从分享文本中提取URL
         url = extract_url(url)
@@ -1369,7 +2310,18 @@ def index():
                 show_waline=config.get("SHOW_WALINE_ON_INDEX", False),
             ), 400
 
-        # 播放列表展开为逐集 URL，再逐个创建任务
+        # 播放列表在后台解析，页面立即跳转并随解析进度显示逐集任务
+        if looks_like_playlist(url):
+            job_id = submit_playlist_job(url, types, force=force)
+            if job_id:
+                return redirect(url_for(
+                    'index',
+                    url=url,
+                    types=','.join(types),
+                    tasks=job_id,
+                ))
+
+        # 台账不可用时回退为同步展开
         urls, error = expand_task_urls(url)
         if error:
             return render_template(
@@ -1381,7 +2333,13 @@ def index():
                 show_waline=config.get("SHOW_WALINE_ON_INDEX", False),
             ), 400
 
-        task_ids = create_tasks(urls, types)
+        existing = {} if force else find_duplicate_tasks(urls, types)
+        task_ids = create_tasks(
+            urls,
+            types,
+            existing=existing,
+            group=playlist_cache_key(url) if len(urls) > 1 else None,
+        )
 
         # 构建重定向URL，包含所有参数
         redirect_url = url_for('index', 
@@ -1437,6 +2395,7 @@ def player():
         video_files.remove(requested_file)
         video_files.insert(0, requested_file)
 
+    prefetch_media_index([os.path.join(FILES_DIR, filename) for filename in video_files])
     subtitle_tracks = {}
     video_metadata = {}
     for filename in video_files:
@@ -1499,6 +2458,7 @@ def audio_player():
         for language, quality in request.accept_languages
         if quality > 0
     ]
+    prefetch_media_index([os.path.join(FILES_DIR, filename) for filename in audio_files])
     for filename in audio_files:
         metadata = get_audio_metadata(filename, fallback_cover_url)
         metadata.update({
@@ -1726,6 +2686,8 @@ def api_add_task():
     data = request.get_json() if request.is_json else request.form
     url = data.get('url')
     types = data.get('types')
+    # force 为真时忽略已有任务，重新下载
+    force = is_truthy_flag(data.get('force'))
 
     # 从分享文本中提取URL
     url = extract_url(url)
@@ -1736,19 +2698,45 @@ def api_add_task():
         # 支持表单传递的字符串类型
         types = [types]
 
-    # 播放列表展开为逐集 URL，再逐个创建任务
+    # 播放列表在后台解析，立即返回播放列表任务 ID；逐集任务通过 task_info 查询
+    if looks_like_playlist(url):
+        job_id = submit_playlist_job(url, types, force=force)
+        if job_id:
+            return jsonify({
+                "success": True,
+                "msg": "播放列表正在后台解析，逐集任务会陆续创建",
+                "tasks": [job_id],
+                "playlist_job": job_id,
+            })
+
+    # 台账不可用时回退为同步展开
     urls, error = expand_task_urls(url)
     if error:
         return jsonify({"success": False, "msg": error}), 400
 
-    # 使用新的辅助函数创建任务
-    tasks = create_tasks(urls, types)
+    # 已排队、下载中或已下载过的视频复用已有任务
+    existing = {} if force else find_duplicate_tasks(urls, types)
+    tasks = create_tasks(
+        urls,
+        types,
+        existing=existing,
+        group=playlist_cache_key(url) if len(urls) > 1 else None,
+    )
 
     if len(urls) > 1:
         msg = f"播放列表已解析为 {len(urls)} 个视频，共创建 {len(tasks)} 个任务"
+        if existing:
+            msg += f"，其中 {len(existing)} 个复用已有任务"
+    elif existing:
+        msg = "Task already exists"
     else:
         msg = "Task added successfully" if len(tasks) == 1 else "Tasks added successfully"
-    return jsonify({"success": True, "msg": msg, "tasks": tasks})
+    return jsonify({
+        "success": True,
+        "msg": msg,
+        "tasks": tasks,
+        "duplicates": sorted(set(existing.values())),
+    })
 
 @app.route('/api/task_info', methods=['POST'])
 def api_task_info():
@@ -1758,8 +2746,87 @@ def api_task_info():
         return jsonify({"success": False, "msg": "Missing required parameter: tasks"}), 400
     if not isinstance(tasks, list):
         tasks = [tasks]
-    result = [get_task_info(task) for task in tasks]
-    return jsonify({"success": True, "tasks": result})
+    started_at = time.perf_counter()
+    if len(tasks) > 1:
+        result = get_task_infos(tasks)
+    else:
+        result = [get_task_info(task) for task in tasks]
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    if elapsed_ms >= TASK_INFO_SLOW_MS:
+        app.logger.warning(
+            "任务状态查询较慢: %d 个任务，耗时 %.1f ms",
+            len(tasks),
+            elapsed_ms,
+        )
+    response = jsonify({
+        "success": True,
+        "tasks": result,
+        "elapsed_ms": round(elapsed_ms, 3),
+    })
+    response.headers['Server-Timing'] = (
+        f'task_info;dur={elapsed_ms:.3f};desc="{len(tasks)} tasks"'
+    )
+    return response
+
+
+@app.route('/api/task_stream', methods=['GET', 'POST'])
+def api_task_stream():
+    """以 NDJSON 推送一组任务的状态变化，取代客户端轮询 /api/task_info。"""
+    if request.method == 'GET':
+        tasks = [
+            task
+            for value in request.args.getlist('tasks')
+            for task in value.split(',')
+            if task
+        ]
+    else:
+        data = request.get_json(silent=True) if request.is_json else request.form
+        tasks = (data or {}).get('tasks')
+        if tasks and not isinstance(tasks, list):
+            tasks = [tasks]
+    if not tasks:
+        return jsonify({"success": False, "msg": "Missing required parameter: tasks"}), 400
+    tasks = list(dict.fromkeys(tasks))
+    if len(tasks) > TASK_STREAM_MAX_TASKS:
+        return jsonify({
+            "success": False,
+            "msg": f"Too many tasks (max {TASK_STREAM_MAX_TASKS})",
+        }), 400
+
+    @stream_with_context
+    def generate():
+        last_sent = {}
+        last_keepalive = time.monotonic()
+        known = set(tasks)
+        while True:
+            infos = cached_task_infos(tasks)
+            # 播放列表任务解析出的新逐集任务加入订阅，并立即推送其状态
+            added = []
+            for info in infos:
+                for child in info.get("tasks", ()) if info.get("kind") == 'playlist' else ():
+                    if child not in known and len(tasks) < TASK_STREAM_MAX_EXPANDED_TASKS:
+                        known.add(child)
+                        tasks.append(child)
+                        added.append(child)
+            if added:
+                infos = infos + cached_task_infos(added)
+            for info in infos:
+                if last_sent.get(info["task"]) != info:
+                    yield json.dumps({"type": "task", **info}, ensure_ascii=False) + '\n'
+                    last_sent[info["task"]] = info
+                    last_keepalive = time.monotonic()
+            if all(is_terminal_task_info(info) for info in infos):
+                yield json.dumps({"type": "done"}) + '\n'
+                return
+            if time.monotonic() - last_keepalive >= TASK_STREAM_KEEPALIVE_SECONDS:
+                yield json.dumps({"type": "keepalive"}) + '\n'
+                last_keepalive = time.monotonic()
+            time.sleep(TASK_STREAM_INTERVAL_SECONDS)
+
+    response = Response(generate(), content_type='application/x-ndjson; charset=utf-8')
+    response.headers['Cache-Control'] = 'no-store, private'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 def read_downloader_log_chunk(filepath, cursor=None, expected_file_id=None):
@@ -1797,6 +2864,32 @@ def read_downloader_log_chunk(filepath, cursor=None, expected_file_id=None):
     }
 
 
+@app.route('/api/download_queue', methods=['GET'])
+def api_download_queue():
+    """返回下载器最近发布的队列深度快照。"""
+    snapshot_path = os.path.join(config["LOG_DIR"], QUEUE_SNAPSHOT_FILENAME)
+    try:
+        with open(snapshot_path, 'r', encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except FileNotFoundError:
+        return jsonify({"success": False, "msg": "下载器尚未发布队列状态"}), 404
+    except (OSError, ValueError) as exc:
+        return jsonify({"success": False, "msg": f"读取队列状态失败: {exc}"}), 500
+    response = jsonify({"success": True, "queue": snapshot})
+    response.headers['Cache-Control'] = 'no-store, private'
+    return response
+
+
+@app.route('/api/task_events/<task>', methods=['GET'])
+def api_task_events(task):
+    """返回任务在结构化事件日志中的事件（开始、重试、移动、完成或失败）。"""
+    if not TASK_ID_PATTERN.fullmatch(task):
+        return jsonify({"success": False, "msg": "Invalid task id"}), 400
+    response = jsonify({"success": True, "task": task, "events": read_task_events(task)})
+    response.headers['Cache-Control'] = 'no-store, private'
+    return response
+
+
 @app.route('/api/downloader_log', methods=['GET'])
 def api_downloader_log():
     def log_response(payload, status=200):
@@ -1867,6 +2960,104 @@ def favicon():
     return send_from_directory(os.path.join(app.static_folder, 'images'),
                              'favicon.ico', mimetype='image/vnd.microsoft.icon')
 
+def video_info_cache_key(url):
+    try:
+        return ai_summary_store.normalize_source_url(url)
+    except ValueError:
+        return url.strip()
+
+
+def clear_video_info_cache():
+    _video_info_cache.clear()
+
+
+def video_info_cache_stats():
+    return _video_info_cache.stats()
+
+
+def extract_video_info(url):
+    """调用 yt-dlp 提取视频信息，返回 /api/video_info 的响应内容。"""
+    # 检查是否存在.local.conf文件
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    default_conf_file = 'yt-dlp.conf'
+    local_conf_file = default_conf_file.replace('.conf', '.local.conf')
+    local_conf_path = os.path.join(script_dir, local_conf_file)
+    default_conf_path = os.path.join(script_dir, default_conf_file)
+    
+    # 优先使用.local.conf文件，如果不存在则使用默认配置文件
+    conf_path = local_conf_path if os.path.exists(local_conf_path) else default_conf_path
+    cmd = [
+        'yt-dlp',
+        '--config-location', conf_path,
+        # 视频信息查询不继承下载配置中的 -t sleep 等限速等待设置。
+        '--sleep-requests', '0',
+        '--sleep-interval', '0',
+        '--max-sleep-interval', '0',
+        '--sleep-subtitles', '0',
+        '--dump-single-json',
+        '--no-playlist',
+        '--no-warnings',
+        url,
+    ]
+
+    result = ytdlp_engine.run(
+        cmd,
+        config,
+        check=True,
+        timeout=VIDEO_INFO_TIMEOUT_SECONDS,
+    )
+    info = json.loads(result.stdout)
+    platform = info.get('extractor_key') or info.get('extractor') or '未知平台'
+    uploader = (
+        info.get('uploader')
+        or info.get('channel')
+        or info.get('creator')
+        or info.get('artist')
+        or platform
+    )
+
+    video_info = {
+        "success": True,
+        "title": info.get('title'),
+        "description": info.get('description'),
+        "duration": info.get('duration'),
+        "uploader": uploader,
+        "platform": platform,
+        "upload_date": info.get('upload_date'),
+        "view_count": info.get('view_count'),
+        "like_count": info.get('like_count'),
+        "thumbnail": info.get('thumbnail'),
+        "formats": [{
+            "format_id": f.get('format_id'),
+            "ext": f.get('ext'),
+            "resolution": f.get('resolution'),
+            "filesize": f.get('filesize'),
+            "format_note": f.get('format_note'),
+            "vcodec": f.get('vcodec'),
+            "acodec": f.get('acodec'),
+        } for f in info.get('formats', []) if f.get('vcodec') != 'none'],
+        "audio_formats": [{
+            "format_id": f.get('format_id'),
+            "ext": f.get('ext'),
+            "filesize": f.get('filesize'),
+            "acodec": f.get('acodec'),
+        } for f in info.get('formats', []) if f.get('vcodec') == 'none'],
+    }
+    return video_info
+
+
+def get_video_info(url):
+    """返回 (video_info, cache_status)；cache_status 为 hit、shared 或 miss。
+
+    只缓存成功结果。同一规范化 URL 已有提取在进行时，后来的请求等待
+    并共享该结果（包括失败），不再各自启动 yt-dlp。
+    """
+    return _video_info_cache.get(
+        video_info_cache_key(url),
+        lambda: extract_video_info(url),
+    )
+
+
 @app.route('/api/video_info', methods=['POST'])
 def api_video_info():
     data = request.get_json() if request.is_json else request.form
@@ -1878,75 +3069,14 @@ def api_video_info():
     if not url:
         return jsonify({"success": False, "msg": "Missing required parameter: url"}), 400
     
+    started_at = time.perf_counter()
     try:
-        # 检查是否存在.local.conf文件
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        default_conf_file = 'yt-dlp.conf'
-        local_conf_file = default_conf_file.replace('.conf', '.local.conf')
-        local_conf_path = os.path.join(script_dir, local_conf_file)
-        default_conf_path = os.path.join(script_dir, default_conf_file)
-        
-        # 优先使用.local.conf文件，如果不存在则使用默认配置文件
-        conf_path = local_conf_path if os.path.exists(local_conf_path) else default_conf_path
-        cmd = [
-            'yt-dlp',
-            '--config-location', conf_path,
-            # 视频信息查询不继承下载配置中的 -t sleep 等限速等待设置。
-            '--sleep-requests', '0',
-            '--sleep-interval', '0',
-            '--max-sleep-interval', '0',
-            '--sleep-subtitles', '0',
-            '--dump-single-json',
-            '--no-playlist',
-            '--no-warnings',
-            url,
-        ]
-
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        info = json.loads(result.stdout)
-        platform = info.get('extractor_key') or info.get('extractor') or '未知平台'
-        uploader = (
-            info.get('uploader')
-            or info.get('channel')
-            or info.get('creator')
-            or info.get('artist')
-            or platform
-        )
-
-        video_info = {
-            "success": True,
-            "title": info.get('title'),
-            "description": info.get('description'),
-            "duration": info.get('duration'),
-            "uploader": uploader,
-            "platform": platform,
-            "upload_date": info.get('upload_date'),
-            "view_count": info.get('view_count'),
-            "like_count": info.get('like_count'),
-            "thumbnail": info.get('thumbnail'),
-            "formats": [{
-                "format_id": f.get('format_id'),
-                "ext": f.get('ext'),
-                "resolution": f.get('resolution'),
-                "filesize": f.get('filesize'),
-                "format_note": f.get('format_note'),
-                "vcodec": f.get('vcodec'),
-                "acodec": f.get('acodec'),
-            } for f in info.get('formats', []) if f.get('vcodec') != 'none'],
-            "audio_formats": [{
-                "format_id": f.get('format_id'),
-                "ext": f.get('ext'),
-                "filesize": f.get('filesize'),
-                "acodec": f.get('acodec'),
-            } for f in info.get('formats', []) if f.get('vcodec') == 'none'],
-        }
-
-        return jsonify(video_info)
+        video_info, cache_status = get_video_info(url)
+        response = jsonify(video_info)
+        response.headers['X-Video-Info-Cache'] = cache_status
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        response.headers['Server-Timing'] = f'video_info;dur={elapsed_ms:.1f}'
+        return response
             
     except Exception as e:
         if isinstance(e, subprocess.CalledProcessError):
@@ -1960,6 +3090,12 @@ def api_video_info():
             "msg": f"Failed to get video info: {detail}"
         }), 500
 
+
+@app.route('/api/video_info/cache_stats', methods=['GET'])
+def api_video_info_cache_stats():
+    return jsonify({"success": True, **video_info_cache_stats()})
+
+
 def get_youtube_cookie():
     """从API获取YouTube cookie并保存到文件"""
     try:
@@ -2011,6 +3147,14 @@ def get_cookie_command():
     except Exception as e:
         click.echo(f"执行过程中发生错误: {str(e)}", err=True)
 
+@app.cli.command("import-tasks")
+@with_appcontext
+def import_tasks_command():
+    """把 URLS_DIR 中已有的任务文件导入任务台账"""
+    db_path = task_store.open_ledger(URLS_DIR)
+    imported = task_store.import_urls_dir(db_path, URLS_DIR)
+    click.echo(f"已导入 {imported} 个任务到 {db_path}")
+
 @app.route('/api/get-cookie', methods=['GET', 'POST'])
 def api_get_cookie():
     current_time = get_current_time()
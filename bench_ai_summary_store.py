@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""ai_summary_store 热点函数微基准：对比复用连接与每次重新建连的吞吐量。
+
+用法: python bench_ai_summary_store.py [--seconds 2]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import ai_summary_store as store
+
+
+def measure(operation, seconds, reconnect):
+    """在限定时间内反复执行 operation，返回每秒次数。"""
+    count = 0
+    deadline = time.perf_counter() + seconds
+    started_at = time.perf_counter()
+    while time.perf_counter() < deadline:
+        if reconnect:
+            # 关闭线程缓存的连接，模拟连接池引入前每次调用都新建连接。
+            store.close_connections()
+        operation()
+        count += 1
+    return count / (time.perf_counter() - started_at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ai_summary_store 连接复用基准')
+    parser.add_argument('--seconds', type=float, default=2.0, help='每项测量持续秒数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'bench.sqlite3')
+        store.init_db(db_path)
+        url = 'https://www.youtube.com/watch?v=l38ceFOWOAE'
+        job = store.create_url_job(db_path, url, url, 'bench-profile')['job']
+        job_id = job['id']
+        partial = ['## 基准']
+
+        def update_job_stream():
+            partial[0] += ' 增量'
+            store.update_job_stream(db_path, job_id, partial[0][-2000:])
+
+        operations = (
+            ('get_job', lambda: store.get_job(db_path, job_id)),
+            ('get_job_marker', lambda: store.get_job_marker(db_path, job_id)),
+            ('update_job_stream', update_job_stream),
+            ('find_summary_for_url', lambda: store.find_summary_for_url(db_path, url, 'bench-profile')),
+        )
+        print(f"{'操作':<22}{'每次建连 ops/s':>16}{'复用连接 ops/s':>16}{'倍数':>8}")
+        for name, operation in operations:
+            baseline = measure(operation, args.seconds, reconnect=True)
+            pooled = measure(operation, args.seconds, reconnect=False)
+            print(f'{name:<22}{baseline:>16.0f}{pooled:>16.0f}{pooled / baseline:>8.1f}')
+        store.close_connections()
+
+
+if __name__ == '__main__':
+    main()
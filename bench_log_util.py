@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""日志基准：多个下载线程同时写日志时，对比同步写文件与队列异步写入的吞吐。
+
+每个线程模拟一个下载 worker，连续写入 yt-dlp 进度行；统计业务线程写完全部
+记录的耗时（生产者吞吐），以及后台线程把队列写完后的总耗时。
+
+用法: python bench_log_util.py [--threads 4] [--records 20000]
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import threading
+import time
+import uuid
+
+import log_util
+
+
+PROGRESS_LINE = (
+    'PYDL_PROGRESS|downloading| 42.5%|425.00MiB|1.00GiB|'
+    '12.34MiB/s|00:47|mp4|137|avc1.640028|none'
+)
+
+
+def run(asynchronous, threads, records, log_dir):
+    """返回 (生产者耗时秒, 含落盘总耗时秒)。"""
+    logger = log_util.setup_logger(
+        name=f'bench-{uuid.uuid4().hex}',
+        log_dir=log_dir,
+        log_file=f"{'async' if asynchronous else 'sync'}.log",
+        max_bytes=10 * 1024 * 1024,
+        backup_count=2,
+        timezone='Asia/Shanghai',
+        asynchronous=asynchronous,
+    )
+    logger.propagate = False
+    start = threading.Barrier(threads + 1)
+
+    def worker(index):
+        start.wait()
+        for number in range(records):
+            logger.info('[%d] %s #%d', index, PROGRESS_LINE, number)
+
+    workers = [
+        threading.Thread(target=worker, args=(index,))
+        for index in range(threads)
+    ]
+    for thread in workers:
+        thread.start()
+    start.wait()
+    started_at = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    produced = time.perf_counter() - started_at
+    for handler in list(logger.handlers):
+        listener = getattr(handler, 'listener', None)
+        if listener is not None:
+            log_util.stop_listener(listener)
+        handler.close()
+        logger.removeHandler(handler)
+    return produced, time.perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description='同步与异步日志吞吐对比基准')
+    parser.add_argument('--threads', type=int, default=4, help='并发写日志的线程数')
+    parser.add_argument('--records', type=int, default=20000, help='每个线程写入的记录数')
+    args = parser.parse_args()
+    total = args.threads * args.records
+
+    results = []
+    with tempfile.TemporaryDirectory() as log_dir:
+        # 控制台处理器的输出丢弃，避免终端速度影响结果
+        with contextlib.redirect_stdout(io.StringIO()):
+            for asynchronous in (False, True):
+                results.append((asynchronous, *run(
+                    asynchronous,
+                    args.threads,
+                    args.records,
+                    log_dir,
+                )))
+
+    print(f'{args.threads} 个线程，共 {total} 条记录')
+    print(f"{'模式':<8}{'生产者 条/秒':>16}{'含落盘 条/秒':>16}")
+    for asynchronous, produced, drained in results:
+        name = 'queue' if asynchronous else 'sync'
+        print(f'{name:<8}{total / produced:>16.0f}{total / drained:>16.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""yt-dlp 执行引擎基准：对比每次启动子进程与常驻进程的单次耗时和 CPU 时间。
+
+默认离线执行 --load-info-json（不访问网络，只衡量启动与导入开销）；
+传入 --url 时对真实链接执行 --dump-single-json 信息提取。
+
+用法: python bench_ytdlp_engine.py [--runs 10] [--url URL]
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+
+import psutil
+
+import ytdlp_engine
+
+
+SAMPLE_INFO = {
+    'id': 'bench-video',
+    'title': '基准视频',
+    'extractor': 'generic',
+    'extractor_key': 'Generic',
+    'webpage_url': 'https://example.com/watch/bench-video',
+    'formats': [
+        {
+            'format_id': '18',
+            'url': 'https://example.com/media/bench-video.mp4',
+            'ext': 'mp4',
+            'vcodec': 'avc1.42001E',
+            'acodec': 'mp4a.40.2',
+            'width': 640,
+            'height': 360,
+        },
+    ],
+}
+
+
+def children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def workers_cpu_seconds(pids):
+    total = 0.0
+    for pid in pids:
+        try:
+            times = psutil.Process(pid).cpu_times()
+        except psutil.Error:
+            continue
+        total += times.user + times.system
+    return total
+
+
+def measure(run_command, runs, cpu_seconds):
+    """执行 runs 次命令，返回 (平均耗时毫秒, 平均 CPU 毫秒)。"""
+    cpu_before = cpu_seconds()
+    started_at = time.perf_counter()
+    for _ in range(runs):
+        result = run_command()
+        if result.returncode != 0:
+            raise SystemExit(f'yt-dlp 执行失败: {result.stderr.strip()}')
+    wall = time.perf_counter() - started_at
+    cpu = cpu_seconds() - cpu_before
+    return wall / runs * 1000, cpu / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='yt-dlp 子进程与常驻进程对比基准')
+    parser.add_argument('--runs', type=int, default=10, help='每种模式执行次数')
+    parser.add_argument('--url', help='对真实链接做信息提取（需要网络）')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.url:
+            cmd = [
+                'yt-dlp', '--ignore-config', '--simulate', '--no-playlist',
+                '--dump-single-json', args.url,
+            ]
+        else:
+            info_path = os.path.join(temp_dir, 'bench.info.json')
+            with open(info_path, 'w', encoding='utf-8') as info_file:
+                json.dump(SAMPLE_INFO, info_file, ensure_ascii=False)
+            cmd = [
+                'yt-dlp', '--ignore-config', '--load-info-json', info_path,
+                '--simulate', '--print', '%(id)s',
+            ]
+
+        subprocess_config = {'YT_DLP_ENGINE': ytdlp_engine.ENGINE_SUBPROCESS}
+        subprocess_wall, subprocess_cpu = measure(
+            lambda: ytdlp_engine.run(cmd, subprocess_config, timeout=300),
+            args.runs,
+            children_cpu_seconds,
+        )
+
+        engine = ytdlp_engine.YtDlpEngine(
+            idle_workers=1,
+            max_tasks_per_worker=args.runs + 2,
+        )
+        started_at = time.perf_counter()
+        engine.prestart(1)
+        # 首条命令会等待 worker 完成导入，单独计入启动耗时
+        engine.run(cmd, timeout=300)
+        startup_ms = (time.perf_counter() - started_at) * 1000
+        pids = engine.worker_pids()
+        embedded_wall, embedded_cpu = measure(
+            lambda: engine.run(cmd, timeout=300),
+            args.runs,
+            lambda: workers_cpu_seconds(pids),
+        )
+        engine.close()
+
+    print(f"{'模式':<12}{'耗时 ms/次':>14}{'CPU ms/次':>14}")
+    print(f"{'subprocess':<12}{subprocess_wall:>14.1f}{subprocess_cpu:>14.1f}")
+    print(f"{'embedded':<12}{embedded_wall:>14.1f}{embedded_cpu:>14.1f}")
+    print(f'常驻进程启动（含首条命令）: {startup_ms:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,20 +5,33 @@ from datetime import datetime
 import pytz
 
 MOVE_STAGING_PREFIX = '.pyyoutubedl-moving-'
+# downloader 写入 LOG_DIR、Web 端读取的下载队列快照文件名
+QUEUE_SNAPSHOT_FILENAME = 'download_queue.json'
 
 # 默认配置
 DEFAULT_CONFIG = {
     # 下载器配置
     "URLS_DIR": "./urls",           # 存放待下载URL文件的目录
     "TMP_DIR": "./tmp",             # 下载时的临时目录
+    "TMP_RETENTION_HOURS": 72,      # 下载器启动时清理超过该时长的非活动任务临时目录（小时）
+    "DOWNLOAD_STAGING_IN_FILES_DIR": False, # 直接下载到 FILES_DIR 下的暂存子目录，完成后无需跨文件系统复制
     "FILES_DIR": "./files",         # 下载完成后的文件存放目录
     "LOG_DIR": "../logs",           # 日志存放目录
     "MAX_WORKERS": 4,               # 最大并行下载数
     "PLAYLIST_MAX_ITEMS": 500,      # 单个播放列表最多展开的任务数，超出则拒绝
-    "DOWNLOAD_MIN_INTERVAL_SECONDS": 10, # 两次下载启动的最小间隔（秒），0 表示不限速
+    "DOWNLOAD_MIN_INTERVAL_SECONDS": 10, # 同一站点两次下载启动的最小间隔（秒），0 表示不限速
+    "DOWNLOAD_BURST": 1,            # 每个站点允许连续启动的下载数（令牌桶容量）
+    "DOWNLOAD_BACKOFF_INITIAL_SECONDS": 30, # 站点首次限流时增加的启动间隔（秒），之后每次翻倍
+    "DOWNLOAD_BACKOFF_MAX_SECONDS": 600, # 限流退避增加的启动间隔上限（秒）
+    "DOWNLOAD_LANE_LIMITS": {},     # 视频/音频分道的最大并行数，如 {"video": 3, "audio": 1}；缺省为 MAX_WORKERS - 1
+    "DOWNLOAD_MAX_ATTEMPTS": 3,     # 网络中断等可重试失败的最大下载尝试次数（含首次），1 表示不重试
+    "DOWNLOAD_RETRY_BASE_SECONDS": 30, # 首次重试前的等待时长（秒），之后每次翻倍
+    "DOWNLOAD_RETRY_MAX_SECONDS": 600, # 重试等待时长上限（秒）
     "MAX_LOG_SIZE": 10 * 1024 * 1024, # 单个日志文件最大字节数
     "BACKUP_COUNT": 5,              # 日志备份保留数量
     "YT_DLP_OUTPUT_TEMPLATE": "%(title.0:20)s-%(id)s.%(ext)s", # yt-dlp 文件名输出模板
+    "YT_DLP_ENGINE": "subprocess",  # yt-dlp 执行方式：subprocess 每次启动进程，embedded 使用常驻进程
+    "YT_DLP_ENGINE_WORKERS": 2,     # embedded 模式保留的空闲常驻进程数
     "PLAYER_FILENAME_EXCLUDE_KEYWORDS": [], # 播放器列表排除的文件名关键词
     "AUDIO_PLAYER_FALLBACK_COVER_URL": "/static/images/audio-cover-default.svg", # 音频封面加载失败时的默认图
     "SHOW_WALINE_ON_INDEX": False,  # 是否在首页显示 Waline 评论
@@ -27,8 +40,11 @@ DEFAULT_CONFIG = {
     "AI_API_MODEL": "",             # AI 总结模型名称
     "AI_API_TOKEN": "",             # AI 总结接口 Token
     "AI_SUMMARY_DB_PATH": "./data/ai_summaries.sqlite3", # AI 总结持久化数据库
+    "MEDIA_INDEX_DB_PATH": "./data/media_index.sqlite3", # 播放器媒体元数据索引
     "AI_SUMMARY_ACCESS_TOKEN": "",  # Chrome 扩展调用 AI 总结接口的独立令牌
     "AI_SUMMARY_JOB_RETENTION_DAYS": 30, # 已完成/失败 AI 任务记录保留天数
+    "AI_SUMMARY_WORKER_CONCURRENCY": 1, # AI 总结 worker 同时处理的任务数
+    "AI_API_RATE_LIMIT_PER_MINUTE": 0, # 同一 AI 接口与模型每分钟最多发起的请求数，0 表示不限
     "BARK_DEVICE_TOKEN": "",        # Bark 通知推送 Token
     "EXTENSION_LOG_TOKEN": "",      # Chrome 扩展读取 downloader.log 的访问令牌；为空时禁用接口
     
@@ -51,7 +67,7 @@ DEFAULT_CONFIG = {
 # 需要转换为绝对路径的配置项
 PATH_CONFIG_KEYS = [
     "URLS_DIR",  "TMP_DIR", 
-    "FILES_DIR", "LOG_DIR", "AI_SUMMARY_DB_PATH"
+    "FILES_DIR", "LOG_DIR", "AI_SUMMARY_DB_PATH", "MEDIA_INDEX_DB_PATH"
 ]
 
 
@@ -7,16 +7,39 @@ import shutil
 import subprocess
 import json
 import logging
+import sqlite3
+import re
 import tempfile
 import threading
-from logging.handlers import RotatingFileHandler
+import itertools
+import heapq
+from collections import OrderedDict, deque
 from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from datetime import datetime
+from urllib.parse import urlparse
 from bark_util import bark_notify
-from config_util import MOVE_STAGING_PREFIX, build_dated_output_template, load_config
+from config_util import (
+    MOVE_STAGING_PREFIX,
+    QUEUE_SNAPSHOT_FILENAME,
+    build_dated_output_template,
+    load_config,
+)
+from event_log import EventLog
 from log_util import setup_logger
+import media_index
+import task_store
+import ytdlp_engine
+from task_progress import (
+    PROGRESS_SNAPSHOT_SUFFIX,
+    ProgressPublisher,
+    build_progress,
+    is_progress_line,
+    progress_snapshot_path,
+    remove_progress_snapshot,
+)
 
 # 加载配置
 config = load_config()
@@ -35,6 +58,21 @@ logger = setup_logger(
     timezone=config.get("TIMEZONE", "UTC")
 )
 
+
+def prune_event_index(segments):
+    """事件日志轮转删除分段后，同步删除任务台账中指向这些分段的索引。"""
+    record_task_ledger(config["URLS_DIR"], task_store.prune_task_events, segments)
+
+
+# 结构化事件日志，与 downloader.log 使用相同的轮转大小和保留数量
+event_log = EventLog(
+    config["LOG_DIR"],
+    'downloader',
+    config["MAX_LOG_SIZE"],
+    config["BACKUP_COUNT"],
+    on_prune=prune_event_index,
+)
+
 VIDEO_OUTPUT_EXTENSIONS = {'.avi', '.flv', '.mkv', '.mov', '.mp4', '.webm'}
 AUDIO_OUTPUT_EXTENSIONS = {'.aac', '.flac', '.m4a', '.mp3', '.ogg', '.opus', '.wav'}
 SUBTITLE_LANGUAGE_PREFERENCES = ('zh-Hans', 'zh-Hant', 'zh', 'en')
@@ -44,6 +82,99 @@ NON_SUMMARY_SUBTITLE_LANGUAGES = {
     'danmaku',
 }
 SUBTITLE_PROBE_TIMEOUT_SECONDS = 120
+# 跨文件系统移动：FICLONE ioctl 编号（_IOW(0x94, 9, int)），单次内核复制上限，
+# 以及表示“该复制方式不可用、应换下一种”的错误码。
+FICLONE = 0x40049409
+FAST_COPY_CHUNK_BYTES = 64 * 1024 * 1024
+FAST_COPY_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.ENOTTY,
+    errno.EBADF,
+    errno.EPERM,
+    errno.EOPNOTSUPP,
+    getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP),
+    getattr(errno, 'ENOTSOCK', errno.EINVAL),
+}
+# DOWNLOAD_STAGING_IN_FILES_DIR 开启时，下载临时目录放在 FILES_DIR 下的该子目录，
+# 与最终产物同一文件系统，完成后只需硬链接。
+DOWNLOAD_STAGING_DIRNAME = f'{MOVE_STAGING_PREFIX}downloads'
+# 完成下载后并行移动产物的线程数上限
+MOVE_MAX_WORKERS = 4
+# yt-dlp 输出管道：任务日志批量写入，最长延迟该时长刷新；
+# downloader.log 中同一任务的进度行每个间隔只保留最新一条。
+TASK_LOG_FLUSH_SECONDS = 1.0
+DOWNLOADER_LOG_PROGRESS_INTERVAL_SECONDS = 10
+# 调度器按媒体类型分道，单个 URL 提交优先于播放列表条目。
+DOWNLOAD_LANES = ('video', 'audio')
+# 队列快照的最短写入间隔：批量入队、任务频繁开始结束时合并为一次写入。
+QUEUE_SNAPSHOT_INTERVAL_SECONDS = 1.0
+PRIORITY_SINGLE = 'single'
+PRIORITY_PLAYLIST = 'playlist'
+# yt-dlp 输出中表示站点限流或要求人机验证的提示，出现时放慢该站点的下载启动节奏。
+# 人机验证只匹配完整提示（YouTube 可能使用弯引号）；年龄验证 “Sign in to confirm
+# your age” 是永久性错误，不是限流。
+THROTTLE_MARKERS = (
+    'HTTP Error 429',
+    'Too Many Requests',
+    "Sign in to confirm you're not a bot",
+    'Sign in to confirm you\u2019re not a bot',
+)
+# yt-dlp 错误行的失败分类：网络抖动、服务端临时错误和限流可以自动重试并续传，
+# 其余错误（视频不存在、私有、地区限制等）以及没有错误行的失败不会重试。
+# 永久性错误优先匹配。
+PERMANENT_ERROR_MARKERS = (
+    'Video unavailable',
+    'Private video',
+    'members-only',
+    'Join this channel',
+    'Unsupported URL',
+    'is not a valid URL',
+    'has been removed',
+    'copyright',
+    'not available in your country',
+    'Sign in to confirm your age',
+    'Premieres in',
+    'This live event will begin',
+    'HTTP Error 404',
+    'HTTP Error 410',
+    'No video formats found',
+    'Requested format is not available',
+)
+RETRYABLE_ERROR_MARKERS = (
+    'timed out',
+    'Connection reset',
+    'Connection aborted',
+    'Connection refused',
+    'Remote end closed connection',
+    'IncompleteRead',
+    'Temporary failure in name resolution',
+    'Name or service not known',
+    'Network is unreachable',
+    'HTTP Error 500',
+    'HTTP Error 502',
+    'HTTP Error 503',
+    'HTTP Error 504',
+    'Unable to download video data',
+    'Did not get any data blocks',
+    'giving up after',
+    *THROTTLE_MARKERS,
+)
+FAILURE_RETRYABLE = 'retryable'
+FAILURE_PERMANENT = 'permanent'
+# 下载器启动时清理的残留：非活动任务的临时目录保留一段时间供手动恢复，
+# 跨文件系统移动的暂存文件超过一小时视为中断残留。
+MOVE_STAGING_STALE_SECONDS = 3600
+TASK_ID_PATTERN = re.compile(r'^[va]\d{14}[A-Za-z0-9_-]*$')
+# build_dated_output_template 添加的下载开始时间前缀
+OUTPUT_PREFIX_PATTERN = re.compile(r'^(\d{8})-')
+# 短链接域名归入主站点，与主站点共享节流桶。
+RATE_LIMIT_HOST_ALIASES = {
+    'youtu.be': 'youtube.com',
+    'youtube-nocookie.com': 'youtube.com',
+    'b23.tv': 'bilibili.com',
+}
 
 
 def _available_subtitle_languages(subtitle_map):
@@ -163,8 +294,49 @@ def _first_video_info(info):
     return info
 
 
-def probe_subtitle_fallback(url, conf_path):
-    """使用实际 yt-dlp 配置预检字幕，仅在配置未匹配时返回回退项。"""
+def save_probe_info(info, info_json_path):
+    """原子保存预检得到的单个视频信息，供正式下载通过 --load-info-json 复用。"""
+    directory = os.path.dirname(info_json_path) or '.'
+    temporary_path = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            mode='w',
+            encoding='utf-8',
+            prefix='.info-',
+            suffix='.tmp',
+            dir=directory,
+            delete=False,
+        ) as info_file:
+            temporary_path = info_file.name
+            json.dump(info, info_file, ensure_ascii=False)
+        os.replace(temporary_path, info_json_path)
+        return True
+    except (OSError, TypeError, ValueError) as exc:
+        logger.warning("保存预检信息失败，正式下载将重新解析页面: %s", exc)
+        if temporary_path and os.path.exists(temporary_path):
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+        return False
+
+
+def remove_probe_info(info_json_path):
+    """预检信息包含带签名的媒体地址，下载结束后立即删除。"""
+    try:
+        os.remove(info_json_path)
+    except FileNotFoundError:
+        pass
+    except OSError as exc:
+        logger.warning("删除预检信息失败: %s (%s)", info_json_path, exc)
+
+
+def probe_subtitle_fallback(url, conf_path, info_json_path=None):
+    """使用实际 yt-dlp 配置预检字幕，仅在配置未匹配时返回回退项。
+
+    提供 info_json_path 且预检结果是单个视频时，同时保存完整视频信息，
+    正式下载可以直接加载而无需再次请求页面、播放器脚本和格式清单。
+    """
     cmd = [
         'yt-dlp',
         '--config-location', conf_path,
@@ -179,10 +351,9 @@ def probe_subtitle_fallback(url, conf_path):
         url,
     ]
     try:
-        result = subprocess.run(
+        result = ytdlp_engine.run(
             cmd,
-            capture_output=True,
-            text=True,
+            config,
             timeout=SUBTITLE_PROBE_TIMEOUT_SECONDS,
         )
     except (OSError, subprocess.TimeoutExpired) as exc:
@@ -196,11 +367,20 @@ def probe_subtitle_fallback(url, conf_path):
         )
         return None
     try:
-        video_info = _first_video_info(json.loads(result.stdout))
+        info = json.loads(result.stdout)
+        video_info = _first_video_info(info)
     except (TypeError, json.JSONDecodeError) as exc:
         logger.warning("字幕预检结果无法解析，继续使用原配置: %s", exc)
         return None
 
+    if (
+        info_json_path
+        and isinstance(info, dict)
+        and video_info is info
+        and info.get('_type', 'video') == 'video'
+    ):
+        save_probe_info(info, info_json_path)
+
     fallback = select_subtitle_fallback(video_info)
     if fallback:
         language, subtitle_type = fallback
@@ -234,8 +414,91 @@ def link_to_unique_destination(source, destination):
             counter += 1
 
 
-def move_without_overwrite(source, destination):
-    """移动文件且绝不覆盖目标；跨文件系统时先在目标目录暂存。"""
+def _clone_file(source_fd, destination_fd, size):
+    """Linux FICLONE：支持写时复制的文件系统（Btrfs、XFS 等）共享数据块，不复制内容。"""
+    import fcntl
+    fcntl.ioctl(destination_fd, getattr(fcntl, 'FICLONE', FICLONE), source_fd)
+    return size
+
+
+def _copy_with_copy_file_range(source_fd, destination_fd, size):
+    copied = 0
+    while copied < size:
+        count = os.copy_file_range(
+            source_fd,
+            destination_fd,
+            min(FAST_COPY_CHUNK_BYTES, size - copied),
+        )
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+def _copy_with_sendfile(source_fd, destination_fd, size):
+    copied = 0
+    while copied < size:
+        count = os.sendfile(
+            destination_fd,
+            source_fd,
+            copied,
+            min(FAST_COPY_CHUNK_BYTES, size - copied),
+        )
+        if count == 0:
+            break
+        copied += count
+    return copied
+
+
+# 跨文件系统复制依次尝试的内核内复制方式；均不可用时退回用户态缓冲复制。
+FAST_COPY_METHODS = tuple(
+    (name, function)
+    for name, function, available in (
+        ('ficlone', _clone_file, sys.platform.startswith('linux')),
+        ('copy_file_range', _copy_with_copy_file_range, hasattr(os, 'copy_file_range')),
+        # 只有 Linux 的 sendfile 允许输出到普通文件
+        ('sendfile', _copy_with_sendfile, sys.platform.startswith('linux')),
+    )
+    if available
+)
+
+
+def copy_file_contents(source, destination):
+    """把 source 的内容写入 destination，返回实际使用的复制方式。
+
+    内核不支持某种方式（跨文件系统克隆、旧内核、特殊文件系统等）时清空目标后
+    尝试下一种，最后使用 shutil.copyfileobj。
+    """
+    with open(source, 'rb', buffering=0) as source_file, \
+            open(destination, 'wb', buffering=0) as destination_file:
+        source_fd = source_file.fileno()
+        destination_fd = destination_file.fileno()
+        size = os.fstat(source_fd).st_size
+        for method, copy in FAST_COPY_METHODS:
+            try:
+                if copy(source_fd, destination_fd, size) == size:
+                    return method
+            except OSError as exc:
+                if exc.errno not in FAST_COPY_FALLBACK_ERRNOS:
+                    raise
+            os.lseek(source_fd, 0, os.SEEK_SET)
+            os.ftruncate(destination_fd, 0)
+            os.lseek(destination_fd, 0, os.SEEK_SET)
+        shutil.copyfileobj(source_file, destination_file, FAST_COPY_CHUNK_BYTES)
+        return 'copy'
+
+
+def move_without_overwrite(source, destination, stats=None, size=None):
+    """移动文件且绝不覆盖目标；跨文件系统时先在目标目录暂存。
+
+    Args:
+        stats (dict | None): 提供时写入本次移动的方式、字节数、耗时与速度。
+        size (int | None): 调用方已知的源文件大小，为空时重新读取。
+    """
+    started_at = time.monotonic()
+    if size is None:
+        size = os.path.getsize(source)
+    method = 'link'
     try:
         final_destination = link_to_unique_destination(source, destination)
     except OSError as exc:
@@ -255,7 +518,8 @@ def move_without_overwrite(source, destination):
         )
         os.close(fd)
         try:
-            shutil.copy2(source, staging_path)
+            method = copy_file_contents(source, staging_path)
+            shutil.copystat(source, staging_path)
             final_destination = link_to_unique_destination(
                 staging_path,
                 destination,
@@ -265,6 +529,15 @@ def move_without_overwrite(source, destination):
                 os.remove(staging_path)
 
     os.remove(source)
+    if stats is not None:
+        elapsed_seconds = time.monotonic() - started_at
+        stats.update({
+            "file": os.path.basename(final_destination),
+            "method": method,
+            "bytes": size,
+            "seconds": elapsed_seconds,
+            "bytes_per_second": size / elapsed_seconds if elapsed_seconds > 0 else 0.0,
+        })
     return final_destination
 
 
@@ -314,6 +587,169 @@ def build_task_summary(filepaths, mode, elapsed_seconds, file_sizes=None):
     }
 
 
+def download_tmp_dir():
+    """返回下载临时目录的根目录。
+
+    开启 DOWNLOAD_STAGING_IN_FILES_DIR 时直接下载到 FILES_DIR 所在文件系统，
+    TMP_DIR 与 FILES_DIR 分属不同磁盘时也无需复制产物。
+    """
+    if config.get("DOWNLOAD_STAGING_IN_FILES_DIR"):
+        return os.path.join(config["FILES_DIR"], DOWNLOAD_STAGING_DIRNAME)
+    return config["TMP_DIR"]
+
+
+def record_task_ledger(urls_dir, operation, *args, **kwargs):
+    """写入任务台账并返回操作结果；台账异常只记录警告并返回 None，
+    不影响基于任务文件的下载流程。"""
+    try:
+        db_path = task_store.open_ledger(urls_dir)
+        return operation(db_path, *args, **kwargs)
+    except (OSError, sqlite3.Error, RuntimeError) as exc:
+        logger.warning("更新任务台账失败: %s", exc)
+        return None
+
+
+def emit_task_event(event, task_id, urls_dir=None, **fields):
+    """写入结构化事件；提供 urls_dir 时把事件位置登记到任务台账。写入失败只记录警告。"""
+    try:
+        segment, offset = event_log.emit(event, task_id, **fields)
+    except OSError as exc:
+        logger.warning("写入事件日志失败: %s (%s)", event, exc)
+        return
+    if urls_dir and task_id:
+        record_task_ledger(
+            urls_dir,
+            task_store.add_task_event,
+            task_id,
+            event,
+            segment,
+            offset,
+        )
+
+
+def publish_progress(operation, *args):
+    """发布任务进度快照；写入失败只记录警告，不中断下载。"""
+    try:
+        operation(*args)
+    except OSError as exc:
+        logger.warning("写入任务进度快照失败: %s", exc)
+
+
+class TaskOutputLog:
+    """yt-dlp 输出的日志管道。
+
+    任务日志完整保留每一行，但按 TASK_LOG_FLUSH_SECONDS 批量刷新，而不是逐行
+    flush；输出停顿（合并、卡住的分片）时由定时器补一次刷新，已读到的行最迟
+    在一个间隔后落盘。downloader.log 照常记录错误、阶段等普通行，进度行按
+    DOWNLOADER_LOG_PROGRESS_INTERVAL_SECONDS 节流，间隔内只保留最新一条，
+    避免多个 worker 的进度刷屏并争抢共享日志处理器的锁。提供 task_id 时，
+    记入 downloader.log 的进度同时写入事件日志。
+    """
+
+    def __init__(self, log_file, flush_interval=TASK_LOG_FLUSH_SECONDS,
+                 progress_interval=DOWNLOADER_LOG_PROGRESS_INTERVAL_SECONDS,
+                 task_id=None):
+        self.log_file = log_file
+        self.task_id = task_id
+        self.flush_interval = flush_interval
+        self.progress_interval = progress_interval
+        self.flushed_at = time.monotonic()
+        self.progress_logged_at = None
+        self.pending_progress = None
+        # 读取线程写入、定时器线程刷新，共用一把锁保护文件对象
+        self.lock = threading.Lock()
+        self.flush_timer = None
+        self.closed = False
+
+    def write(self, line, stripped):
+        now = time.monotonic()
+        with self.lock:
+            self.log_file.write(line)
+            elapsed = now - self.flushed_at
+            if elapsed >= self.flush_interval:
+                self.log_file.flush()
+                self.flushed_at = now
+            elif self.flush_timer is None:
+                self.flush_timer = threading.Timer(
+                    self.flush_interval - elapsed,
+                    self.flush_pending,
+                )
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+        if not is_progress_line(stripped):
+            logger.info(stripped)
+            return
+        if (
+            self.progress_logged_at is None
+            or now - self.progress_logged_at >= self.progress_interval
+        ):
+            self.log_progress(stripped)
+            self.progress_logged_at = now
+            self.pending_progress = None
+        else:
+            self.pending_progress = stripped
+
+    def flush_pending(self):
+        """定时器回调：输出停顿时把间隔内已写入的行刷到磁盘。"""
+        with self.lock:
+            self.flush_timer = None
+            if self.closed:
+                return
+            try:
+                self.log_file.flush()
+            except (OSError, ValueError) as exc:
+                logger.warning("刷新任务日志失败: %s", exc)
+                return
+            self.flushed_at = time.monotonic()
+
+    def log_progress(self, line):
+        logger.info(line)
+        if self.task_id is None:
+            return
+        progress = build_progress(line, None)
+        if progress:
+            emit_task_event('progress', self.task_id, **progress)
+
+    def close(self):
+        """刷新任务日志，并把间隔内最后一条进度补记到 downloader.log。"""
+        with self.lock:
+            self.closed = True
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            self.log_file.flush()
+            self.flushed_at = time.monotonic()
+        if self.pending_progress is not None:
+            self.log_progress(self.pending_progress)
+            self.pending_progress = None
+
+
+def index_media_files(filepaths):
+    """预先把新产物的 ffprobe 结果写入媒体索引，播放器首次打开无需再探测。"""
+    db_path = config.get("MEDIA_INDEX_DB_PATH")
+    if not db_path:
+        return
+    for filepath in filepaths:
+        extension = os.path.splitext(filepath)[1].lower()
+        if extension == '.mp4':
+            kinds = ('format_tags', 'subtitle_streams')
+        elif extension in VIDEO_OUTPUT_EXTENSIONS or extension in AUDIO_OUTPUT_EXTENSIONS:
+            kinds = ('format_tags',)
+        else:
+            continue
+        try:
+            media_index.open_index(db_path)
+            media_index.index_file(db_path, filepath, kinds)
+        except (
+            OSError,
+            ValueError,
+            RuntimeError,
+            sqlite3.Error,
+            subprocess.SubprocessError,
+        ) as exc:
+            logger.warning("写入媒体索引失败: %s (%s)", filepath, exc)
+
+
 def write_task_result(task_id, filenames, summary=None):
     """原子写入任务最终产物清单，供 Web 页面生成精确播放链接。"""
     result_path = os.path.join(config["URLS_DIR"], f"{task_id}.result.json")
@@ -335,6 +771,13 @@ def write_task_result(task_id, filenames, summary=None):
             result_file.flush()
             os.fsync(result_file.fileno())
         os.replace(temporary_path, result_path)
+        record_task_ledger(
+            config["URLS_DIR"],
+            task_store.save_result,
+            task_id,
+            filenames,
+            summary=summary,
+        )
     except OSError as exc:
         logger.warning("写入任务产物清单失败: %s (%s)", task_id, exc)
         if temporary_path and os.path.exists(temporary_path):
@@ -344,41 +787,685 @@ def write_task_result(task_id, filenames, summary=None):
                 pass
 
 
+def rate_limit_key(url):
+    """返回 URL 所属站点的节流分桶键（主域名），无法解析时归入 default。"""
+    try:
+        host = (urlparse(url).hostname or '').lower().rstrip('.')
+    except (AttributeError, ValueError):
+        host = ''
+    if not host:
+        return 'default'
+    labels = host.split('.')
+    domain = '.'.join(labels[-2:]) if len(labels) > 2 else host
+    return RATE_LIMIT_HOST_ALIASES.get(domain, domain)
+
+
+def is_throttle_line(line):
+    return any(marker in line for marker in THROTTLE_MARKERS)
+
+
+def is_error_line(line):
+    return line.startswith('ERROR:') or is_throttle_line(line)
+
+
+def classify_download_failure(error_lines):
+    """根据 yt-dlp 错误输出判断失败能否自动重试。
+
+    只要有一行是永久性错误就不重试；否则出现可重试标记时重试。
+    """
+    if any(
+        marker in line
+        for line in error_lines
+        for marker in PERMANENT_ERROR_MARKERS
+    ):
+        return FAILURE_PERMANENT
+    if any(
+        marker in line
+        for line in error_lines
+        for marker in RETRYABLE_ERROR_MARKERS
+    ):
+        return FAILURE_RETRYABLE
+    return FAILURE_PERMANENT
+
+
+def retry_delay_seconds(attempt):
+    """第 attempt 次失败后的等待时长：指数增长，不超过 DOWNLOAD_RETRY_MAX_SECONDS。"""
+    base = max(0.0, float(config.get("DOWNLOAD_RETRY_BASE_SECONDS", 30) or 0))
+    limit = max(0.0, float(config.get("DOWNLOAD_RETRY_MAX_SECONDS", 600) or 0))
+    return min(limit, base * 2 ** max(0, attempt - 1))
+
+
+class RetryLater:
+    """download() 的返回值：本次不下载或下载失败，稍后由调度器重新取出。
+
+    attempt 为重新取出后要执行的尝试序号，delay_seconds 为等待时长；
+    gate_reserved 为 True 表示等待的是站点节流，启动令牌已预约，届时不再预约。
+    任务保留 .downloading 状态、临时目录中的分片与文件名前缀，等待期间不占用
+    worker。布尔值为 False，只按成功与否判断的调用方会把它视为本次下载失败。
+    """
+
+    def __init__(self, attempt, delay_seconds, gate_reserved=False):
+        self.attempt = attempt
+        self.delay_seconds = delay_seconds
+        self.gate_reserved = gate_reserved
+
+    def __bool__(self):
+        return False
+
+
+class HostRateLimiter:
+    """单个站点的下载启动令牌桶，带自适应退避。
+
+    基础间隔为 DOWNLOAD_MIN_INTERVAL_SECONDS；yt-dlp 报告限流时在基础间隔上
+    叠加退避时长（每次翻倍，不超过上限）并暂停该站点，之后每次成功下载减半。
+    """
+
+    def __init__(self, interval_seconds, burst, backoff_initial_seconds,
+                 backoff_max_seconds):
+        self.base_interval = max(0.0, float(interval_seconds or 0))
+        self.capacity = max(1, int(burst or 1))
+        self.backoff_initial = max(0.0, float(backoff_initial_seconds or 0))
+        self.backoff_max = max(self.backoff_initial, float(backoff_max_seconds or 0))
+        self.penalty = 0.0
+        self.tokens = float(self.capacity)
+        self.updated_at = None
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.throttled = 0
+
+    @property
+    def interval(self):
+        return self.base_interval + self.penalty
+
+    def _refill(self, current_time):
+        if self.interval and self.updated_at is not None:
+            elapsed = current_time - self.updated_at
+            self.tokens = min(self.capacity, self.tokens + elapsed / self.interval)
+        self.updated_at = current_time
+
+    def reserve(self):
+        """占用一个令牌并返回需要等待的秒数。"""
+        with self.lock:
+            current_time = time.monotonic()
+            wait_seconds = max(0.0, self.blocked_until - current_time)
+            if self.interval:
+                self._refill(current_time)
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait_seconds = max(wait_seconds, -self.tokens * self.interval)
+            self.acquired += 1
+            if wait_seconds > 0:
+                self.waited += 1
+                self.wait_seconds_total += wait_seconds
+                self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+            return wait_seconds
+
+    def penalize(self):
+        with self.lock:
+            self.throttled += 1
+            self.penalty = min(
+                self.backoff_max,
+                max(self.backoff_initial, self.penalty * 2),
+            )
+            self.blocked_until = max(
+                self.blocked_until,
+                time.monotonic() + self.penalty,
+            )
+            return self.penalty
+
+    def reward(self):
+        with self.lock:
+            self.penalty = self.penalty / 2 if self.penalty >= 2 else 0.0
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "wait_seconds_total": round(self.wait_seconds_total, 3),
+                "wait_seconds_max": round(self.wait_seconds_max, 3),
+                "interval_seconds": round(self.interval, 3),
+                "penalty_seconds": round(self.penalty, 3),
+                "throttled": self.throttled,
+            }
+
+
 class DownloadRateGate:
-    """全局下载启动节流器：控制相邻两次下载启动的最小间隔。
+    """按站点分桶的下载启动节流器。
 
-    所有 worker 共享同一实例：acquire() 会按配置等待，使相邻两次下载启动
-    间隔不小于 DOWNLOAD_MIN_INTERVAL_SECONDS。同时运行的下载数由
-    MAX_WORKERS 线程池大小限制。
+    所有 worker 共享同一实例，但每个站点（见 rate_limit_key）各有一个令牌桶：
+    不同站点的下载互不等待。acquire() 只在锁内预约令牌并返回需要等待的秒数，
+    自身不等待：调用方把任务连同预约交回调度器延迟执行，worker 不会被节流占住。
     """
 
-    def __init__(self, min_interval_seconds=0):
-        self._interval = max(0.0, float(min_interval_seconds or 0))
+    def __init__(self, min_interval_seconds=0, burst=1,
+                 backoff_initial_seconds=30, backoff_max_seconds=600):
+        self._settings = (
+            min_interval_seconds,
+            burst,
+            backoff_initial_seconds,
+            backoff_max_seconds,
+        )
         self._lock = threading.Lock()
-        self._next_start = 0.0
+        self._limiters = {}
 
-    def acquire(self):
-        """获取一次下载启动许可，必要时等待节流间隔。"""
+    def limiter(self, key):
         with self._lock:
-            now = time.monotonic()
-            wait = self._next_start - now
-            if wait > 0:
-                logger.info("等待下载节流，%.1f 秒后开始下一个下载", wait)
-                time.sleep(wait)
-                now = time.monotonic()
-            self._next_start = max(self._next_start, now) + self._interval
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = HostRateLimiter(*self._settings)
+                self._limiters[key] = limiter
+            return limiter
+
+    def acquire(self, key='default'):
+        """预约一次下载启动许可，返回还需等待的秒数（0 表示可以立即开始）。"""
+        wait = self.limiter(key).reserve()
+        if wait > 0:
+            logger.info("等待下载节流（%s），%.1f 秒后开始下一个下载", key, wait)
+        return wait
+
+    def report(self, key, throttled):
+        """根据下载结果调整站点节流：限流时退避，否则逐步恢复。"""
+        limiter = self.limiter(key)
+        if throttled:
+            penalty = limiter.penalize()
+            logger.warning(
+                "检测到站点限流（%s），下载启动间隔增加 %.0f 秒",
+                key,
+                penalty,
+            )
+        else:
+            limiter.reward()
+
+    def metrics(self):
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {key: limiter.metrics() for key, limiter in sorted(limiters.items())}
 
 
-# 全局下载节流实例（进程内所有 worker 共享）
+# 全局下载节流实例（进程内所有 worker 共享，按站点分桶）
 download_gate = DownloadRateGate(
     min_interval_seconds=config.get("DOWNLOAD_MIN_INTERVAL_SECONDS", 0),
+    burst=config.get("DOWNLOAD_BURST", 1),
+    backoff_initial_seconds=config.get("DOWNLOAD_BACKOFF_INITIAL_SECONDS", 30),
+    backoff_max_seconds=config.get("DOWNLOAD_BACKOFF_MAX_SECONDS", 600),
 )
 
 
+def task_creation_key(entry):
+    """按任务 ID 中的创建时间排序，同一秒内按文件修改时间。"""
+    try:
+        modified_ns = entry.stat().st_mtime_ns
+    except OSError:
+        modified_ns = 0
+    return os.path.splitext(entry.name)[0][1:15], modified_ns, entry.name
+
+
+def scan_task_files(urls_dir):
+    """返回 {任务 ID: {扩展名: DirEntry}}，只包含任务状态文件。"""
+    extensions = {extension for extension, _ in task_store.TASK_FILE_STATES}
+    found = {}
+    try:
+        entries = list(os.scandir(urls_dir))
+    except OSError as exc:
+        logger.warning("扫描任务目录失败: %s (%s)", urls_dir, exc)
+        return found
+    for entry in entries:
+        stem, extension = os.path.splitext(entry.name)
+        if extension in extensions and TASK_ID_PATTERN.match(stem):
+            found.setdefault(stem, {})[extension] = entry
+    return found
+
+
+def reset_orphaned_tasks(urls_dir):
+    """把上次运行中断留下的 .downloading 任务改回 .txt，返回恢复的任务 ID。
+
+    需在 watchdog 启动前调用，避免重命名再触发一次文件事件。
+    """
+    recovered = []
+    for task_id, files in scan_task_files(urls_dir).items():
+        entry = files.get('.downloading')
+        if entry is None or '.ok' in files or '.fail' in files:
+            continue
+        queued_path = os.path.join(urls_dir, f"{task_id}.txt")
+        try:
+            os.rename(entry.path, queued_path)
+        except OSError as exc:
+            logger.error("恢复中断任务失败: %s (%s)", entry.path, exc)
+            continue
+        recovered.append(task_id)
+    if recovered:
+        record_task_ledger(urls_dir, task_store.requeue_tasks, recovered)
+        logger.info("恢复 %d 个中断的下载任务: %s", len(recovered), ', '.join(recovered))
+    return recovered
+
+
+def enqueue_pending_tasks(urls_dir, scheduler):
+    """按创建顺序把目录中已有的 .txt 任务交给调度器，返回入队数量。"""
+    pending = [
+        files['.txt']
+        for files in scan_task_files(urls_dir).values()
+        if '.txt' in files
+    ]
+    pending.sort(key=task_creation_key)
+    for entry in pending:
+        scheduler.submit(entry.path)
+    if pending:
+        logger.info("启动时发现 %d 个待下载任务，已加入队列", len(pending))
+    return len(pending)
+
+
+def _remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def clean_stale_temp(tmp_dir, files_dir, active_task_ids, retention_seconds,
+                     log_dir=None):
+    """清理残留的临时文件，返回删除的路径。
+
+    - 非活动任务的 yt-dlp 临时目录：为空时立即删除，否则超过保留时长后删除；
+    - 非活动任务的字幕预检信息（<任务>.info.json）；
+    - FILES_DIR 中中断的跨文件系统移动暂存文件；
+    - 提供 log_dir 时，非活动任务遗留的进度快照（<任务>.progress.json）。
+    """
+    now = time.time()
+    removed = []
+    candidates = []
+    try:
+        tmp_entries = list(os.scandir(tmp_dir))
+    except OSError:
+        tmp_entries = []
+    for entry in tmp_entries:
+        if entry.name.endswith('.info.json'):
+            task_id = entry.name[:-len('.info.json')]
+            if TASK_ID_PATTERN.match(task_id) and task_id not in active_task_ids:
+                candidates.append(entry.path)
+            continue
+        if not TASK_ID_PATTERN.match(entry.name) or entry.name in active_task_ids:
+            continue
+        try:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            empty = not any(os.scandir(entry.path))
+            age = now - entry.stat(follow_symlinks=False).st_mtime
+        except OSError:
+            continue
+        if empty or age > retention_seconds:
+            candidates.append(entry.path)
+    try:
+        files_entries = list(os.scandir(files_dir))
+    except OSError:
+        files_entries = []
+    for entry in files_entries:
+        if (
+            not entry.name.startswith(MOVE_STAGING_PREFIX)
+            or entry.name == DOWNLOAD_STAGING_DIRNAME
+        ):
+            continue
+        try:
+            age = now - entry.stat(follow_symlinks=False).st_mtime
+        except OSError:
+            continue
+        if age > MOVE_STAGING_STALE_SECONDS:
+            candidates.append(entry.path)
+    if log_dir:
+        try:
+            log_entries = list(os.scandir(log_dir))
+        except OSError:
+            log_entries = []
+        for entry in log_entries:
+            if not entry.name.endswith(PROGRESS_SNAPSHOT_SUFFIX):
+                continue
+            task_id = entry.name[:-len(PROGRESS_SNAPSHOT_SUFFIX)]
+            if TASK_ID_PATTERN.match(task_id) and task_id not in active_task_ids:
+                candidates.append(entry.path)
+
+    for path in candidates:
+        try:
+            _remove_path(path)
+        except OSError as exc:
+            logger.warning("清理残留临时文件失败: %s (%s)", path, exc)
+            continue
+        removed.append(path)
+    if removed:
+        logger.info("已清理 %d 个残留临时文件或目录", len(removed))
+    return removed
+
+
+def sync_ledger_states(urls_dir, task_files):
+    """把台账状态校正为任务文件表示的状态（见 task_store.sync_task_states）。
+
+    运行期间台账写入失败只记录警告，手工改名重新排队的任务也不经过台账，
+    启动时据此对账，避免 Web 端按过期的台账状态展示任务。
+    """
+    states = {}
+    for task_id, files in task_files.items():
+        for extension, state in task_store.TASK_FILE_STATES:
+            if extension in files:
+                states[task_id] = state
+                break
+    changed = record_task_ledger(urls_dir, task_store.sync_task_states, states)
+    if changed:
+        logger.info("按任务文件校正 %d 个任务的台账状态: %s", len(changed), ', '.join(changed))
+    return changed or []
+
+
+def recover_on_startup(urls_dir, tmp_dir, files_dir):
+    """下载器启动时对账：恢复中断任务、按任务文件校正台账状态并清理残留临时文件，
+    返回恢复的任务 ID。"""
+    recovered = reset_orphaned_tasks(urls_dir)
+    task_files = scan_task_files(urls_dir)
+    sync_ledger_states(urls_dir, task_files)
+    active = {
+        task_id
+        for task_id, files in task_files.items()
+        if '.txt' in files or '.downloading' in files
+    }
+    retention_hours = config.get("TMP_RETENTION_HOURS", 72)
+    try:
+        retention_seconds = max(0.0, float(retention_hours)) * 3600
+    except (TypeError, ValueError):
+        retention_seconds = 72 * 3600
+    clean_stale_temp(
+        tmp_dir,
+        files_dir,
+        active,
+        retention_seconds,
+        log_dir=config["LOG_DIR"],
+    )
+    return recovered
+
+
+def resume_output_prefix(task_tmp_dir):
+    """返回中断下载遗留文件的日期前缀（MMDDHHmm）；没有可续传文件时返回 None。"""
+    try:
+        names = os.listdir(task_tmp_dir)
+    except OSError:
+        return None
+    for name in sorted(names):
+        match = OUTPUT_PREFIX_PATTERN.match(name)
+        if match:
+            return match.group(1)
+    return None
+
+
+def read_task_group(urls_dir, task_id):
+    """读取任务所属的播放列表分组；台账缺失或不可读时视为单个 URL 提交。"""
+    try:
+        task = task_store.get_task(task_store.open_ledger(urls_dir), task_id)
+    except (OSError, sqlite3.Error, RuntimeError) as exc:
+        logger.warning("读取任务分组失败: %s (%s)", task_id, exc)
+        return None
+    return (task or {}).get('group_id')
+
+
+def queue_snapshot_path(log_dir):
+    return os.path.join(log_dir, QUEUE_SNAPSHOT_FILENAME)
+
+
+def write_queue_snapshot(path, snapshot):
+    """原子替换下载队列快照，供 Web 端读取队列深度。"""
+    directory = os.path.dirname(path) or '.'
+    temporary_path = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            mode='w',
+            encoding='utf-8',
+            prefix='.download_queue.',
+            suffix='.tmp',
+            dir=directory,
+            delete=False,
+        ) as snapshot_file:
+            temporary_path = snapshot_file.name
+            json.dump(snapshot, snapshot_file, ensure_ascii=False)
+        os.replace(temporary_path, path)
+    except OSError as exc:
+        logger.warning("写入下载队列快照失败: %s", exc)
+        if temporary_path and os.path.exists(temporary_path):
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+
+
+class DownloadScheduler:
+    """下载任务调度器：替代按事件顺序提交到线程池的 FIFO 队列。
+
+    - 单个 URL 提交的任务优先于播放列表条目；
+    - 多个播放列表之间按提交分组轮流出队，大列表不会饿死后提交的列表；
+    - 视频与音频分道，每道同时运行的任务数不超过 lane_limits，
+      默认各为 MAX_WORKERS - 1，保证另一道总有空闲线程可用；
+    - 带 not_before 提交的任务（等待重试）先放在延迟堆中，到期后才进入分道队列，
+      等待期间不占用 worker；
+    - 队列快照每 snapshot_interval 秒最多写入一次，间隔内的变化由定时器合并写入，
+      启动时扫描出的数百个任务不会逐个重写快照。
+    """
+
+    def __init__(self, process, max_workers, lane_limits=None,
+                 snapshot_path=None, classify=None, metrics=None,
+                 snapshot_interval=QUEUE_SNAPSHOT_INTERVAL_SECONDS):
+        self._process = process
+        self._max_workers = max(1, int(max_workers))
+        default_limit = max(1, self._max_workers - 1)
+        lane_limits = lane_limits or {}
+        self._lane_limits = {
+            lane: max(1, int(lane_limits.get(lane) or default_limit))
+            for lane in DOWNLOAD_LANES
+        }
+        self._snapshot_path = snapshot_path
+        self._snapshot_interval = snapshot_interval
+        # 串行化快照写入，后写入的总是更新的状态
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_written_at = None
+        self._snapshot_timer = None
+        self._classify = classify or self.classify
+        # 附加到队列快照中的指标（如各站点的节流等待统计）
+        self._metrics = metrics
+        self._condition = threading.Condition()
+        self._singles = {lane: deque() for lane in DOWNLOAD_LANES}
+        self._groups = {lane: OrderedDict() for lane in DOWNLOAD_LANES}
+        self._queued = set()
+        self._delayed = []
+        self._running = {}
+        self._sequence = itertools.count()
+        self._threads = []
+
+    @staticmethod
+    def classify(filepath):
+        """返回 (任务 ID, 分道, 播放列表分组)。"""
+        task_id = os.path.splitext(os.path.basename(filepath))[0]
+        lane = task_store.task_mode(task_id)
+        return task_id, lane, read_task_group(os.path.dirname(filepath), task_id)
+
+    def start(self):
+        for index in range(self._max_workers):
+            thread = threading.Thread(
+                target=self._work,
+                name=f'download-worker-{index}',
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        self.flush_snapshot()
+
+    def submit(self, filepath, not_before=None):
+        """任务文件入队；同一文件已在队列或运行中时忽略。
+
+        not_before 为 time.monotonic() 时刻，到达之前任务不会被取出。
+        """
+        task_id, lane, group = self._classify(filepath)
+        entry = {
+            "path": filepath,
+            "task": task_id,
+            "lane": lane,
+            "group": group,
+            "priority": PRIORITY_PLAYLIST if group else PRIORITY_SINGLE,
+            "sequence": next(self._sequence),
+        }
+        with self._condition:
+            if filepath in self._queued or filepath in self._running:
+                return False
+            if not_before is not None and not_before > time.monotonic():
+                heapq.heappush(self._delayed, (not_before, entry["sequence"], entry))
+            else:
+                self._enqueue(entry)
+            self._queued.add(filepath)
+            # 唤醒所有 worker：延迟任务会缩短等待中 worker 的超时时间
+            self._condition.notify_all()
+        self._write_snapshot()
+        return True
+
+    def _enqueue(self, entry):
+        if entry["group"]:
+            self._groups[entry["lane"]].setdefault(entry["group"], deque()).append(entry)
+        else:
+            self._singles[entry["lane"]].append(entry)
+
+    def _release_due(self):
+        """把已到期的延迟任务移入分道队列。"""
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            self._enqueue(heapq.heappop(self._delayed)[2])
+
+    def _next_release_in(self):
+        """距最早的延迟任务到期的秒数；没有延迟任务时返回 None（无限等待）。"""
+        if not self._delayed:
+            return None
+        return max(0.0, self._delayed[0][0] - time.monotonic())
+
+    def _candidate(self, lane):
+        if self._singles[lane]:
+            return self._singles[lane][0]
+        groups = self._groups[lane]
+        if groups:
+            return groups[next(iter(groups))][0]
+        return None
+
+    def next_entry(self):
+        """按优先级、分道上限与提交顺序取出下一个任务；调用方需持有锁。"""
+        self._release_due()
+        running_by_lane = {lane: 0 for lane in DOWNLOAD_LANES}
+        for entry in self._running.values():
+            running_by_lane[entry["lane"]] += 1
+        candidates = [
+            self._candidate(lane)
+            for lane in DOWNLOAD_LANES
+            if running_by_lane[lane] < self._lane_limits[lane]
+        ]
+        candidates = [entry for entry in candidates if entry]
+        if not candidates:
+            return None
+        entry = min(
+            candidates,
+            key=lambda item: (item["priority"] != PRIORITY_SINGLE, item["sequence"]),
+        )
+        lane = entry["lane"]
+        if entry["group"] is None:
+            self._singles[lane].popleft()
+        else:
+            groups = self._groups[lane]
+            pending = groups.pop(entry["group"])
+            pending.popleft()
+            if pending:
+                # 该分组移到队尾，下一次轮到其他播放列表
+                groups[entry["group"]] = pending
+        self._queued.discard(entry["path"])
+        return entry
+
+    def _work(self):
+        while True:
+            with self._condition:
+                entry = self.next_entry()
+                while entry is None:
+                    self._condition.wait(self._next_release_in())
+                    entry = self.next_entry()
+                self._running[entry["path"]] = entry
+            self._write_snapshot()
+            try:
+                self._process(entry["path"])
+            except Exception as exc:
+                logger.error("调度任务执行失败: %s (%s)", entry["path"], exc)
+            finally:
+                with self._condition:
+                    self._running.pop(entry["path"], None)
+                    self._condition.notify_all()
+                self._write_snapshot()
+
+    def snapshot(self):
+        with self._condition:
+            lanes = {}
+            for lane in DOWNLOAD_LANES:
+                groups = self._groups[lane]
+                lanes[lane] = {
+                    "queued": len(self._singles[lane]) + sum(
+                        len(pending) for pending in groups.values()
+                    ),
+                    "single": len(self._singles[lane]),
+                    "playlist": sum(len(pending) for pending in groups.values()),
+                    "playlist_groups": len(groups),
+                    "running": sum(
+                        1 for entry in self._running.values() if entry["lane"] == lane
+                    ),
+                    "limit": self._lane_limits[lane],
+                }
+            snapshot = {
+                "queued": len(self._queued),
+                "delayed": len(self._delayed),
+                "running": [entry["task"] for entry in self._running.values()],
+                "max_workers": self._max_workers,
+                "lanes": lanes,
+                "updated_at": time.time(),
+            }
+        if self._metrics:
+            snapshot["rate_limits"] = self._metrics()
+        return snapshot
+
+    def _write_snapshot(self):
+        """标记队列已变化：距上次写入已满间隔时立即写入，否则合并到一次定时写入。"""
+        if not self._snapshot_path:
+            return
+        with self._snapshot_lock:
+            if self._snapshot_timer is not None:
+                # 定时写入届时读取最新状态
+                return
+            if self._snapshot_written_at is not None:
+                wait = self._snapshot_written_at + self._snapshot_interval - time.monotonic()
+                if wait > 0:
+                    self._snapshot_timer = threading.Timer(wait, self.flush_snapshot)
+                    self._snapshot_timer.daemon = True
+                    self._snapshot_timer.start()
+                    return
+            self._write_snapshot_locked()
+
+    def flush_snapshot(self):
+        """立即写入队列快照，并取消尚未执行的定时写入。"""
+        if not self._snapshot_path:
+            return
+        with self._snapshot_lock:
+            if self._snapshot_timer is not None:
+                self._snapshot_timer.cancel()
+                self._snapshot_timer = None
+            self._write_snapshot_locked()
+
+    def _write_snapshot_locked(self):
+        self._snapshot_written_at = time.monotonic()
+        write_queue_snapshot(self._snapshot_path, self.snapshot())
+
+
 class DownloadHandler(FileSystemEventHandler):
-    def __init__(self, executor):
+    def __init__(self, scheduler):
         super().__init__()
-        self.executor = executor
+        self.scheduler = scheduler
+        # 等待续传的任务：任务 ID -> (下一次尝试序号, 任务计时起点, 是否已预约节流令牌)
+        self.pending_retries = {}
+        self.pending_retries_lock = threading.Lock()
 
     def on_created(self, event):
         """
@@ -389,7 +1476,7 @@ class DownloadHandler(FileSystemEventHandler):
         """
         if not event.is_directory and event.src_path.endswith('.txt') and os.path.exists(event.src_path):
             logger.info(f"检测到新文件: {event.src_path}")
-            self.executor.submit(self.process_file, event.src_path)
+            self.scheduler.submit(event.src_path)
 
     def on_moved(self, event):
         """
@@ -400,12 +1487,15 @@ class DownloadHandler(FileSystemEventHandler):
         """
         if not event.is_directory and event.dest_path.endswith('.txt') and os.path.exists(event.dest_path):
             logger.info(f"检测到文件重命名为txt: {event.src_path} -> {event.dest_path}")
-            self.executor.submit(self.process_file, event.dest_path)
+            self.scheduler.submit(event.dest_path)
 
     def process_file(self, filepath):
         """
         处理 .txt 任务文件：解析 URL、重命名任务状态、发起下载并根据结果更新状态。
 
+        等待续传的任务以 .downloading 路径重新提交，跳过重命名，沿用上次的
+        尝试序号与计时起点。
+
         Args:
             filepath (str): 任务文件的本地路径。
         """
@@ -421,27 +1511,81 @@ class DownloadHandler(FileSystemEventHandler):
                     return
 
             base_name = os.path.splitext(os.path.basename(filepath))[0]
-            # 下载前先重命名为.downloading
-            downloading_path = filepath.rsplit('.', 1)[0] + '.downloading'
-            try:
-                os.rename(filepath, downloading_path)
-                started_at = time.monotonic()
-                logger.info(f"任务开始，文件重命名为: {downloading_path}")
-            except Exception as e:
-                logger.error(f"重命名为.downloading失败: {e}")
-                return
+            urls_dir = os.path.dirname(filepath)
             # 根据首字母判断模式
             mode = 'audio' if base_name[0] == 'a' else 'video'
+            downloading_path = filepath.rsplit('.', 1)[0] + '.downloading'
+            if filepath.endswith('.downloading'):
+                with self.pending_retries_lock:
+                    pending = self.pending_retries.pop(base_name, None)
+                if pending is None:
+                    logger.warning(f"任务不在等待续传列表中，忽略: {filepath}")
+                    return
+                attempt, started_at, gate_reserved = pending
+                logger.info(f"开始第 {attempt} 次尝试，续传任务: {filepath}")
+            else:
+                # 下载前先重命名为.downloading
+                try:
+                    os.rename(filepath, downloading_path)
+                    started_at = time.monotonic()
+                    logger.info(f"任务开始，文件重命名为: {downloading_path}")
+                except Exception as e:
+                    logger.error(f"重命名为.downloading失败: {e}")
+                    return
+                attempt = 1
+                gate_reserved = False
+                record_task_ledger(
+                    urls_dir,
+                    task_store.mark_downloading,
+                    base_name,
+                    url,
+                )
+                emit_task_event('started', base_name, urls_dir, url=url, mode=mode)
             result = self.download(
                 url,
                 base_name,
                 mode,
                 started_at=started_at,
+                urls_dir=urls_dir,
+                attempt=attempt,
+                gate_reserved=gate_reserved,
             )
+            if isinstance(result, RetryLater) and self.scheduler is not None:
+                with self.pending_retries_lock:
+                    self.pending_retries[base_name] = (
+                        result.attempt,
+                        started_at,
+                        result.gate_reserved,
+                    )
+                self.scheduler.submit(
+                    downloading_path,
+                    not_before=time.monotonic() + result.delay_seconds,
+                )
+                return
             new_extension = '.ok' if result else '.fail'
             new_filepath = downloading_path.rsplit('.', 1)[0] + new_extension
             os.rename(downloading_path, new_filepath)
             logger.info(f"任务完成，文件重命名为: {new_filepath}")
+            record_task_ledger(
+                urls_dir,
+                task_store.mark_finished,
+                base_name,
+                result,
+            )
+            # 任务结束后由状态与任务日志提供最终进度，不再保留进度快照
+            try:
+                remove_progress_snapshot(
+                    progress_snapshot_path(config["LOG_DIR"], base_name)
+                )
+            except OSError as exc:
+                logger.warning("删除进度快照失败: %s (%s)", base_name, exc)
+            emit_task_event(
+                'completed' if result else 'failed',
+                base_name,
+                urls_dir,
+                url=url,
+                elapsed_seconds=round(time.monotonic() - started_at, 3),
+            )
             # bark_notify(config['BARK_DEVICE_TOKEN'],
             #             title="下载完成" if result else "下载失败",
             #             content=f"{url} 下载{'完成' if result else '失败'}，文件: {os.path.basename(new_filepath)}")
@@ -451,18 +1595,27 @@ class DownloadHandler(FileSystemEventHandler):
                         title="下载失败",
                         content=f"{url} 下载失败，错误信息: {e}")
 
-    def download(self, url, base_name, mode, started_at=None):
+    def download(self, url, base_name, mode, started_at=None, urls_dir=None, attempt=1,
+                 gate_reserved=False):
         """
         使用 yt-dlp 调用外部命令行执行视频/音频下载。
 
+        站点节流需要等待、以及可重试的失败（网络中断、服务端临时错误、限流）
+        都不在 worker 中等待，而是返回 RetryLater，由调度器延迟后重新取出，
+        重试时沿用临时目录中的分片与文件名前缀续传。
+
         Args:
             url (str): 视频/音频的 URL。
             base_name (str): 任务基础名称（用于日志和临时目录）。
             mode (str): 'video' 或 'audio' 模式。
             started_at (float | None): 任务进入 downloading 状态时的单调时钟。
+            urls_dir (str | None): 任务文件目录；提供时把尝试次数写入任务台账。
+            attempt (int): 本次是第几次尝试，大于 1 时显式续传。
+            gate_reserved (bool): 上次已预约站点节流令牌，本次直接开始。
 
         Returns:
-            bool: 下载成功返回 True，失败返回 False。
+            bool | RetryLater: 下载成功返回 True，失败返回 False，
+            稍后可重试时返回 RetryLater。
         """
         logger.info(f"开始下载: {url} ({mode})")
         default_conf_file = 'yt-dlp.conf' if mode == 'video' else 'yta-dlp.conf'
@@ -477,7 +1630,8 @@ class DownloadHandler(FileSystemEventHandler):
         conf_path = local_conf_path if os.path.exists(local_conf_path) else default_conf_path
         logger.info(f"使用配置文件: {conf_path}")
         
-        task_tmp_dir = os.path.join(config["TMP_DIR"], f"{base_name}")
+        tmp_root = download_tmp_dir()
+        task_tmp_dir = os.path.join(tmp_root, f"{base_name}")
         log_basename = os.path.basename(task_tmp_dir)
         log_path = os.path.join(config["LOG_DIR"], f"{log_basename}.log")
         base_output_template = (
@@ -485,14 +1639,40 @@ class DownloadHandler(FileSystemEventHandler):
             if mode == 'video'
             else config["YTA_DLP_OUTPUT_TEMPLATE"]
         )
-        output_template = build_dated_output_template(
-            base_output_template,
-            config.get("TIMEZONE", "UTC"),
-        )
+        # 上次中断的下载沿用原文件名前缀，yt-dlp 才能续传 .part 文件
+        resume_prefix = resume_output_prefix(task_tmp_dir)
+        if resume_prefix:
+            output_template = f"{resume_prefix}-{base_output_template}"
+            logger.info(f"发现中断的下载文件，继续下载: {task_tmp_dir}")
+        else:
+            output_template = build_dated_output_template(
+                base_output_template,
+                config.get("TIMEZONE", "UTC"),
+            )
+
+        gate_key = rate_limit_key(url)
+        if not gate_reserved:
+            # 按站点节流：字幕预检也会请求站点，因此在预检前预约启动令牌；
+            # 需要等待时把任务交回调度器，不在 worker 中 sleep
+            wait = download_gate.acquire(gate_key)
+            if wait > 0:
+                try:
+                    remove_progress_snapshot(
+                        progress_snapshot_path(config["LOG_DIR"], base_name)
+                    )
+                except OSError as exc:
+                    logger.warning("清理旧进度快照失败: %s (%s)", base_name, exc)
+                return RetryLater(attempt, wait, gate_reserved=True)
 
         dynamic_subtitle_args = []
+        info_json_path = os.path.join(tmp_root, f"{base_name}.info.json")
+        remove_probe_info(info_json_path)
         if mode == 'video':
-            subtitle_fallback = probe_subtitle_fallback(url, conf_path)
+            subtitle_fallback = probe_subtitle_fallback(
+                url,
+                conf_path,
+                info_json_path=info_json_path,
+            )
             if subtitle_fallback:
                 dynamic_subtitle_args = [
                     '--sub-langs',
@@ -515,43 +1695,108 @@ class DownloadHandler(FileSystemEventHandler):
                 '%(info.vcodec)s|%(info.acodec)s'
             ),
             *dynamic_subtitle_args,
+            # 重试时分片已在临时目录中，显式续传而不是从头下载
+            *(['--continue'] if resume_prefix or attempt > 1 else []),
             '-o', os.path.join(task_tmp_dir, output_template),
-            url
         ]
+        # 预检已保存视频信息时直接加载，避免再次请求页面与格式清单
+        uses_probe_info = os.path.isfile(info_json_path)
+        source_args = ['--load-info-json', info_json_path] if uses_probe_info else [url]
 
         try:
             os.makedirs(task_tmp_dir, exist_ok=True)
         except Exception as e:
             logger.error(f"创建临时目录失败: {e}")
+            remove_probe_info(info_json_path)
             return False
 
-        # 全局下载节流：控制播放列表/批量任务的启动节奏
-        download_gate.acquire()
+        max_attempts = max(1, int(config.get("DOWNLOAD_MAX_ATTEMPTS", 3) or 1))
+        failure = None
+        progress_publisher = ProgressPublisher(config["LOG_DIR"], base_name)
+        try:
+            progress_publisher.reset()
+        except OSError as exc:
+            logger.warning("清理旧进度快照失败: %s (%s)", base_name, exc)
         try:
-            # buffering=1 开启行级缓存
-            with open(log_path, 'w', encoding='utf-8', buffering=1) as log_file:
-                process = subprocess.Popen(
-                    cmd, 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.STDOUT, 
-                    universal_newlines=True,
-                    bufsize=1  # 对应 Popen 的行缓冲
+            # 任务日志由 TaskOutputLog 按时间批量刷新；续传时保留上次的任务日志
+            log_mode = 'a' if resume_prefix or attempt > 1 else 'w'
+            with open(log_path, log_mode, encoding='utf-8') as log_file:
+                error_lines = []
+                throttled = False
+                returncode = self.run_yt_dlp(
+                    [*cmd, *source_args],
+                    log_file,
+                    progress_publisher,
+                    error_lines,
                 )
-                
-                # 实时循环读取
-                for line in process.stdout:
-                    stripped = line.rstrip('\n')
-                    # 1. 实时写入任务专属日志文件
-                    log_file.write(line)
-                    # 2. 强制刷新，确保在 log 文件里能即时看到内容
-                    log_file.flush()
-                    # 3. 同时写入 logger（downloader.log），级别使用 info
-                    logger.info(stripped)
-                
-                process.wait()
-                if process.returncode != 0:
-                    raise subprocess.CalledProcessError(process.returncode, cmd)
-            
+                if returncode != 0 and uses_probe_info:
+                    # 预检信息可能已过期（例如媒体地址签名失效），回退为重新解析 URL
+                    logger.warning(f"使用预检信息下载失败，改用原始 URL 重试: {url}")
+                    throttled = any(is_throttle_line(line) for line in error_lines)
+                    error_lines = []
+                    returncode = self.run_yt_dlp(
+                        [*cmd, url],
+                        log_file,
+                        progress_publisher,
+                        error_lines,
+                    )
+                throttled = throttled or any(
+                    is_throttle_line(line) for line in error_lines
+                )
+                download_gate.report(gate_key, throttled=throttled)
+                if returncode == 0:
+                    if urls_dir:
+                        record_task_ledger(
+                            urls_dir,
+                            task_store.record_attempt,
+                            base_name,
+                            attempt,
+                        )
+                else:
+                    failure = classify_download_failure(error_lines)
+                    last_error = (
+                        error_lines[-1] if error_lines
+                        else f"yt-dlp 退出码 {returncode}"
+                    )
+                    if urls_dir:
+                        record_task_ledger(
+                            urls_dir,
+                            task_store.record_attempt,
+                            base_name,
+                            attempt,
+                            last_error,
+                        )
+                    if failure != FAILURE_RETRYABLE or attempt >= max_attempts:
+                        raise subprocess.CalledProcessError(returncode, [*cmd, url])
+
+                    delay = retry_delay_seconds(attempt)
+                    emit_task_event(
+                        'retry',
+                        base_name,
+                        urls_dir,
+                        attempt=attempt,
+                        delay_seconds=delay,
+                        error=last_error,
+                    )
+                    logger.warning(
+                        f"下载失败（第 {attempt}/{max_attempts} 次），"
+                        f"{delay:.0f} 秒后续传重试: {url}，错误信息: {last_error}"
+                    )
+                    log_file.write(
+                        f"[downloader] 第 {attempt} 次下载失败，{delay:.0f} 秒后续传重试\n"
+                    )
+                    published = progress_publisher.published or {}
+                    publish_progress(progress_publisher.announce, {
+                        "percent": published.get("percent", 0.0),
+                        "phase": "retry_wait",
+                        "stage": "retry_wait",
+                        "attempt": attempt,
+                        "max_attempts": max_attempts,
+                        "retry_at": time.time() + delay,
+                        "error": last_error,
+                    })
+                    return RetryLater(attempt + 1, delay)
+
             if not self.move_files(
                 task_tmp_dir,
                 task_id=base_name,
@@ -565,8 +1810,11 @@ class DownloadHandler(FileSystemEventHandler):
             
         except subprocess.CalledProcessError as e:
             logger.error(f"下载失败: {url}，错误信息: {e}")
-            # 下载失败时删除临时目录
-            if os.path.exists(task_tmp_dir):
+            if failure == FAILURE_RETRYABLE:
+                # 重试次数用尽的临时性失败保留分片，任务重新入队后可继续续传
+                logger.warning(f"下载失败，已保留临时目录以便续传: {task_tmp_dir}")
+            elif os.path.exists(task_tmp_dir):
+                # 永久性失败时删除临时目录
                 try:
                     import shutil
                     shutil.rmtree(task_tmp_dir)
@@ -578,6 +1826,38 @@ class DownloadHandler(FileSystemEventHandler):
                         title="下载失败",
                         content=f"{url} 下载失败，错误信息: {e}")
             return False
+        finally:
+            remove_probe_info(info_json_path)
+
+    def run_yt_dlp(self, cmd, log_file, progress_publisher, error_lines=None):
+        """
+        执行 yt-dlp，并把输出同时写入任务日志、downloader.log 与进度快照。
+
+        Args:
+            error_lines (list | None): 收集输出中的错误行与限流提示行，用于失败分类。
+
+        Returns:
+            int: yt-dlp 退出码。
+        """
+        process = ytdlp_engine.popen(cmd, config)
+        output_log = TaskOutputLog(log_file, task_id=progress_publisher.task_id)
+        
+        # 实时循环读取
+        try:
+            for line in process.stdout:
+                stripped = line.rstrip('\n')
+                # 任务日志保留全部输出，downloader.log 只记录节流后的进度
+                output_log.write(line, stripped)
+                # 解析一次进度并发布快照，Web 端无需再解析日志
+                publish_progress(progress_publisher.feed, stripped)
+                if error_lines is not None and is_error_line(stripped):
+                    error_lines.append(stripped)
+        finally:
+            output_log.close()
+        
+        publish_progress(progress_publisher.flush)
+        process.wait()
+        return process.returncode
 
     def move_files(self, tmp_dir, task_id=None, mode=None, started_at=None):
         """
@@ -593,24 +1873,66 @@ class DownloadHandler(FileSystemEventHandler):
         moved_filenames = []
         moved_filepaths = []
         moved_file_sizes = {}
-        for filename in os.listdir(tmp_dir):
-            src = os.path.join(tmp_dir, filename)
-            dst = os.path.join(config["FILES_DIR"], filename)
-            if not os.path.exists(src):
-                logger.warning(f"源文件不存在，跳过处理: {src}")
-                continue
-            try:
-                source_size = os.path.getsize(src)
-                final_dst = move_without_overwrite(src, dst)
-                if final_dst != dst:
+        move_stats = []
+        # 一次 scandir 取得文件名与大小，移动时不再逐个 stat
+        sources = []
+        with os.scandir(tmp_dir) as entries:
+            for entry in entries:
+                try:
+                    size = entry.stat().st_size
+                except FileNotFoundError:
+                    logger.warning(f"源文件不存在，跳过处理: {entry.path}")
+                    continue
+                sources.append((entry.path, entry.name, size))
+
+        def move_one(source):
+            src, filename, size = source
+            stats = {}
+            final_dst = move_without_overwrite(
+                src,
+                os.path.join(config["FILES_DIR"], filename),
+                stats=stats,
+                size=size,
+            )
+            return final_dst, stats
+
+        # 字幕、封面等多个产物并行移动，网络存储上不再逐个等待
+        workers = min(MOVE_MAX_WORKERS, len(sources)) or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(move_one, source) for source in sources]
+            for (src, filename, _size), future in zip(sources, futures):
+                try:
+                    final_dst, stats = future.result()
+                except Exception as e:
+                    logger.error(f"移动文件失败: {src}, 错误信息: {e}")
+                    move_succeeded = False
+                    continue
+                if os.path.basename(final_dst) != filename:
                     logger.info(f"目标文件已存在，自动重命名为: {os.path.basename(final_dst)}")
+                # 保持“已移动文件: 源 -> 目标”格式不变，旧任务恢复依赖该行
                 logger.info(f"已移动文件: {src} -> {final_dst}")
+                logger.info(
+                    f"移动方式: {stats['method']}，"
+                    f"{stats['bytes_per_second'] / 1024 / 1024:.1f} MiB/s: {filename}"
+                )
                 moved_filenames.append(os.path.basename(final_dst))
                 moved_filepaths.append(final_dst)
-                moved_file_sizes[final_dst] = source_size
-            except Exception as e:
-                logger.error(f"移动文件失败: {src}, 错误信息: {e}")
-                move_succeeded = False
+                if task_id:
+                    # 文件一出现在 FILES_DIR 就可能被上传器处理，立即登记所属任务
+                    record_task_ledger(
+                        config["URLS_DIR"],
+                        task_store.add_result_files,
+                        task_id,
+                        [os.path.basename(final_dst)],
+                    )
+                moved_file_sizes[final_dst] = stats["bytes"]
+                move_stats.append(stats)
+                emit_task_event(
+                    'moved',
+                    task_id,
+                    config["URLS_DIR"] if task_id else None,
+                    **stats,
+                )
         if move_succeeded and os.path.exists(tmp_dir):
             try:
                 shutil.rmtree(tmp_dir)
@@ -627,12 +1949,16 @@ class DownloadHandler(FileSystemEventHandler):
                     time.monotonic() - started_at,
                     moved_file_sizes,
                 )
+                if summary is not None:
+                    summary["moves"] = move_stats
             write_task_result(task_id, moved_filenames, summary=summary)
+        if move_succeeded:
+            index_media_files(moved_filepaths)
         return move_succeeded
 
 def start_monitor(folder):
     """
-    启动文件系统监控器和线程池。
+    启动文件系统监控器和下载调度器。
 
     Args:
         folder (str): 要监控的目录路径。
@@ -640,12 +1966,26 @@ def start_monitor(folder):
     Returns:
         Observer: 已启动的 watchdog 观察者对象。
     """
-    executor = ThreadPoolExecutor(max_workers=config["MAX_WORKERS"])
-    event_handler = DownloadHandler(executor)
+    event_handler = DownloadHandler(None)
+    scheduler = DownloadScheduler(
+        event_handler.process_file,
+        config["MAX_WORKERS"],
+        lane_limits=config.get("DOWNLOAD_LANE_LIMITS"),
+        snapshot_path=queue_snapshot_path(config["LOG_DIR"]),
+        metrics=download_gate.metrics,
+    )
+    event_handler.scheduler = scheduler
+    tmp_root = download_tmp_dir()
+    os.makedirs(tmp_root, exist_ok=True)
+    # 先恢复中断任务再启动监控，重命名不会触发重复的文件事件
+    recover_on_startup(folder, tmp_root, config["FILES_DIR"])
     observer = Observer()
     observer.schedule(event_handler, folder, recursive=False)
     observer.start()
     logger.info(f"开始监控目录: {folder}")
+    # 监控启动后再扫描，停机期间写入的任务与监控启动后的新任务都不会遗漏
+    enqueue_pending_tasks(folder, scheduler)
+    scheduler.start()
     return observer
 
 def main():
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""下载器与上传器的结构化事件日志（JSON Lines）。
+
+downloader.log 面向人工阅读；事件日志每行一个 JSON 对象，记录任务开始、进度、
+文件移动、上传、失败等事件及字节数、耗时等字段。每个服务写入自己的分段文件
+`LOG_DIR/<服务>-events.<序号>.jsonl`，写满后切换到下一个序号，已写入的事件偏移
+不会因轮转而改变，任务台账按 (分段, 偏移) 索引事件，查询时直接定位读取；
+轮转删除旧分段后通过 on_prune 回调通知台账删除指向这些分段的索引。
+"""
+
+import glob
+import json
+import os
+import re
+import threading
+import time
+
+
+EVENT_SEGMENT_PATTERN = re.compile(r'^(?P<name>[a-z_]+)-events\.(?P<sequence>\d{6})\.jsonl$')
+
+
+def segment_filename(name, sequence):
+    return f'{name}-events.{sequence:06d}.jsonl'
+
+
+def list_segments(log_dir, name):
+    """返回 [(序号, 路径)]，按序号升序。"""
+    segments = []
+    for path in glob.glob(os.path.join(log_dir, f'{name}-events.*.jsonl')):
+        match = EVENT_SEGMENT_PATTERN.match(os.path.basename(path))
+        if match and match.group('name') == name:
+            segments.append((int(match.group('sequence')), path))
+    return sorted(segments)
+
+
+class EventLog:
+    """单个服务的事件日志写入器；同一服务内多线程共享，一个分段只有一个写入进程。
+
+    on_prune(segments) 在轮转删除旧分段后调用，参数为被删除的分段文件名列表；
+    回调在写入锁外执行，异常由调用方自行处理。
+    """
+
+    def __init__(self, log_dir, name, max_bytes, backup_count, on_prune=None):
+        self.log_dir = log_dir
+        self.name = name
+        self.max_bytes = max(1, int(max_bytes))
+        self.backup_count = max(0, int(backup_count))
+        self.on_prune = on_prune
+        self.lock = threading.Lock()
+        self.sequence = None
+        self.file = None
+
+    def _open(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        if self.sequence is None:
+            segments = list_segments(self.log_dir, self.name)
+            self.sequence = segments[-1][0] if segments else 1
+        self.file = open(
+            os.path.join(self.log_dir, segment_filename(self.name, self.sequence)),
+            'ab',
+        )
+
+    def _rotate(self):
+        """切换到下一个分段并删除超出保留数量的旧分段，返回被删除的分段文件名。"""
+        self.file.close()
+        self.file = None
+        self.sequence += 1
+        self._open()
+        pruned = []
+        for sequence, path in list_segments(self.log_dir, self.name):
+            if sequence <= self.sequence - self.backup_count - 1:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                pruned.append(os.path.basename(path))
+        return pruned
+
+    def emit(self, event, task_id=None, **fields):
+        """写入一条事件，返回 (分段文件名, 偏移) 供台账索引。"""
+        record = {"ts": round(time.time(), 3), "event": event}
+        if task_id is not None:
+            record["task"] = task_id
+        record.update(fields)
+        line = (
+            json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        ).encode('utf-8')
+        pruned = []
+        with self.lock:
+            if self.file is None:
+                self._open()
+            offset = self.file.tell()
+            if offset and offset + len(line) > self.max_bytes:
+                pruned = self._rotate()
+                offset = self.file.tell()
+            self.file.write(line)
+            self.file.flush()
+            location = os.path.basename(self.file.name), offset
+        if pruned and self.on_prune is not None:
+            self.on_prune(pruned)
+        return location
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_event(log_dir, segment, offset):
+    """按台账索引读取单条事件；分段已被轮转删除或内容无效时返回 None。"""
+    if not isinstance(segment, str) or not EVENT_SEGMENT_PATTERN.match(segment):
+        return None
+    try:
+        with open(os.path.join(log_dir, segment), 'rb') as segment_file:
+            segment_file.seek(int(offset))
+            line = segment_file.readline()
+        record = json.loads(line.decode('utf-8'))
+    except (OSError, TypeError, ValueError):
+        return None
+    return record if isinstance(record, dict) else None
@@ -1,29 +1,78 @@
 import os
 import sys
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import pytz
-from datetime import datetime
+from datetime import datetime, timedelta, timezone as fixed_timezone
+
+# 时区偏移按 15 分钟分段缓存：所有时区偏移与夏令时切换时刻都落在 15 分钟整点上
+TIMEZONE_OFFSET_CACHE_SECONDS = 900
+
+_listeners = []
+_listeners_lock = threading.Lock()
+
 
 class TimezoneFormatter(logging.Formatter):
     """自定义格式化器，支持时区"""
     def __init__(self, fmt=None, datefmt=None, timezone=None):
         super().__init__(fmt, datefmt)
         self.timezone = pytz.timezone(timezone) if timezone else pytz.UTC
+        self._offset_bucket = None
+        self._offset_timezone = None
+
+    def timezone_at(self, created):
+        """返回记录时间所在时段的固定偏移时区；同一时段只调用一次 pytz。"""
+        bucket = int(created // TIMEZONE_OFFSET_CACHE_SECONDS)
+        cached = self._offset_bucket, self._offset_timezone
+        if cached[0] != bucket:
+            utc_time = datetime.fromtimestamp(
+                bucket * TIMEZONE_OFFSET_CACHE_SECONDS,
+                pytz.utc,
+            )
+            local_time = utc_time.astimezone(self.timezone)
+            cached = bucket, fixed_timezone(
+                local_time.utcoffset() or timedelta(0),
+                local_time.tzname(),
+            )
+            # 偏移与分段一起替换，多线程格式化时不会读到不匹配的组合
+            self._offset_bucket, self._offset_timezone = cached
+        return cached[1]
 
     def formatTime(self, record, datefmt=None):
-        # 先获取UTC时间
-        dt = datetime.utcfromtimestamp(record.created).replace(tzinfo=pytz.utc)
-        # 转换为目标时区
-        dt = dt.astimezone(self.timezone)
+        dt = datetime.fromtimestamp(record.created, self.timezone_at(record.created))
         if datefmt:
             return dt.strftime(datefmt)
         return dt.strftime("%Y-%m-%d %H:%M:%S")
 
-def setup_logger(name, log_dir, log_file, max_bytes, backup_count, timezone="UTC"):
+
+def stop_listener(listener):
+    """停止单个后台日志线程，写完队列中剩余的日志。"""
+    with _listeners_lock:
+        if listener not in _listeners:
+            return
+        _listeners.remove(listener)
+    listener.stop()
+
+
+def stop_listeners():
+    """停止所有后台日志线程；进程退出时自动调用。"""
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        stop_listener(listener)
+
+
+atexit.register(stop_listeners)
+
+
+def setup_logger(name, log_dir, log_file, max_bytes, backup_count, timezone="UTC",
+                 asynchronous=True):
     """
     设置日志配置
-    
+
     Args:
         name: 日志记录器名称
         log_dir: 日志目录
@@ -31,20 +80,21 @@ def setup_logger(name, log_dir, log_file, max_bytes, backup_count, timezone="UTC
         max_bytes: 单个日志文件最大大小
         backup_count: 备份文件数量
         timezone: 时区设置，默认为UTC
+        asynchronous: 为 True 时业务线程只把记录放入队列，由后台线程写文件与轮转
     """
     # 确保日志目录存在
     os.makedirs(log_dir, exist_ok=True)
-    
+
     # 创建日志记录器
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
-    
+
     # 创建格式化器（使用时区）
     formatter = TimezoneFormatter(
         fmt='%(asctime)s [%(levelname)s] %(message)s',
         timezone=timezone
     )
-    
+
     # 文件处理器
     log_path = os.path.join(log_dir, log_file)
     file_handler = RotatingFileHandler(
@@ -53,11 +103,29 @@ def setup_logger(name, log_dir, log_file, max_bytes, backup_count, timezone="UTC
         backupCount=backup_count
     )
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    
+
     # 控制台处理器
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-    
-    return logger 
\ No newline at end of file
+
+    if not asynchronous:
+        logger.addHandler(file_handler)
+        logger.addHandler(console_handler)
+        return logger
+
+    # 无界队列：写日志的线程不会因磁盘、轮转或控制台输出而阻塞
+    record_queue = queue.SimpleQueue()
+    listener = QueueListener(
+        record_queue,
+        file_handler,
+        console_handler,
+        respect_handler_level=True,
+    )
+    listener.start()
+    with _listeners_lock:
+        _listeners.append(listener)
+    queue_handler = QueueHandler(record_queue)
+    queue_handler.listener = listener
+    logger.addHandler(queue_handler)
+
+    return logger
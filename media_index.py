@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""媒体元数据磁盘索引：按 (路径, mtime_ns, 大小) 持久化 ffprobe 原始结果。
+
+downloader 移动完成后预先写入索引，Web 播放器按需读取；文件被修改或替换后
+mtime/大小变化，旧记录自动失效并在下次访问时重新探测。
+"""
+
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+
+SCHEMA_VERSION = 1
+# 每类探测对应的 ffprobe 参数；索引中保存解析后的原始 JSON。
+PROBE_ARGUMENTS = {
+    'format_tags': (
+        '-show_entries',
+        'format_tags=title,artist,album,date,genre,description,synopsis,purl,comment',
+    ),
+    'subtitle_streams': (
+        '-select_streams', 's',
+        '-show_entries', 'stream=index:stream_tags=language,title',
+    ),
+}
+PROBE_TIMEOUT_SECONDS = 15
+
+_initialized_paths = set()
+_initialized_lock = threading.Lock()
+
+
+def now_ts():
+    return int(time.time())
+
+
+@contextmanager
+def connect(db_path):
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=10)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA busy_timeout = 10000')
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+def init_db(db_path):
+    with connect(db_path) as db:
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('BEGIN IMMEDIATE')
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f'媒体索引版本过新: {version}')
+        if version == 0:
+            db.execute(
+                """
+                CREATE TABLE media_probes (
+                    path TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    probed_at INTEGER NOT NULL,
+                    PRIMARY KEY(path, kind)
+                )
+                """
+            )
+            db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        db.commit()
+
+
+def open_index(db_path):
+    """确保索引已初始化并返回路径；同一进程只初始化一次。"""
+    if db_path in _initialized_paths and os.path.exists(db_path):
+        return db_path
+    with _initialized_lock:
+        if db_path not in _initialized_paths or not os.path.exists(db_path):
+            init_db(db_path)
+            _initialized_paths.add(db_path)
+    return db_path
+
+
+def index_key(filepath):
+    return os.path.abspath(filepath)
+
+
+def probe_command(kind, filepath):
+    return ['ffprobe', '-v', 'error', *PROBE_ARGUMENTS[kind], '-of', 'json', filepath]
+
+
+def run_probe(kind, filepath, runner=None):
+    """执行 ffprobe 并返回解析后的 JSON；失败时抛出 subprocess/JSON 异常。"""
+    runner = runner or subprocess.run
+    result = runner(
+        probe_command(kind, filepath),
+        check=True,
+        capture_output=True,
+        text=True,
+        timeout=PROBE_TIMEOUT_SECONDS,
+    )
+    payload = json.loads(result.stdout)
+    if not isinstance(payload, dict):
+        raise json.JSONDecodeError('ffprobe 输出不是对象', result.stdout, 0)
+    return payload
+
+
+def get_probe(db_path, filepath, kind, mtime_ns, size):
+    """返回与文件当前属性匹配的探测结果；未命中返回 None。"""
+    with connect(db_path) as db:
+        row = db.execute(
+            """
+            SELECT payload FROM media_probes
+            WHERE path = ? AND kind = ? AND mtime_ns = ? AND size = ?
+            """,
+            (index_key(filepath), kind, mtime_ns, size),
+        ).fetchone()
+    if row is None:
+        return None
+    try:
+        return json.loads(row['payload'])
+    except ValueError:
+        return None
+
+
+def get_probes(db_path, filepaths):
+    """一次查询返回 {(路径, kind): (mtime_ns, size, payload)}，供页面批量渲染。"""
+    keys = list(dict.fromkeys(index_key(filepath) for filepath in filepaths))
+    probes = {}
+    with connect(db_path) as db:
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            rows = db.execute(
+                f'SELECT * FROM media_probes WHERE path IN ({placeholders})',
+                chunk,
+            ).fetchall()
+            for row in rows:
+                try:
+                    payload = json.loads(row['payload'])
+                except ValueError:
+                    continue
+                probes[(row['path'], row['kind'])] = (
+                    row['mtime_ns'],
+                    row['size'],
+                    payload,
+                )
+    return probes
+
+
+def save_probe(db_path, filepath, kind, mtime_ns, size, payload):
+    with connect(db_path) as db:
+        db.execute(
+            """
+            INSERT INTO media_probes (path, kind, mtime_ns, size, payload, probed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path, kind) DO UPDATE SET
+                mtime_ns = excluded.mtime_ns,
+                size = excluded.size,
+                payload = excluded.payload,
+                probed_at = excluded.probed_at
+            """,
+            (
+                index_key(filepath), kind, mtime_ns, size,
+                json.dumps(payload, ensure_ascii=False), now_ts(),
+            ),
+        )
+        db.commit()
+
+
+def index_file(db_path, filepath, kinds, runner=None):
+    """探测文件并写入索引，返回成功写入的探测类型。"""
+    stat_result = os.stat(filepath)
+    indexed = []
+    for kind in kinds:
+        payload = run_probe(kind, filepath, runner=runner)
+        save_probe(
+            db_path,
+            filepath,
+            kind,
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+            payload,
+        )
+        indexed.append(kind)
+    return indexed
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""yt-dlp 下载进度解析与任务进度快照。
+
+downloader 在读取 yt-dlp 输出时逐行解析一次，并把最新进度原子写入
+LOG_DIR/<task>.progress.json；Web 端优先读取该快照，只有旧任务没有
+快照时才回退为解析任务日志。
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+
+PROGRESS_MARKER = 'PYDL_PROGRESS|'
+ANSI_ESCAPE_PATTERN = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]')
+DEFAULT_PROGRESS_PATTERN = re.compile(
+    r'\[download\]\s+(?P<percent>\d+(?:\.\d+)?)%'
+    r'(?:\s+of(?:\s+~)?\s+(?P<total>.+?))?'
+    r'(?:\s+at\s+(?P<speed>.+?))?'
+    r'(?:\s+ETA\s+(?P<eta>\S+))?$'
+)
+SUBTITLE_EXTENSIONS = {'ass', 'lrc', 'srt', 'ssa', 'ttml', 'vtt'}
+AUDIO_EXTENSIONS = {'aac', 'flac', 'm4a', 'mp3', 'ogg', 'opus', 'wav'}
+VIDEO_EXTENSIONS = {'avi', 'flv', 'mkv', 'mov', 'mp4', 'webm'}
+PROGRESS_SNAPSHOT_SUFFIX = '.progress.json'
+# 同一阶段内两次写入快照的最小间隔；阶段或状态变化时立即写入。
+PROGRESS_SNAPSHOT_INTERVAL_SECONDS = 0.5
+
+
+def classify_download_stage(extension, vcodec, acodec):
+    """根据 yt-dlp 当前产物信息识别正在下载的媒体阶段。"""
+    extension = (extension or '').strip().lower()
+    vcodec = (vcodec or '').strip().lower()
+    acodec = (acodec or '').strip().lower()
+    empty_codecs = {'', 'na', 'none', 'null', 'unknown'}
+    has_video = vcodec not in empty_codecs
+    has_audio = acodec not in empty_codecs
+
+    if extension in SUBTITLE_EXTENSIONS:
+        return 'download_subtitles'
+    if has_video and not has_audio:
+        return 'download_video'
+    if has_audio and not has_video:
+        return 'download_audio'
+    if has_video and has_audio:
+        return 'download_media'
+    if extension in AUDIO_EXTENSIONS:
+        return 'download_audio'
+    if extension in VIDEO_EXTENSIONS:
+        return 'download_video'
+    return 'downloading'
+
+
+def detect_processing_stage(line):
+    """从 yt-dlp 后处理日志识别合并、嵌入字幕等阶段。"""
+    if '[EmbedSubtitle]' in line:
+        return 'embed_subtitles'
+    if '[Merger]' in line or 'Merging formats into' in line:
+        return 'merge_media'
+    if '[ExtractAudio]' in line:
+        return 'extract_audio'
+    if '[Metadata]' in line:
+        return 'write_metadata'
+    if any(marker in line for marker in (
+        '[VideoConvertor]',
+        '[VideoRemuxer]',
+        '[Fixup',
+        '[ThumbnailsConvertor]',
+        '[MoveFiles]',
+    )):
+        return 'postprocessing'
+    return None
+
+
+def normalize_progress_value(value):
+    """将 yt-dlp 的不可用占位值统一转换为空字符串。"""
+    normalized = (value or '').strip()
+    if normalized.upper() in {'NA', 'N/A', 'NONE', 'NULL', 'UNKNOWN'}:
+        return ''
+    return normalized
+
+
+def build_progress(line, processing_stage):
+    """把一行进度日志转换为进度字典；不是进度行时返回 None。"""
+    if line.startswith(PROGRESS_MARKER):
+        fields = line[len(PROGRESS_MARKER):].split('|')
+        if len(fields) < 6:
+            return None
+        status, percent_text, downloaded, total, speed, eta = fields[:6]
+        percent_match = re.search(r'\d+(?:\.\d+)?', percent_text)
+        progress = {
+            "phase": status.strip(),
+            "downloaded": normalize_progress_value(downloaded),
+            "total": normalize_progress_value(total),
+            "speed": normalize_progress_value(speed),
+            "eta": normalize_progress_value(eta),
+            "stage": processing_stage or 'downloading',
+        }
+        if len(fields) >= 10 and processing_stage is None:
+            extension, _format_id, vcodec, acodec = fields[6:10]
+            progress["stage"] = classify_download_stage(
+                extension,
+                vcodec,
+                acodec,
+            )
+        if percent_match:
+            progress["percent"] = min(100.0, float(percent_match.group()))
+        return progress
+
+    match = DEFAULT_PROGRESS_PATTERN.search(line)
+    if match:
+        progress = {
+            "phase": "downloading",
+            "percent": min(100.0, float(match.group('percent'))),
+            "stage": processing_stage or "downloading",
+        }
+        for key in ('total', 'speed', 'eta'):
+            value = match.group(key)
+            if value:
+                progress[key] = value.strip()
+        return progress
+    return None
+
+
+def is_progress_line(line):
+    if line.startswith(PROGRESS_MARKER):
+        return len(line[len(PROGRESS_MARKER):].split('|')) >= 6
+    return DEFAULT_PROGRESS_PATTERN.search(line) is not None
+
+
+class TaskProgressCursor:
+    """单个任务日志的增量解析状态：只向前读取新追加的字节。
+
+    last_line 为最近一次进度行，stage 为该行及其后出现的最新处理阶段；
+    两者合起来与从末尾向前扫描得到的结果一致。lock 只串行化同一日志的增量读取，
+    不同任务的日志可以并行解析。
+    """
+
+    def __init__(self, identity=None, offset=0):
+        self.lock = threading.Lock()
+        self.reset(identity, offset)
+
+    def reset(self, identity, offset):
+        """日志被替换或截断时，从 offset 处重新开始解析。"""
+        self.identity = identity
+        self.offset = offset
+        self.anchor = b''
+        self.size = None
+        self.mtime_ns = None
+        self.last_line = None
+        self.stage = None
+        self.result = {}
+
+    def feed(self, lines):
+        for raw_line in lines:
+            line = ANSI_ESCAPE_PATTERN.sub('', raw_line).strip()
+            stage = detect_processing_stage(line)
+            if is_progress_line(line):
+                self.last_line = line
+                self.stage = stage
+            elif stage:
+                self.stage = stage
+
+    def snapshot(self, pending_lines=()):
+        """返回当前进度；pending_lines 为尚未写完的末行，只做试探性解析。"""
+        last_line, stage = self.last_line, self.stage
+        if pending_lines:
+            saved = (self.last_line, self.stage)
+            self.feed(pending_lines)
+            last_line, stage = self.last_line, self.stage
+            self.last_line, self.stage = saved
+        if last_line is not None:
+            return build_progress(last_line, stage) or {}
+        if stage:
+            return {
+                "phase": "processing",
+                "percent": 100.0,
+                "stage": stage,
+            }
+        return {}
+
+
+def progress_snapshot_path(log_dir, task_id):
+    return os.path.join(log_dir, f'{task_id}{PROGRESS_SNAPSHOT_SUFFIX}')
+
+
+def remove_progress_snapshot(path):
+    """删除进度快照；快照不存在时忽略。"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def write_progress_snapshot(path, task_id, progress):
+    """原子替换进度快照，读取方不会看到写了一半的内容。"""
+    directory = os.path.dirname(path) or '.'
+    temporary_path = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            mode='w',
+            encoding='utf-8',
+            prefix=f'.{task_id}.',
+            suffix='.tmp',
+            dir=directory,
+            delete=False,
+        ) as snapshot_file:
+            temporary_path = snapshot_file.name
+            json.dump(
+                {
+                    "task": task_id,
+                    "progress": progress,
+                    "updated_at": time.time(),
+                },
+                snapshot_file,
+                ensure_ascii=False,
+            )
+        os.replace(temporary_path, path)
+    except OSError:
+        if temporary_path and os.path.exists(temporary_path):
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+        raise
+
+
+def read_progress_snapshot(path):
+    """读取进度快照；不存在或内容无效时返回 None。"""
+    try:
+        with open(path, 'r', encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or not isinstance(snapshot.get('progress'), dict):
+        return None
+    return snapshot['progress']
+
+
+class ProgressPublisher:
+    """在 downloader 读取输出时逐行解析进度，并按节流间隔发布快照。"""
+
+    def __init__(self, log_dir, task_id, min_interval=PROGRESS_SNAPSHOT_INTERVAL_SECONDS):
+        self.path = progress_snapshot_path(log_dir, task_id)
+        self.task_id = task_id
+        self.min_interval = min_interval
+        self.cursor = TaskProgressCursor()
+        self.published = None
+        self.pending = None
+        self.published_at = None
+
+    def reset(self):
+        """新一轮下载开始时清除上一轮遗留的快照。"""
+        remove_progress_snapshot(self.path)
+
+    def feed(self, line):
+        self.cursor.feed([line])
+        progress = self.cursor.snapshot()
+        if progress == self.published:
+            self.pending = None
+            return
+        self.pending = progress
+        previous = self.published or {}
+        changed_stage = (
+            progress.get('stage') != previous.get('stage')
+            or progress.get('phase') != previous.get('phase')
+        )
+        if (
+            changed_stage
+            or self.published_at is None
+            or time.monotonic() - self.published_at >= self.min_interval
+        ):
+            self.flush()
+
+    def announce(self, progress):
+        """立即发布下载器自身的状态（如等待重试），不经过输出解析。"""
+        self.pending = progress
+        self.flush()
+
+    def flush(self):
+        if self.pending is None:
+            return
+        write_progress_snapshot(self.path, self.task_id, self.pending)
+        self.published = self.pending
+        self.pending = None
+        self.published_at = time.monotonic()
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+"""下载任务 SQLite 台账：记录任务状态、URL、模式、时间戳与最终产物。"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from ai_summary_store import extract_youtube_id
+
+
+SCHEMA_VERSION = 7
+LEDGER_FILENAME = '.tasks.sqlite3'
+TASK_STATES = ('queued', 'downloading', 'completed', 'failed')
+# 可被重复提交复用的任务状态；失败的任务总是允许重新下载。
+REUSABLE_TASK_STATES = ('queued', 'downloading', 'completed')
+PLAYLIST_JOB_STATES = ('resolving', 'completed', 'failed')
+# 任务文件扩展名与状态的对应关系，按优先级排列（与 Web 端探测顺序一致）。
+TASK_FILE_STATES = (
+    ('.ok', 'completed'),
+    ('.fail', 'failed'),
+    ('.downloading', 'downloading'),
+    ('.txt', 'queued'),
+)
+
+_initialized_paths = set()
+_initialized_lock = threading.Lock()
+
+
+def now_ts():
+    return int(time.time())
+
+
+def ledger_path(urls_dir):
+    """台账与任务文件同目录存放，随 URLS_DIR 一起迁移。"""
+    return os.path.join(urls_dir, LEDGER_FILENAME)
+
+
+def task_mode(task_id):
+    return 'audio' if task_id[:1] == 'a' else 'video'
+
+
+def media_key(url):
+    """返回 URL 对应的规范媒体标识（如 `youtube:<视频 ID>`）；无法识别时返回 None。"""
+    video_id = extract_youtube_id(url.strip()) if isinstance(url, str) else None
+    return f'youtube:{video_id}' if video_id else None
+
+
+@contextmanager
+def connect(db_path):
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=10)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA busy_timeout = 10000')
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+@contextmanager
+def write_transaction(db_path):
+    """以 BEGIN IMMEDIATE 开启写事务：一开始就取得写锁，WAL 下多个进程同时写入时
+    由 busy_timeout 排队等待，而不会在读事务升级为写事务时直接报 SQLITE_BUSY。"""
+    with connect(db_path) as db:
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.rollback()
+            raise
+        db.commit()
+
+
+def init_db(db_path):
+    """创建或升级台账表结构；返回是否为新建数据库。"""
+    with connect(db_path) as db:
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('BEGIN IMMEDIATE')
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f'下载任务台账版本过新: {version}')
+        created = version == 0
+        if version == 0:
+            schema = (
+                """
+                CREATE TABLE tasks (
+                    task_id TEXT PRIMARY KEY,
+                    mode TEXT NOT NULL CHECK(mode IN ('video', 'audio')),
+                    url TEXT NOT NULL,
+                    state TEXT NOT NULL CHECK(state IN ('queued', 'downloading', 'completed', 'failed')),
+                    created_at INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL,
+                    started_at INTEGER,
+                    finished_at INTEGER,
+                    result_files TEXT,
+                    summary TEXT
+                );
+                CREATE INDEX tasks_state_idx ON tasks(state, created_at)
+                """
+            )
+            for statement in schema.split(';'):
+                if statement.strip():
+                    db.execute(statement)
+        if version < 2:
+            # 播放列表后台解析任务及其逐集任务；position 保留播放列表顺序。
+            schema = (
+                """
+                CREATE TABLE playlist_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    types TEXT NOT NULL,
+                    state TEXT NOT NULL CHECK(state IN ('resolving', 'completed', 'failed')),
+                    error TEXT,
+                    truncated INTEGER NOT NULL DEFAULT 0,
+                    created_at INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL,
+                    finished_at INTEGER
+                );
+                CREATE TABLE playlist_tasks (
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    task_id TEXT NOT NULL,
+                    PRIMARY KEY(job_id, task_id)
+                );
+                CREATE INDEX playlist_tasks_position_idx ON playlist_tasks(job_id, position)
+                """
+            )
+            for statement in schema.split(';'):
+                if statement.strip():
+                    db.execute(statement)
+        if version < 3:
+            # 按规范媒体标识查找重复任务；旧任务按 URL 回填。
+            db.execute('ALTER TABLE tasks ADD COLUMN media_key TEXT')
+            db.execute('CREATE INDEX tasks_media_key_idx ON tasks(media_key, mode)')
+            db.executemany(
+                'UPDATE tasks SET media_key = ? WHERE task_id = ?',
+                [
+                    (media_key(row['url']), row['task_id'])
+                    for row in db.execute('SELECT task_id, url FROM tasks').fetchall()
+                    if media_key(row['url'])
+                ],
+            )
+        if version < 4:
+            # 同一次播放列表提交的任务共享 group_id，供下载器轮流调度。
+            db.execute('ALTER TABLE tasks ADD COLUMN group_id TEXT')
+        if version < 5:
+            # 下载尝试次数与最近一次失败原因，供自动重试和 Web 端展示。
+            db.execute('ALTER TABLE tasks ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+            db.execute('ALTER TABLE tasks ADD COLUMN last_error TEXT')
+        if version < 6:
+            # 结构化事件日志的偏移索引：按任务直接定位事件，无需扫描全部轮转文件。
+            db.execute(
+                """
+                CREATE TABLE task_events (
+                    task_id TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    created_at INTEGER NOT NULL
+                )
+                """
+            )
+            db.execute('CREATE INDEX task_events_task_idx ON task_events(task_id, event)')
+        if version < 7:
+            # 产物文件名到任务的索引：上传器按文件名主键查找所属任务，
+            # 文件移入 FILES_DIR 时即写入，无需等待任务完成；已完成任务按产物清单回填。
+            db.execute(
+                """
+                CREATE TABLE result_files (
+                    filename TEXT PRIMARY KEY,
+                    task_id TEXT NOT NULL,
+                    created_at INTEGER NOT NULL
+                )
+                """
+            )
+            db.execute(
+                """
+                INSERT OR REPLACE INTO result_files (filename, task_id, created_at)
+                SELECT result_file.value, tasks.task_id, COALESCE(tasks.finished_at, tasks.updated_at)
+                FROM tasks, json_each(tasks.result_files) AS result_file
+                WHERE tasks.result_files IS NOT NULL
+                ORDER BY COALESCE(tasks.finished_at, tasks.updated_at)
+                """
+            )
+        if version < SCHEMA_VERSION:
+            db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        db.commit()
+        return created
+
+
+def open_ledger(urls_dir):
+    """返回 URLS_DIR 对应的台账路径；首次创建时一次性导入已有任务文件。"""
+    db_path = ledger_path(urls_dir)
+    if db_path in _initialized_paths and os.path.exists(db_path):
+        return db_path
+    with _initialized_lock:
+        if db_path in _initialized_paths and os.path.exists(db_path):
+            return db_path
+        if init_db(db_path):
+            import_urls_dir(db_path, urls_dir)
+        _initialized_paths.add(db_path)
+    return db_path
+
+
+def _decode_json(value, default):
+    if value is None:
+        return default
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def task_payload(row):
+    if row is None:
+        return None
+    task = dict(row)
+    task['result_files'] = _decode_json(task['result_files'], None)
+    task['summary'] = _decode_json(task['summary'], None)
+    return task
+
+
+def create_tasks(db_path, tasks, group_id=None):
+    """批量登记新任务；tasks 为 (task_id, mode, url) 序列。
+
+    group_id 标记同一次播放列表提交，单个 URL 提交为 None。
+    """
+    timestamp = now_ts()
+    with write_transaction(db_path) as db:
+        db.executemany(
+            """
+            INSERT OR IGNORE INTO tasks (
+                task_id, mode, url, media_key, group_id, state, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)
+            """,
+            [
+                (task_id, mode, url, media_key(url), group_id, timestamp, timestamp)
+                for task_id, mode, url in tasks
+            ],
+        )
+
+
+def mark_downloading(db_path, task_id, url):
+    timestamp = now_ts()
+    with write_transaction(db_path) as db:
+        db.execute(
+            """
+            INSERT INTO tasks (
+                task_id, mode, url, media_key, state, created_at, updated_at, started_at
+            ) VALUES (?, ?, ?, ?, 'downloading', ?, ?, ?)
+            ON CONFLICT(task_id) DO UPDATE SET
+                url = excluded.url,
+                media_key = excluded.media_key,
+                state = 'downloading',
+                updated_at = excluded.updated_at,
+                started_at = excluded.started_at,
+                finished_at = NULL
+            """,
+            (
+                task_id, task_mode(task_id), url, media_key(url),
+                timestamp, timestamp, timestamp,
+            ),
+        )
+
+
+def requeue_tasks(db_path, task_ids):
+    """把中断的下载任务恢复为排队状态（下载器重启后重新调度时使用）。"""
+    timestamp = now_ts()
+    with write_transaction(db_path) as db:
+        db.executemany(
+            """
+            UPDATE tasks
+            SET state = 'queued', updated_at = ?, started_at = NULL, finished_at = NULL
+            WHERE task_id = ?
+            """,
+            [(timestamp, task_id) for task_id in task_ids],
+        )
+
+
+def sync_task_states(db_path, states):
+    """按任务文件校正台账状态，返回被改写的任务 ID。
+
+    states 为 {task_id: state}，通常由任务文件扩展名得出。任务文件才是下载器的
+    事实来源：台账写入失败、手工把 .fail 改回 .txt 重新排队等情况都会让台账
+    落后，这里把不一致的行改为文件表示的状态；台账中没有的任务不处理。
+    """
+    timestamp = now_ts()
+    changed = []
+    with write_transaction(db_path) as db:
+        for task_id, state in states.items():
+            cursor = db.execute(
+                """
+                UPDATE tasks
+                SET state = :state,
+                    updated_at = :now,
+                    started_at = CASE WHEN :state = 'queued' THEN NULL ELSE started_at END,
+                    finished_at = CASE
+                        WHEN :state IN ('completed', 'failed') THEN COALESCE(finished_at, :now)
+                        ELSE NULL
+                    END
+                WHERE task_id = :task_id AND state != :state
+                """,
+                {'state': state, 'now': timestamp, 'task_id': task_id},
+            )
+            if cursor.rowcount:
+                changed.append(task_id)
+    return changed
+
+
+def record_attempt(db_path, task_id, attempts, error=None):
+    """记录当前下载尝试次数；error 为本次失败的 yt-dlp 错误行，成功时为 None。"""
+    timestamp = now_ts()
+    with write_transaction(db_path) as db:
+        db.execute(
+            """
+            UPDATE tasks
+            SET attempts = ?, last_error = ?, updated_at = ?
+            WHERE task_id = ?
+            """,
+            (attempts, error, timestamp, task_id),
+        )
+
+
+def mark_finished(db_path, task_id, succeeded):
+    timestamp = now_ts()
+    with write_transaction(db_path) as db:
+        db.execute(
+            """
+            UPDATE tasks
+            SET state = ?, updated_at = ?, finished_at = ?
+            WHERE task_id = ?
+            """,
+            (
+                'completed' if succeeded else 'failed',
+                timestamp, timestamp, task_id,
+            ),
+        )
+
+
+def _index_result_files(db, task_id, filenames, timestamp):
+    # 同名文件被新任务产出时（旧文件已上传删除）指向最近的任务
+    db.executemany(
+        """
+        INSERT INTO result_files (filename, task_id, created_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(filename) DO UPDATE SET
+            task_id = excluded.task_id,
+            created_at = excluded.created_at
+        """,
+        [(filename, task_id, timestamp) for filename in filenames],
+    )
+
+
+def add_result_files(db_path, task_id, filenames):
+    """登记刚移入 FILES_DIR 的产物文件名，供上传器在任务完成前查到所属任务。"""
+    with write_transaction(db_path) as db:
+        _index_result_files(db, task_id, filenames, now_ts())
+
+
+def save_result(db_path, task_id, filenames, summary=None):
+    timestamp = now_ts()
+    with write_transaction(db_path) as db:
+        db.execute(
+            """
+            UPDATE tasks
+            SET result_files = ?, summary = ?, updated_at = ?
+            WHERE task_id = ?
+            """,
+            (
+                json.dumps(list(filenames), ensure_ascii=False),
+                json.dumps(summary, ensure_ascii=False) if summary else None,
+                timestamp,
+                task_id,
+            ),
+        )
+        _index_result_files(db, task_id, filenames, timestamp)
+
+
+def get_task(db_path, task_id):
+    with connect(db_path) as db:
+        row = db.execute(
+            'SELECT * FROM tasks WHERE task_id = ?',
+            (task_id,),
+        ).fetchone()
+        return task_payload(row)
+
+
+def get_tasks(db_path, task_ids):
+    """一次查询返回 {task_id: task}；不存在的任务不出现在结果中。"""
+    task_ids = list(dict.fromkeys(task_ids))
+    tasks = {}
+    with connect(db_path) as db:
+        # SQLite 默认最多 999 个绑定参数，分批查询。
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            rows = db.execute(
+                f'SELECT * FROM tasks WHERE task_id IN ({placeholders})',
+                chunk,
+            ).fetchall()
+            for row in rows:
+                tasks[row['task_id']] = task_payload(row)
+    return tasks
+
+
+def find_task_by_result_file(db_path, filename):
+    """返回最近一次产出该文件名的任务 ID；没有时返回 None。"""
+    with connect(db_path) as db:
+        row = db.execute(
+            'SELECT task_id FROM result_files WHERE filename = ?',
+            (filename,),
+        ).fetchone()
+    return row['task_id'] if row else None
+
+
+def find_media_tasks(db_path, mode, media_keys):
+    """按规范媒体标识查找可复用的任务，返回 {media_key: [task, ...]}。
+
+    每个标识下的任务按优先级排列：排队/下载中的任务在前，其次是最近完成的任务。
+    """
+    media_keys = list(dict.fromkeys(key for key in media_keys if key))
+    found = {}
+    states = ', '.join(f"'{state}'" for state in REUSABLE_TASK_STATES)
+    with connect(db_path) as db:
+        for start in range(0, len(media_keys), 500):
+            chunk = media_keys[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            rows = db.execute(
+                f"""
+                SELECT * FROM tasks
+                WHERE mode = ? AND media_key IN ({placeholders}) AND state IN ({states})
+                ORDER BY state = 'completed', COALESCE(finished_at, created_at) DESC
+                """,
+                [mode, *chunk],
+            ).fetchall()
+            for row in rows:
+                found.setdefault(row['media_key'], []).append(task_payload(row))
+    return found
+
+
+def create_playlist_job(db_path, job_id, url, types):
+    timestamp = now_ts()
+    with write_transaction(db_path) as db:
+        db.execute(
+            """
+            INSERT INTO playlist_jobs (
+                job_id, url, types, state, created_at, updated_at
+            ) VALUES (?, ?, ?, 'resolving', ?, ?)
+            """,
+            (job_id, url, json.dumps(list(types)), timestamp, timestamp),
+        )
+
+
+def add_playlist_tasks(db_path, job_id, task_ids):
+    """按解析顺序追加播放列表的逐集任务。"""
+    timestamp = now_ts()
+    with write_transaction(db_path) as db:
+        position = db.execute(
+            'SELECT COALESCE(MAX(position), -1) + 1 FROM playlist_tasks WHERE job_id = ?',
+            (job_id,),
+        ).fetchone()[0]
+        db.executemany(
+            """
+            INSERT OR IGNORE INTO playlist_tasks (job_id, position, task_id)
+            VALUES (?, ?, ?)
+            """,
+            [
+                (job_id, position + offset, task_id)
+                for offset, task_id in enumerate(task_ids)
+            ],
+        )
+        db.execute(
+            'UPDATE playlist_jobs SET updated_at = ? WHERE job_id = ?',
+            (timestamp, job_id),
+        )
+
+
+def finish_playlist_job(db_path, job_id, error=None, truncated=False):
+    timestamp = now_ts()
+    with write_transaction(db_path) as db:
+        db.execute(
+            """
+            UPDATE playlist_jobs
+            SET state = ?, error = ?, truncated = ?, updated_at = ?, finished_at = ?
+            WHERE job_id = ?
+            """,
+            (
+                'failed' if error and not truncated else 'completed',
+                error, int(bool(truncated)), timestamp, timestamp, job_id,
+            ),
+        )
+
+
+def get_playlist_jobs(db_path, job_ids):
+    """一次查询返回 {job_id: job}；job['tasks'] 为按播放列表顺序排列的任务 ID。"""
+    job_ids = list(dict.fromkeys(job_ids))
+    jobs = {}
+    with connect(db_path) as db:
+        for start in range(0, len(job_ids), 500):
+            chunk = job_ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            for row in db.execute(
+                f'SELECT * FROM playlist_jobs WHERE job_id IN ({placeholders})',
+                chunk,
+            ).fetchall():
+                job = dict(row)
+                job['types'] = _decode_json(job['types'], [])
+                job['truncated'] = bool(job['truncated'])
+                job['tasks'] = []
+                jobs[job['job_id']] = job
+            for row in db.execute(
+                f"""
+                SELECT job_id, task_id FROM playlist_tasks
+                WHERE job_id IN ({placeholders})
+                ORDER BY job_id, position
+                """,
+                chunk,
+            ).fetchall():
+                if row['job_id'] in jobs:
+                    jobs[row['job_id']]['tasks'].append(row['task_id'])
+    return jobs
+
+
+def add_task_event(db_path, task_id, event, segment, offset):
+    """登记任务事件在事件日志中的位置。"""
+    with write_transaction(db_path) as db:
+        db.execute(
+            """
+            INSERT INTO task_events (task_id, event, segment, offset, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (task_id, event, segment, offset, now_ts()),
+        )
+
+
+def prune_task_events(db_path, segments):
+    """删除指向已轮转删除的事件日志分段的索引，返回删除的行数。"""
+    segments = list(segments)
+    if not segments:
+        return 0
+    with write_transaction(db_path) as db:
+        cursor = db.execute(
+            f"DELETE FROM task_events WHERE segment IN ({', '.join('?' for _ in segments)})",
+            segments,
+        )
+        return cursor.rowcount
+
+
+def get_task_events(db_path, task_id, events=None):
+    """按写入顺序返回任务的事件索引 [{event, segment, offset, created_at}]。"""
+    query = 'SELECT event, segment, offset, created_at FROM task_events WHERE task_id = ?'
+    params = [task_id]
+    if events:
+        query += f" AND event IN ({', '.join('?' for _ in events)})"
+        params.extend(events)
+    with connect(db_path) as db:
+        rows = db.execute(f'{query} ORDER BY rowid', params).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r') as task_file:
+            return task_file.read().strip()
+    except OSError:
+        return None
+
+
+def import_urls_dir(db_path, urls_dir):
+    """把 URLS_DIR 中既有的任务文件导入台账，已登记的任务保持不变。"""
+    priorities = {extension: index for index, (extension, _) in enumerate(TASK_FILE_STATES)}
+    states = dict(TASK_FILE_STATES)
+    found = {}
+    try:
+        entries = list(os.scandir(urls_dir))
+    except OSError:
+        return 0
+    for entry in entries:
+        stem, extension = os.path.splitext(entry.name)
+        if extension not in states or not stem or stem[0] not in 'va':
+            continue
+        previous = found.get(stem)
+        if previous is None or priorities[extension] < priorities[previous[0]]:
+            found[stem] = (extension, entry)
+
+    rows = []
+    for task_id, (extension, entry) in found.items():
+        url = _read_text(entry.path)
+        if url is None:
+            continue
+        try:
+            modified_at = int(entry.stat().st_mtime)
+        except OSError:
+            modified_at = now_ts()
+        state = states[extension]
+        result_files = summary = None
+        if state == 'completed':
+            result_path = os.path.join(urls_dir, f'{task_id}.result.json')
+            try:
+                with open(result_path, 'r') as result_file:
+                    result_data = json.load(result_file)
+            except (OSError, ValueError):
+                result_data = {}
+            if isinstance(result_data, dict):
+                if isinstance(result_data.get('files'), list) and result_data['files']:
+                    result_files = json.dumps(result_data['files'], ensure_ascii=False)
+                if isinstance(result_data.get('summary'), dict):
+                    summary = json.dumps(result_data['summary'], ensure_ascii=False)
+        rows.append((
+            task_id, task_mode(task_id), url, media_key(url), state,
+            modified_at, modified_at,
+            modified_at if state in {'completed', 'failed'} else None,
+            result_files, summary,
+        ))
+
+    with write_transaction(db_path) as db:
+        before = db.total_changes
+        db.executemany(
+            """
+            INSERT OR IGNORE INTO tasks (
+                task_id, mode, url, media_key, state, created_at, updated_at,
+                finished_at, result_files, summary
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        imported = db.total_changes - before
+        db.executemany(
+            """
+            INSERT OR IGNORE INTO result_files (filename, task_id, created_at)
+            VALUES (?, ?, ?)
+            """,
+            [
+                (filename, row[0], row[7])
+                for row in rows if row[8]
+                for filename in json.loads(row[8])
+            ],
+        )
+    return imported
@@ -1,4 +1,5 @@
 import tempfile
+import time
 import unittest
 from pathlib import Path
 from unittest.mock import patch
@@ -135,5 +136,28 @@ class TestAiSummaryApi(unittest.TestCase):
         self.assertIn('## 完整总结', completed)
 
 
+    def test_concurrent_job_subscribers_share_one_watcher(self):
+        job_id = self.submit().get_json()['job_id']
+        store.claim_next_job(self.db_path, 'worker-one')
+        store.update_job(self.db_path, job_id, 'generating')
+
+        first = app_module.subscribe_ai_summary_job(self.db_path, job_id)
+        second = app_module.subscribe_ai_summary_job(self.db_path, job_id)
+        self.assertIs(first, second)
+        version, job, finished = first.wait(0, timeout=5)
+        self.assertEqual(job['status'], 'generating')
+        self.assertFalse(finished)
+
+        store.update_job_stream(self.db_path, job_id, '## 共享增量')
+        _, job, _ = second.wait(version, timeout=5)
+        self.assertEqual(job['partial_markdown'], '## 共享增量')
+
+        app_module.unsubscribe_ai_summary_job(first)
+        app_module.unsubscribe_ai_summary_job(second)
+        deadline = time.monotonic() + 5
+        while (self.db_path, job_id) in app_module._ai_summary_watchers:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+
 if __name__ == '__main__':
     unittest.main()
@@ -23,6 +23,52 @@ class TestAiSummaryStore(unittest.TestCase):
                 'wal',
             )
 
+    def test_reuses_thread_connection_and_rolls_back_unfinished_work(self):
+        with store.connect(self.db_path) as db:
+            first = db
+            db.execute('BEGIN IMMEDIATE')
+            db.execute(
+                "INSERT INTO media_sources (source_key, extractor, extractor_id, canonical_url, created_at, updated_at) "
+                "VALUES ('k', 'e', 'i', 'u', 0, 0)"
+            )
+            with store.connect(self.db_path) as nested:
+                self.assertIsNot(nested, first)
+        with store.connect(self.db_path) as db:
+            self.assertIs(db, first)
+            self.assertFalse(db.in_transaction)
+            self.assertEqual(
+                db.execute('SELECT COUNT(*) FROM media_sources').fetchone()[0],
+                0,
+            )
+
+    def test_reopens_connection_when_database_file_is_replaced(self):
+        with store.connect(self.db_path) as db:
+            first = db
+        Path(self.db_path).unlink()
+        store.init_db(self.db_path)
+
+        with store.connect(self.db_path) as db:
+            self.assertIsNot(db, first)
+            self.assertEqual(db.execute('PRAGMA user_version').fetchone()[0], 3)
+
+    def test_next_job_due_at_reports_queue_and_lease_deadlines(self):
+        self.assertIsNone(store.next_job_due_at(self.db_path))
+        url = 'https://www.youtube.com/watch?v=l38ceFOWOAE'
+        job = store.create_url_job(self.db_path, url, url, self.profile)['job']
+        self.assertEqual(store.next_job_due_at(self.db_path), job['next_attempt_at'])
+
+        claimed = store.claim_next_job(self.db_path, 'worker-one', lease_seconds=60)
+        self.assertEqual(store.next_job_due_at(self.db_path), claimed['lease_until'])
+
+        store.fail_or_retry_job(
+            self.db_path, claimed['id'], claimed['attempts'], 'busy', 'busy', True,
+            retry_after=300,
+        )
+        self.assertGreaterEqual(
+            store.next_job_due_at(self.db_path),
+            claimed['started_at'] + 300,
+        )
+
     def test_migrates_version_one_jobs_for_streaming(self):
         migration_path = str(Path(self.temp_dir.name) / 'version-one.sqlite3')
         with sqlite3.connect(migration_path) as db:
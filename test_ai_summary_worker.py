@@ -4,6 +4,8 @@ import unittest
 from pathlib import Path
 from unittest.mock import patch
 
+import requests
+
 import ai_summary_store as store
 import ai_summary_worker as worker
 import app as app_module
@@ -45,6 +47,65 @@ class TestAiSummaryWorker(unittest.TestCase):
         self.assertTrue(post.call_args.kwargs['stream'])
         self.assertFalse(post.return_value.decode_unicode)
 
+    def test_provider_limiter_spaces_requests_after_burst(self):
+        limiter = worker.ProviderRateLimiter(rate_per_minute=60, burst=2)
+
+        waits = [limiter.reserve() for _ in range(3)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 1.0, delta=0.05)
+
+    def test_provider_limiter_honours_retry_after_block(self):
+        limiter = worker.ProviderRateLimiter(rate_per_minute=0, burst=1)
+        limiter.block_for(30)
+
+        self.assertAlmostEqual(limiter.reserve(), 30, delta=0.5)
+
+    def test_rate_limited_job_is_requeued_after_retry_after(self):
+        with tempfile.TemporaryDirectory() as root:
+            db_path = str(Path(root) / 'summary.sqlite3')
+            store.init_db(db_path)
+            url = 'https://www.youtube.com/watch?v=l38ceFOWOAE'
+            store.create_url_job(db_path, url, url, 'profile')
+            response = requests.Response()
+            response.status_code = 429
+            response.headers['Retry-After'] = '120'
+            limiter = worker.ProviderRateLimiter(rate_per_minute=0, burst=1)
+
+            with (
+                patch.dict(worker.config, {'AI_SUMMARY_DB_PATH': db_path}),
+                patch(
+                    'ai_summary_worker.process_job',
+                    side_effect=requests.HTTPError(response=response),
+                ),
+                patch('ai_summary_worker.provider_limiter', return_value=limiter),
+            ):
+                before = store.now_ts()
+                self.assertTrue(worker.run_once('worker-test'))
+
+            with store.connect(db_path) as db:
+                job = db.execute('SELECT * FROM ai_summary_jobs').fetchone()
+            self.assertEqual(job['status'], 'queued')
+            self.assertGreaterEqual(job['next_attempt_at'], before + 120)
+            self.assertGreater(limiter.reserve(), 100)
+
+    def test_creating_job_wakes_waiting_worker(self):
+        with tempfile.TemporaryDirectory() as root:
+            db_path = str(Path(root) / 'summary.sqlite3')
+            store.init_db(db_path)
+            wakeup = worker.JobWakeup(db_path)
+            self.addCleanup(wakeup.close)
+            self.assertIsNotNone(wakeup.listener)
+            seen_generation = wakeup.generation
+
+            url = 'https://www.youtube.com/watch?v=l38ceFOWOAE'
+            store.create_url_job(db_path, url, url, 'profile')
+
+            self.assertTrue(wakeup.wait(seen_generation, 5))
+            self.assertEqual(worker.seconds_until_next_job(db_path, 30), 0)
+            wakeup.close()
+            self.assertFalse(Path(store.wakeup_socket_path(db_path)).exists())
+
     def test_prefers_configured_requested_subtitle(self):
         selected = worker.select_summary_subtitle({
             'requested_subtitles': {
@@ -12,6 +12,18 @@ from config_util import DEFAULT_CONFIG
 
 class TestAudioPlayerPage(unittest.TestCase):
     def setUp(self):
+        self.index_temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.index_temp_dir.cleanup)
+        self.config_patcher = patch.dict(
+            app_module.config,
+            {
+                'MEDIA_INDEX_DB_PATH': str(
+                    Path(self.index_temp_dir.name) / 'media-index.sqlite3'
+                ),
+            },
+        )
+        self.config_patcher.start()
+        self.addCleanup(self.config_patcher.stop)
         self.client = app.test_client()
         app.testing = True
         app_module._probe_media_metadata.cache_clear()
@@ -1,4 +1,5 @@
 import tempfile
+import threading
 import unittest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -13,23 +14,28 @@ class TestDownloadRateGateInterval(unittest.TestCase):
             patch('downloader.time.monotonic', return_value=100.0),
             patch('downloader.time.sleep') as sleeper,
         ):
-            gate.acquire()
+            waited = gate.acquire()
 
         sleeper.assert_not_called()
-        self.assertEqual(gate._next_start, 110.0)
+        self.assertEqual(waited, 0)
+        self.assertEqual(gate.limiter('default').tokens, 0)
 
     def test_second_acquire_waits_until_next_start(self):
         gate = downloader.DownloadRateGate(min_interval_seconds=10)
-        clock = iter([100.0, 101.0, 111.0])
+        clock = iter([100.0, 101.0])
         with (
             patch('downloader.time.monotonic', side_effect=lambda: next(clock)),
             patch('downloader.time.sleep') as sleeper,
         ):
-            gate.acquire()  # now=100, wait=0, next_start=110
-            gate.acquire()  # now=101, wait=9, sleep(9), next_start=121
+            gate.acquire()  # now=100，消耗唯一的令牌
+            waited = gate.acquire()  # now=101，补充 0.1 个令牌，需再等 9 秒
 
-        sleeper.assert_called_once_with(9.0)
-        self.assertEqual(gate._next_start, 121.0)
+        # 等待交给调度器，acquire 本身不 sleep
+        sleeper.assert_not_called()
+        self.assertAlmostEqual(waited, 9.0)
+        metrics = gate.metrics()['default']
+        self.assertEqual((metrics['acquired'], metrics['waited']), (2, 1))
+        self.assertEqual(metrics['wait_seconds_max'], 9.0)
 
     def test_zero_interval_never_waits(self):
         gate = downloader.DownloadRateGate(min_interval_seconds=0)
@@ -42,10 +48,64 @@ class TestDownloadRateGateInterval(unittest.TestCase):
 
         sleeper.assert_not_called()
 
+    def test_hosts_have_independent_buckets(self):
+        gate = downloader.DownloadRateGate(min_interval_seconds=10)
+        with (
+            patch('downloader.time.monotonic', return_value=100.0),
+            patch('downloader.time.sleep') as sleeper,
+        ):
+            gate.acquire('youtube.com')
+            gate.acquire('bilibili.com')
+
+        sleeper.assert_not_called()
+
+    def test_reserved_wait_does_not_block_other_hosts(self):
+        gate = downloader.DownloadRateGate(min_interval_seconds=60)
+        gate.acquire('youtube.com')
+
+        with patch('downloader.time.sleep') as sleeper:
+            self.assertGreater(gate.acquire('youtube.com'), 0)
+            self.assertEqual(gate.acquire('bilibili.com'), 0)
+
+        sleeper.assert_not_called()
+        self.assertEqual(gate.metrics()['youtube.com']['waited'], 1)
+
+    def test_throttle_widens_interval_and_success_narrows_it(self):
+        gate = downloader.DownloadRateGate(
+            min_interval_seconds=10,
+            backoff_initial_seconds=30,
+            backoff_max_seconds=100,
+        )
+
+        gate.report('youtube.com', throttled=True)
+        gate.report('youtube.com', throttled=True)
+        gate.report('youtube.com', throttled=True)
+        widened = gate.metrics()['youtube.com']
+        gate.report('youtube.com', throttled=False)
+        narrowed = gate.metrics()['youtube.com']
+
+        self.assertEqual(widened['penalty_seconds'], 100)
+        self.assertEqual(widened['interval_seconds'], 110)
+        self.assertEqual(widened['throttled'], 3)
+        self.assertEqual(narrowed['interval_seconds'], 60)
+        self.assertGreater(gate.acquire('youtube.com'), 90)
+
+    def test_rate_limit_key_groups_hosts_by_site(self):
+        cases = {
+            'https://www.youtube.com/watch?v=abc': 'youtube.com',
+            'https://youtu.be/abc': 'youtube.com',
+            'https://m.bilibili.com/video/BV1': 'bilibili.com',
+            'https://b23.tv/xyz': 'bilibili.com',
+            'not a url': 'default',
+        }
+        for url, expected in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(downloader.rate_limit_key(url), expected)
+
 
 class TestDownloadGateIntegration(unittest.TestCase):
     def setUp(self):
-        self.handler = downloader.DownloadHandler(executor=None)
+        self.handler = downloader.DownloadHandler(scheduler=None)
 
     def test_download_acquires_gate_on_success(self):
         with tempfile.TemporaryDirectory() as root:
@@ -55,7 +115,7 @@ class TestDownloadGateIntegration(unittest.TestCase):
             log_dir.mkdir()
             tmp_dir.mkdir()
             process = MagicMock(stdout=[], returncode=0)
-            gate = MagicMock()
+            gate = MagicMock(**{'acquire.return_value': 0})
 
             with (
                 patch.dict(
@@ -76,6 +136,66 @@ class TestDownloadGateIntegration(unittest.TestCase):
             self.assertTrue(result)
             gate.acquire.assert_called_once()
 
+    def test_gate_wait_defers_task_before_probe_and_download(self):
+        with tempfile.TemporaryDirectory() as root:
+            root_path = Path(root)
+            gate = MagicMock(**{'acquire.return_value': 45.0})
+
+            with (
+                patch.dict(
+                    downloader.config,
+                    {'LOG_DIR': str(root_path), 'TMP_DIR': str(root_path)},
+                ),
+                patch('downloader.subprocess.Popen') as popen,
+                patch('downloader.probe_subtitle_fallback') as probe,
+                patch('downloader.time.sleep') as sleeper,
+                patch('downloader.download_gate', gate),
+            ):
+                result = self.handler.download(
+                    'https://www.youtube.com/watch?v=abc',
+                    'video-gate-wait',
+                    'video',
+                    attempt=2,
+                )
+
+            self.assertIsInstance(result, downloader.RetryLater)
+            self.assertEqual(
+                (result.attempt, result.delay_seconds, result.gate_reserved),
+                (2, 45.0, True),
+            )
+            gate.acquire.assert_called_once_with('youtube.com')
+            probe.assert_not_called()
+            popen.assert_not_called()
+            sleeper.assert_not_called()
+
+    def test_reserved_gate_is_not_acquired_again(self):
+        with tempfile.TemporaryDirectory() as root:
+            root_path = Path(root)
+            process = MagicMock(stdout=[], returncode=0)
+            gate = MagicMock(**{'acquire.return_value': 45.0})
+
+            with (
+                patch.dict(
+                    downloader.config,
+                    {'LOG_DIR': str(root_path), 'TMP_DIR': str(root_path)},
+                ),
+                patch('downloader.subprocess.Popen', return_value=process),
+                patch('downloader.probe_subtitle_fallback', return_value=None) as probe,
+                patch.object(self.handler, 'move_files', return_value=True),
+                patch('downloader.download_gate', gate),
+            ):
+                result = self.handler.download(
+                    'https://www.youtube.com/watch?v=abc',
+                    'video-gate-reserved',
+                    'video',
+                    gate_reserved=True,
+                )
+
+            self.assertIs(result, True)
+            gate.acquire.assert_not_called()
+            probe.assert_called_once()
+            gate.report.assert_called_once_with('youtube.com', throttled=False)
+
     def test_download_acquires_gate_on_failure(self):
         with tempfile.TemporaryDirectory() as root:
             root_path = Path(root)
@@ -84,7 +204,7 @@ class TestDownloadGateIntegration(unittest.TestCase):
             log_dir.mkdir()
             tmp_dir.mkdir()
             process = MagicMock(stdout=[], returncode=1)
-            gate = MagicMock()
+            gate = MagicMock(**{'acquire.return_value': 0})
 
             with (
                 patch.dict(
@@ -105,6 +225,92 @@ class TestDownloadGateIntegration(unittest.TestCase):
             self.assertFalse(result)
             gate.acquire.assert_called_once()
 
+    def test_download_reports_throttle_to_gate(self):
+        with tempfile.TemporaryDirectory() as root:
+            root_path = Path(root)
+            log_dir = root_path / 'logs'
+            tmp_dir = root_path / 'tmp'
+            log_dir.mkdir()
+            tmp_dir.mkdir()
+            process = MagicMock(
+                stdout=['ERROR: [youtube] abc: HTTP Error 429: Too Many Requests\n'],
+                returncode=1,
+            )
+            gate = MagicMock(**{'acquire.return_value': 0})
+
+            with (
+                patch.dict(
+                    downloader.config,
+                    {
+                        'LOG_DIR': str(log_dir),
+                        'TMP_DIR': str(tmp_dir),
+                        'DOWNLOAD_MAX_ATTEMPTS': 1,
+                    },
+                ),
+                patch('downloader.subprocess.Popen', return_value=process),
+                patch('downloader.probe_subtitle_fallback', return_value=None),
+                patch('downloader.download_gate', gate),
+            ):
+                result = self.handler.download(
+                    'https://www.youtube.com/watch?v=abc',
+                    'video-gate-throttle',
+                    'video',
+                )
+
+            self.assertFalse(result)
+            gate.acquire.assert_called_once_with('youtube.com')
+            gate.report.assert_called_once_with('youtube.com', throttled=True)
+
+    def test_age_gate_error_does_not_penalize_host(self):
+        with tempfile.TemporaryDirectory() as root:
+            root_path = Path(root)
+            log_dir = root_path / 'logs'
+            tmp_dir = root_path / 'tmp'
+            log_dir.mkdir()
+            tmp_dir.mkdir()
+            process = MagicMock(
+                stdout=[
+                    'ERROR: [youtube] abc: Sign in to confirm your age. '
+                    'This video may be inappropriate for some users.\n'
+                ],
+                returncode=1,
+            )
+            gate = downloader.DownloadRateGate(
+                min_interval_seconds=0,
+                backoff_initial_seconds=30,
+            )
+
+            with (
+                patch.dict(
+                    downloader.config,
+                    {'LOG_DIR': str(log_dir), 'TMP_DIR': str(tmp_dir)},
+                ),
+                patch('downloader.subprocess.Popen', return_value=process),
+                patch('downloader.probe_subtitle_fallback', return_value=None),
+                patch('downloader.download_gate', gate),
+            ):
+                result = self.handler.download(
+                    'https://www.youtube.com/watch?v=abc',
+                    'video-gate-age',
+                    'video',
+                )
+
+            self.assertFalse(result)
+            metrics = gate.metrics()['youtube.com']
+            self.assertEqual(metrics['throttled'], 0)
+            self.assertEqual(metrics['penalty_seconds'], 0)
+
+    def test_bot_check_is_throttle_but_age_gate_is_not(self):
+        self.assertTrue(downloader.is_throttle_line(
+            "ERROR: [youtube] abc: Sign in to confirm you're not a bot."
+        ))
+        self.assertTrue(downloader.is_throttle_line(
+            'ERROR: [youtube] abc: Sign in to confirm you\u2019re not a bot.'
+        ))
+        self.assertFalse(downloader.is_throttle_line(
+            'ERROR: [youtube] abc: Sign in to confirm your age'
+        ))
+
 
 if __name__ == '__main__':
     unittest.main()
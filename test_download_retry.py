@@ -0,0 +1,264 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import downloader
+import task_store
+
+
+class TestFailureClassification(unittest.TestCase):
+    def test_network_and_server_errors_are_retryable(self):
+        for line in (
+            'ERROR: [youtube] abc: Unable to download video data: <urlopen error timed out>',
+            'ERROR: [download] Got error: Connection reset by peer',
+            'ERROR: [youtube] abc: HTTP Error 503: Service Unavailable',
+            'ERROR: [youtube] abc: HTTP Error 429: Too Many Requests',
+        ):
+            with self.subTest(line=line):
+                self.assertEqual(
+                    downloader.classify_download_failure([line]),
+                    downloader.FAILURE_RETRYABLE,
+                )
+
+    def test_permanent_and_unknown_errors_are_not_retried(self):
+        for lines in (
+            ['ERROR: [youtube] abc: Video unavailable. This video has been removed'],
+            ['ERROR: [youtube] abc: Private video. Sign in if you have access'],
+            ['ERROR: [youtube] abc: Sign in to confirm your age'],
+            ['ERROR: Postprocessing: Conversion failed!'],
+            [],
+        ):
+            with self.subTest(lines=lines):
+                self.assertEqual(
+                    downloader.classify_download_failure(lines),
+                    downloader.FAILURE_PERMANENT,
+                )
+
+    def test_retry_delay_grows_exponentially_up_to_limit(self):
+        with patch.dict(
+            downloader.config,
+            {'DOWNLOAD_RETRY_BASE_SECONDS': 30, 'DOWNLOAD_RETRY_MAX_SECONDS': 100},
+        ):
+            delays = [downloader.retry_delay_seconds(attempt) for attempt in (1, 2, 3)]
+
+        self.assertEqual(delays, [30, 60, 100])
+
+
+class TestDownloadRetry(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        root = Path(self.temp_dir.name)
+        self.urls_dir = root / 'urls'
+        self.log_dir = root / 'logs'
+        self.tmp_dir = root / 'tmp'
+        for directory in (self.urls_dir, self.log_dir, self.tmp_dir):
+            directory.mkdir()
+        self.task_id = 'v20260901120000Rty'
+        self.db_path = task_store.open_ledger(str(self.urls_dir))
+        task_store.mark_downloading(self.db_path, self.task_id, 'https://example.com/video')
+        self.handler = downloader.DownloadHandler(scheduler=None)
+
+    def run_download(self, processes, attempt=1):
+        with (
+            patch.dict(
+                downloader.config,
+                {
+                    'LOG_DIR': str(self.log_dir),
+                    'TMP_DIR': str(self.tmp_dir),
+                    'DOWNLOAD_MAX_ATTEMPTS': 3,
+                    'DOWNLOAD_RETRY_BASE_SECONDS': 30,
+                    'DOWNLOAD_RETRY_MAX_SECONDS': 600,
+                },
+            ),
+            patch('downloader.subprocess.Popen', side_effect=processes) as popen,
+            patch('downloader.probe_subtitle_fallback', return_value=None),
+            patch('downloader.download_gate', MagicMock(**{'acquire.return_value': 0})),
+            patch('downloader.time.sleep') as sleep,
+            patch.object(self.handler, 'move_files', return_value=True),
+        ):
+            result = self.handler.download(
+                'https://example.com/video',
+                self.task_id,
+                'video',
+                urls_dir=str(self.urls_dir),
+                attempt=attempt,
+            )
+        # 重试等待交给调度器，下载过程中不会 sleep
+        sleep.assert_not_called()
+        return result, [call.args[0] for call in popen.call_args_list]
+
+    def test_transient_failure_is_deferred_and_resumed_with_continue(self):
+        progress_path = self.log_dir / f'{self.task_id}.progress.json'
+
+        deferred, first_commands = self.run_download([
+            MagicMock(
+                stdout=['ERROR: [download] Got error: Connection reset by peer\n'],
+                returncode=1,
+            ),
+        ])
+
+        self.assertIsInstance(deferred, downloader.RetryLater)
+        self.assertFalse(deferred)
+        self.assertEqual((deferred.attempt, deferred.delay_seconds), (2, 30))
+        self.assertFalse(deferred.gate_reserved)
+        snapshot = json.loads(progress_path.read_text(encoding='utf-8'))
+        self.assertEqual(snapshot['progress']['stage'], 'retry_wait')
+        self.assertEqual(snapshot['progress']['attempt'], 1)
+        # 等待期间分片保留在临时目录中
+        self.assertTrue((self.tmp_dir / self.task_id).is_dir())
+        self.assertEqual(task_store.get_task(self.db_path, self.task_id)['attempts'], 1)
+
+        result, second_commands = self.run_download(
+            [MagicMock(stdout=['[download] Resuming download\n'], returncode=0)],
+            attempt=2,
+        )
+
+        self.assertTrue(result)
+        self.assertNotIn('--continue', first_commands[0])
+        self.assertIn('--continue', second_commands[0])
+        self.assertEqual(second_commands[0][-1], 'https://example.com/video')
+        task = task_store.get_task(self.db_path, self.task_id)
+        self.assertEqual(task['attempts'], 2)
+        self.assertIsNone(task['last_error'])
+
+    def test_exhausted_retries_keep_partial_files(self):
+        result, commands = self.run_download(
+            [
+                MagicMock(
+                    stdout=['ERROR: [youtube] abc: HTTP Error 503: Service Unavailable\n'],
+                    returncode=1,
+                ),
+            ],
+            attempt=3,
+        )
+
+        self.assertIs(result, False)
+        self.assertEqual(len(commands), 1)
+        self.assertTrue((self.tmp_dir / self.task_id).is_dir())
+        task = task_store.get_task(self.db_path, self.task_id)
+        self.assertEqual(task['attempts'], 3)
+        self.assertIn('HTTP Error 503', task['last_error'])
+
+    def test_permanent_failure_is_not_retried(self):
+        processes = [
+            MagicMock(
+                stdout=['ERROR: [youtube] abc: Private video. Sign in if you have access\n'],
+                returncode=1,
+            ),
+        ]
+
+        result, commands = self.run_download(processes)
+
+        self.assertIs(result, False)
+        self.assertEqual(len(commands), 1)
+        self.assertFalse((self.tmp_dir / self.task_id).exists())
+        task = task_store.get_task(self.db_path, self.task_id)
+        self.assertEqual(task['attempts'], 1)
+        self.assertIn('Private video', task['last_error'])
+
+
+class TestProcessFileRetry(unittest.TestCase):
+    def test_deferred_task_is_resubmitted_and_resumed(self):
+        with tempfile.TemporaryDirectory() as root:
+            task_path = Path(root) / 'v20260901120000Dfr.txt'
+            task_path.write_text('https://example.com/video', encoding='utf-8')
+            downloading_path = Path(root) / 'v20260901120000Dfr.downloading'
+            scheduler = MagicMock()
+            handler = downloader.DownloadHandler(scheduler)
+
+            with (
+                patch('downloader.time.sleep'),
+                patch('downloader.time.monotonic', return_value=500.0),
+                patch.object(
+                    handler,
+                    'download',
+                    side_effect=[downloader.RetryLater(2, 30), True],
+                ) as download,
+            ):
+                handler.process_file(str(task_path))
+
+                self.assertTrue(downloading_path.exists())
+                scheduler.submit.assert_called_once_with(
+                    str(downloading_path),
+                    not_before=530.0,
+                )
+                ledger = task_store.ledger_path(root)
+                self.assertEqual(
+                    task_store.get_task(ledger, 'v20260901120000Dfr')['state'],
+                    'downloading',
+                )
+
+                handler.process_file(str(downloading_path))
+
+            self.assertEqual(
+                [
+                    (call.kwargs['attempt'], call.kwargs['gate_reserved'])
+                    for call in download.call_args_list
+                ],
+                [(1, False), (2, False)],
+            )
+            self.assertEqual(download.call_args.kwargs['started_at'], 500.0)
+            self.assertTrue((Path(root) / 'v20260901120000Dfr.ok').exists())
+            self.assertEqual(
+                task_store.get_task(ledger, 'v20260901120000Dfr')['state'],
+                'completed',
+            )
+            self.assertEqual(handler.pending_retries, {})
+
+    def test_gate_wait_is_resubmitted_with_reserved_token(self):
+        with tempfile.TemporaryDirectory() as root:
+            task_path = Path(root) / 'v20260901120000Gat.txt'
+            task_path.write_text('https://example.com/video', encoding='utf-8')
+            downloading_path = Path(root) / 'v20260901120000Gat.downloading'
+            scheduler = MagicMock()
+            handler = downloader.DownloadHandler(scheduler)
+
+            with (
+                patch('downloader.time.sleep'),
+                patch('downloader.time.monotonic', return_value=500.0),
+                patch.object(
+                    handler,
+                    'download',
+                    side_effect=[
+                        downloader.RetryLater(1, 12.5, gate_reserved=True),
+                        True,
+                    ],
+                ) as download,
+            ):
+                handler.process_file(str(task_path))
+                scheduler.submit.assert_called_once_with(
+                    str(downloading_path),
+                    not_before=512.5,
+                )
+                handler.process_file(str(downloading_path))
+
+            self.assertEqual(
+                [
+                    (call.kwargs['attempt'], call.kwargs['gate_reserved'])
+                    for call in download.call_args_list
+                ],
+                [(1, False), (1, True)],
+            )
+            self.assertTrue((Path(root) / 'v20260901120000Gat.ok').exists())
+
+    def test_unknown_downloading_submission_is_ignored(self):
+        with tempfile.TemporaryDirectory() as root:
+            downloading_path = Path(root) / 'v20260901120000Unk.downloading'
+            downloading_path.write_text('https://example.com/video', encoding='utf-8')
+            handler = downloader.DownloadHandler(MagicMock())
+
+            with (
+                patch('downloader.time.sleep'),
+                patch.object(handler, 'download') as download,
+            ):
+                handler.process_file(str(downloading_path))
+
+            download.assert_not_called()
+            self.assertTrue(downloading_path.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
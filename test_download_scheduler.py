@@ -0,0 +1,235 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import app
+import downloader
+import task_store
+
+
+def classify_by_name(filepath):
+    """测试用分类：文件名形如 v1.txt 或 v1@group.txt。"""
+    stem = Path(filepath).stem
+    task_id, _, group = stem.partition('@')
+    return task_id, task_store.task_mode(task_id), group or None
+
+
+class TestDownloadScheduler(unittest.TestCase):
+    def make_scheduler(self, max_workers=1, lane_limits=None):
+        return downloader.DownloadScheduler(
+            process=lambda _path: None,
+            max_workers=max_workers,
+            lane_limits=lane_limits,
+            classify=classify_by_name,
+        )
+
+    def drain(self, scheduler):
+        order = []
+        while True:
+            entry = scheduler.next_entry()
+            if entry is None:
+                return order
+            order.append(entry["task"])
+
+    def test_single_url_runs_before_playlist_items(self):
+        scheduler = self.make_scheduler()
+        for name in ['v1@p1', 'v2@p1', 'v3@p1', 'v9']:
+            scheduler.submit(f'/urls/{name}.txt')
+
+        self.assertEqual(self.drain(scheduler), ['v9', 'v1', 'v2', 'v3'])
+
+    def test_playlists_are_served_round_robin(self):
+        scheduler = self.make_scheduler()
+        for name in ['v1@p1', 'v2@p1', 'v3@p1', 'v4@p2', 'v5@p2']:
+            scheduler.submit(f'/urls/{name}.txt')
+
+        self.assertEqual(self.drain(scheduler), ['v1', 'v4', 'v2', 'v5', 'v3'])
+
+    def test_lane_limit_leaves_room_for_other_media_type(self):
+        scheduler = self.make_scheduler(max_workers=2)
+        for name in ['v1', 'v2', 'a1']:
+            scheduler.submit(f'/urls/{name}.txt')
+
+        first = scheduler.next_entry()
+        scheduler._running[first["path"]] = first
+        second = scheduler.next_entry()
+
+        self.assertEqual((first["task"], second["task"]), ('v1', 'a1'))
+        self.assertEqual(scheduler.snapshot()["lanes"]["video"]["limit"], 1)
+
+    def test_snapshot_includes_extra_metrics(self):
+        scheduler = downloader.DownloadScheduler(
+            process=lambda _path: None,
+            max_workers=1,
+            classify=classify_by_name,
+            metrics=lambda: {'youtube.com': {'waited': 2}},
+        )
+
+        self.assertEqual(
+            scheduler.snapshot()["rate_limits"],
+            {'youtube.com': {'waited': 2}},
+        )
+
+    def test_duplicate_submission_is_ignored(self):
+        scheduler = self.make_scheduler()
+
+        self.assertTrue(scheduler.submit('/urls/v1.txt'))
+        self.assertFalse(scheduler.submit('/urls/v1.txt'))
+        self.assertEqual(scheduler.snapshot()["queued"], 1)
+
+    def test_delayed_submission_waits_until_not_before(self):
+        scheduler = self.make_scheduler()
+        with patch('downloader.time.monotonic', return_value=100.0):
+            scheduler.submit('/urls/v1.downloading', not_before=130.0)
+            scheduler.submit('/urls/v2.txt')
+
+            self.assertEqual(self.drain(scheduler), ['v2'])
+            self.assertEqual(scheduler.snapshot()["delayed"], 1)
+            self.assertFalse(scheduler.submit('/urls/v1.downloading'))
+            self.assertEqual(scheduler._next_release_in(), 30.0)
+
+        with patch('downloader.time.monotonic', return_value=130.0):
+            self.assertEqual(self.drain(scheduler), ['v1'])
+            self.assertEqual(scheduler.snapshot()["delayed"], 0)
+
+    def test_waiting_retry_does_not_hold_a_worker(self):
+        processed = []
+        finished = threading.Event()
+
+        def process(path):
+            processed.append(Path(path).stem)
+            if len(processed) == 2:
+                finished.set()
+
+        scheduler = downloader.DownloadScheduler(
+            process=process,
+            max_workers=1,
+            classify=classify_by_name,
+        )
+        scheduler.start()
+        scheduler.submit('/urls/v1.downloading', not_before=time.monotonic() + 0.3)
+        scheduler.submit('/urls/v2.txt')
+
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(processed, ['v2', 'v1'])
+
+    def test_workers_process_queue_and_publish_snapshot(self):
+        processed = []
+        finished = threading.Event()
+
+        def process(path):
+            processed.append(Path(path).stem)
+            if len(processed) == 3:
+                finished.set()
+
+        with tempfile.TemporaryDirectory() as root:
+            snapshot_path = Path(root) / 'download_queue.json'
+            scheduler = downloader.DownloadScheduler(
+                process=process,
+                max_workers=1,
+                snapshot_path=str(snapshot_path),
+                classify=classify_by_name,
+            )
+            for name in ['v1@p1', 'v2@p1', 'a1']:
+                scheduler.submit(f'/urls/{name}.txt')
+            scheduler.flush_snapshot()
+            queued = json.loads(snapshot_path.read_text(encoding='utf-8'))
+            scheduler.start()
+            self.assertTrue(finished.wait(5))
+            # 等待 worker 写完最后一次快照，再删除临时目录
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                idle = json.loads(snapshot_path.read_text(encoding='utf-8'))
+                if not idle["running"] and not idle["queued"]:
+                    break
+                time.sleep(0.01)
+
+        self.assertEqual(processed, ['a1', 'v1@p1', 'v2@p1'])
+        self.assertEqual(queued["queued"], 3)
+        self.assertEqual(queued["lanes"]["video"]["playlist"], 2)
+        self.assertEqual(queued["lanes"]["video"]["playlist_groups"], 1)
+        self.assertEqual(queued["lanes"]["audio"]["single"], 1)
+
+    def test_snapshot_writes_are_coalesced(self):
+        scheduler = downloader.DownloadScheduler(
+            process=lambda _path: None,
+            max_workers=1,
+            snapshot_path='/logs/download_queue.json',
+            classify=classify_by_name,
+            snapshot_interval=0.2,
+        )
+        written = []
+        wrote_batch = threading.Event()
+
+        def write(_path, snapshot):
+            written.append(snapshot["queued"])
+            if snapshot["queued"] == 100:
+                wrote_batch.set()
+
+        with patch('downloader.write_queue_snapshot', side_effect=write):
+            for index in range(100):
+                scheduler.submit(f'/urls/v{index}.txt')
+            # 第一次提交立即写入，其余合并为间隔结束后的一次写入
+            self.assertEqual(written, [1])
+            self.assertTrue(wrote_batch.wait(5))
+            scheduler.submit('/urls/v100.txt')
+            scheduler.flush_snapshot()
+
+        self.assertEqual(written, [1, 100, 101])
+        self.assertIsNone(scheduler._snapshot_timer)
+
+    def test_classify_reads_playlist_group_from_ledger(self):
+        with tempfile.TemporaryDirectory() as root:
+            db_path = task_store.open_ledger(root)
+            task_store.create_tasks(
+                db_path,
+                [('a20260901120000AbC', 'audio', 'https://example.com/a')],
+                group_id='p20260901120000Lst',
+            )
+
+            classified = downloader.DownloadScheduler.classify(
+                str(Path(root) / 'a20260901120000AbC.txt'),
+            )
+            single = downloader.DownloadScheduler.classify(
+                str(Path(root) / 'v20260901120000Man.txt'),
+            )
+
+        self.assertEqual(
+            classified,
+            ('a20260901120000AbC', 'audio', 'p20260901120000Lst'),
+        )
+        self.assertEqual(single, ('v20260901120000Man', 'video', None))
+
+
+class TestDownloadQueueAPI(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.log_dir = Path(self.temp_dir.name)
+        self.client = app.app.test_client()
+
+    def test_returns_latest_snapshot(self):
+        (self.log_dir / 'download_queue.json').write_text(
+            json.dumps({"queued": 7, "lanes": {}}),
+            encoding='utf-8',
+        )
+        with patch.dict(app.config, {'LOG_DIR': str(self.log_dir)}):
+            response = self.client.get('/api/download_queue')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['queue']['queued'], 7)
+
+    def test_missing_snapshot_returns_404(self):
+        with patch.dict(app.config, {'LOG_DIR': str(self.log_dir)}):
+            response = self.client.get('/api/download_queue')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.get_json()['success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
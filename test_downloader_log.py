@@ -1,9 +1,12 @@
+import io
 import tempfile
+import time
 import unittest
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import app as app_module
+import downloader
 
 
 class TestDownloaderLogAPI(unittest.TestCase):
@@ -118,5 +121,82 @@ class TestDownloaderLogAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
 
 
+
+class TestTaskOutputLog(unittest.TestCase):
+    def test_progress_lines_are_throttled_only_in_downloader_log(self):
+        log_file = MagicMock(wraps=io.StringIO())
+        progress = [
+            f'PYDL_PROGRESS|downloading|{percent}%|1MiB|10MiB|1MiB/s|00:09'
+            for percent in (10, 20, 30)
+        ]
+        lines = [progress[0], progress[1], '[Merger] Merging formats', progress[2]]
+        clock = iter([0, 0.2, 0.4, 0.6, 0.8, 1.5])
+
+        with (
+            patch('downloader.time.monotonic', side_effect=lambda: next(clock)),
+            patch.object(downloader.logger, 'info') as info,
+        ):
+            output_log = downloader.TaskOutputLog(
+                log_file,
+                flush_interval=1.0,
+                progress_interval=10,
+            )
+            for line in lines:
+                output_log.write(f'{line}\n', line)
+            flushes_before_close = log_file.flush.call_count
+            output_log.close()
+
+        self.assertEqual(log_file.getvalue(), ''.join(f'{line}\n' for line in lines))
+        self.assertEqual(flushes_before_close, 0)
+        self.assertEqual(log_file.flush.call_count, 1)
+        # 第一条进度立即记录，间隔内的中间进度被丢弃，最后一条在结束时补记
+        self.assertEqual(
+            [call.args[0] for call in info.call_args_list],
+            [progress[0], '[Merger] Merging formats', progress[2]],
+        )
+
+    def test_task_log_is_flushed_after_interval(self):
+        log_file = MagicMock(wraps=io.StringIO())
+        clock = iter([0, 0.5, 1.2, 1.4])
+
+        with (
+            patch('downloader.time.monotonic', side_effect=lambda: next(clock)),
+            patch.object(downloader.logger, 'info'),
+        ):
+            output_log = downloader.TaskOutputLog(log_file, flush_interval=1.0)
+            for line in ('[youtube] a', '[youtube] b', '[youtube] c'):
+                output_log.write(f'{line}\n', line)
+
+        self.assertEqual(log_file.flush.call_count, 1)
+
+
+    def test_quiet_output_is_flushed_by_timer(self):
+        log_file = MagicMock(wraps=io.StringIO())
+
+        with patch.object(downloader.logger, 'info'):
+            output_log = downloader.TaskOutputLog(log_file, flush_interval=0.05)
+            output_log.write('[Merger] Merging formats\n', '[Merger] Merging formats')
+            # 之后不再有输出，定时器仍应在一个间隔后刷新
+            deadline = time.monotonic() + 2
+            while log_file.flush.call_count == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            flushes_before_close = log_file.flush.call_count
+            output_log.close()
+
+        self.assertEqual(flushes_before_close, 1)
+        self.assertIsNone(output_log.flush_timer)
+
+    def test_close_cancels_pending_flush_timer(self):
+        log_file = MagicMock(wraps=io.StringIO())
+
+        with patch.object(downloader.logger, 'info'):
+            output_log = downloader.TaskOutputLog(log_file, flush_interval=0.05)
+            output_log.write('[youtube] a\n', '[youtube] a')
+            output_log.close()
+            time.sleep(0.15)
+
+        self.assertEqual(log_file.flush.call_count, 1)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,17 +1,32 @@
 import errno
 import json
 import tempfile
+import threading
 import unittest
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import downloader
+import event_log
+import task_store
 
 
 class TestDownloaderMove(unittest.TestCase):
     def setUp(self):
-        self.handler = downloader.DownloadHandler(executor=None)
+        self.index_temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.index_temp_dir.cleanup)
+        self.config_patcher = patch.dict(
+            downloader.config,
+            {
+                'MEDIA_INDEX_DB_PATH': str(
+                    Path(self.index_temp_dir.name) / 'media-index.sqlite3'
+                ),
+            },
+        )
+        self.config_patcher.start()
+        self.addCleanup(self.config_patcher.stop)
+        self.handler = downloader.DownloadHandler(scheduler=None)
 
     def test_existing_file_is_renamed_instead_of_overwritten(self):
         with tempfile.TemporaryDirectory() as root:
@@ -123,6 +138,99 @@ class TestDownloaderMove(unittest.TestCase):
                 [],
             )
 
+    def test_cross_filesystem_move_reports_copy_method_and_speed(self):
+        with tempfile.TemporaryDirectory() as root:
+            root_path = Path(root)
+            source = root_path / 'source.mp4'
+            source.write_bytes(b'v' * 4096)
+            real_link = downloader.os.link
+            link_calls = 0
+
+            def simulate_cross_filesystem_link(src, dst):
+                nonlocal link_calls
+                link_calls += 1
+                if link_calls == 1:
+                    raise OSError(errno.EXDEV, 'cross-device link')
+                return real_link(src, dst)
+
+            stats = {}
+            with patch(
+                'downloader.os.link',
+                side_effect=simulate_cross_filesystem_link,
+            ):
+                final_destination = downloader.move_without_overwrite(
+                    str(source),
+                    str(root_path / 'video.mp4'),
+                    stats=stats,
+                )
+
+            self.assertEqual(Path(final_destination).read_bytes(), b'v' * 4096)
+            self.assertIn(stats['method'], {'ficlone', 'copy_file_range', 'sendfile', 'copy'})
+            self.assertEqual(stats['bytes'], 4096)
+            self.assertEqual(stats['file'], 'video.mp4')
+            self.assertGreaterEqual(stats['bytes_per_second'], 0)
+
+    def test_copy_falls_back_when_kernel_copy_is_unsupported(self):
+        def unsupported(_source_fd, _destination_fd, _size):
+            raise OSError(errno.EXDEV, 'cross-device clone')
+
+        def partial(source_fd, destination_fd, _size):
+            # 写入一部分后报告复制不完整，下一种方式必须从头开始
+            downloader.os.write(destination_fd, downloader.os.read(source_fd, 3))
+            return 3
+
+        with tempfile.TemporaryDirectory() as root:
+            source = Path(root) / 'source.bin'
+            destination = Path(root) / 'destination.bin'
+            source.write_bytes(b'0123456789')
+            destination.write_bytes(b'stale content that is longer')
+
+            with patch.object(
+                downloader,
+                'FAST_COPY_METHODS',
+                (('ficlone', unsupported), ('copy_file_range', partial)),
+            ):
+                method = downloader.copy_file_contents(str(source), str(destination))
+
+            self.assertEqual(method, 'copy')
+            self.assertEqual(destination.read_bytes(), b'0123456789')
+
+    def test_unexpected_copy_error_is_raised(self):
+        def failing(_source_fd, _destination_fd, _size):
+            raise OSError(errno.ENOSPC, 'No space left on device')
+
+        with tempfile.TemporaryDirectory() as root:
+            source = Path(root) / 'source.bin'
+            source.write_bytes(b'data')
+
+            with (
+                patch.object(downloader, 'FAST_COPY_METHODS', (('sendfile', failing),)),
+                self.assertRaises(OSError),
+            ):
+                downloader.copy_file_contents(str(source), str(Path(root) / 'copy.bin'))
+
+    def test_staging_in_files_dir_downloads_next_to_final_files(self):
+        with patch.dict(
+            downloader.config,
+            {
+                'TMP_DIR': '/tmp/pyyoutubedl',
+                'FILES_DIR': '/data/files',
+                'DOWNLOAD_STAGING_IN_FILES_DIR': True,
+            },
+        ):
+            staged = downloader.download_tmp_dir()
+        with patch.dict(
+            downloader.config,
+            {'TMP_DIR': '/tmp/pyyoutubedl', 'DOWNLOAD_STAGING_IN_FILES_DIR': False},
+        ):
+            default = downloader.download_tmp_dir()
+
+        self.assertEqual(
+            staged,
+            f'/data/files/{downloader.DOWNLOAD_STAGING_DIRNAME}',
+        )
+        self.assertEqual(default, '/tmp/pyyoutubedl')
+
     def test_concurrent_moves_allocate_distinct_names(self):
         with tempfile.TemporaryDirectory() as root:
             root_path = Path(root)
@@ -187,6 +295,84 @@ class TestDownloaderMove(unittest.TestCase):
                 {'video (1).mp4', 'video.zh-Hans.srt'},
             )
 
+    def test_task_artifacts_are_moved_concurrently_with_scanned_sizes(self):
+        with tempfile.TemporaryDirectory() as root:
+            root_path = Path(root)
+            tmp_dir = root_path / 'tmp' / 'v20260723120000Par'
+            files_dir = root_path / 'files'
+            urls_dir = root_path / 'urls'
+            tmp_dir.mkdir(parents=True)
+            files_dir.mkdir()
+            urls_dir.mkdir()
+            names = ['video.mp4', 'video.zh-Hans.srt', 'video.en.srt']
+            for name in names:
+                (tmp_dir / name).write_text(name, encoding='utf-8')
+            # 两个移动必须同时进行才能越过屏障，串行移动会超时失败
+            barrier = threading.Barrier(2, timeout=5)
+            real_move = downloader.move_without_overwrite
+            sizes = {}
+
+            def move(source, destination, stats=None, size=None):
+                sizes[Path(source).name] = size
+                if Path(source).suffix == '.srt':
+                    barrier.wait()
+                return real_move(source, destination, stats=stats, size=size)
+
+            with (
+                patch.dict(
+                    downloader.config,
+                    {'FILES_DIR': str(files_dir), 'URLS_DIR': str(urls_dir)},
+                ),
+                patch('downloader.move_without_overwrite', side_effect=move),
+                patch('downloader.os.path.getsize', side_effect=AssertionError),
+            ):
+                result = self.handler.move_files(
+                    str(tmp_dir),
+                    task_id='v20260723120000Par',
+                )
+
+            result_data = json.loads(
+                (urls_dir / 'v20260723120000Par.result.json').read_text(
+                    encoding='utf-8',
+                )
+            )
+            self.assertTrue(result)
+            self.assertEqual(sorted(result_data['files']), sorted(names))
+            self.assertEqual(sizes, {name: len(name) for name in names})
+            self.assertFalse(tmp_dir.exists())
+
+    def test_moved_files_are_indexed_before_result_is_saved(self):
+        with tempfile.TemporaryDirectory() as root:
+            root_path = Path(root)
+            task_id = 'v20260723120000Idx'
+            tmp_dir = root_path / 'tmp' / task_id
+            files_dir = root_path / 'files'
+            urls_dir = root_path / 'urls'
+            tmp_dir.mkdir(parents=True)
+            files_dir.mkdir()
+            urls_dir.mkdir()
+            (tmp_dir / 'video.mp4').write_bytes(b'v')
+            (files_dir / 'video.mp4').write_bytes(b'old')
+            db_path = task_store.open_ledger(str(urls_dir))
+            owners = {}
+
+            def write_result(_task_id, filenames, summary=None):
+                for filename in filenames:
+                    owners[filename] = task_store.find_task_by_result_file(db_path, filename)
+
+            with (
+                patch.dict(
+                    downloader.config,
+                    {'FILES_DIR': str(files_dir), 'URLS_DIR': str(urls_dir)},
+                ),
+                patch('downloader.write_task_result', side_effect=write_result),
+            ):
+                result = self.handler.move_files(str(tmp_dir), task_id=task_id)
+
+            self.assertTrue(result)
+            self.assertEqual(owners, {'video (1).mp4': task_id})
+            self.assertIsNone(task_store.find_task_by_result_file(db_path, 'video.mp4'))
+
     def test_video_summary_uses_largest_final_video_and_full_elapsed_time(self):
         with tempfile.TemporaryDirectory() as root:
             root_path = Path(root)
@@ -231,6 +417,10 @@ class TestDownloaderMove(unittest.TestCase):
                 summary['average_speed_bytes_per_second'],
                 24 / 132.4,
             )
+            self.assertEqual(
+                {move['file']: move['method'] for move in summary['moves']},
+                {'small.mp4': 'link', 'final.mkv': 'link', 'final.zh-Hans.srt': 'link'},
+            )
 
     def test_audio_summary_uses_audio_file_and_ignores_subtitle(self):
         with tempfile.TemporaryDirectory() as root:
@@ -283,9 +473,73 @@ class TestDownloaderMove(unittest.TestCase):
                 'v20260804120000Tim',
                 'video',
                 started_at=123.5,
+                urls_dir=root,
+                attempt=1,
+                gate_reserved=False,
             )
             self.assertTrue((Path(root) / 'v20260804120000Tim.ok').exists())
 
+    def test_process_file_records_state_transitions_in_ledger(self):
+        with tempfile.TemporaryDirectory() as root:
+            task_path = Path(root) / 'a20260901120000Led.txt'
+            task_path.write_text('https://example.com/audio', encoding='utf-8')
+
+            with (
+                patch('downloader.time.sleep'),
+                patch.object(self.handler, 'download', return_value=False),
+            ):
+                self.handler.process_file(str(task_path))
+
+            db_path = downloader.task_store.ledger_path(root)
+            task = downloader.task_store.get_task(db_path, 'a20260901120000Led')
+            self.assertEqual(task['state'], 'failed')
+            self.assertEqual(task['mode'], 'audio')
+            self.assertIsNotNone(task['started_at'])
+            self.assertTrue((Path(root) / 'a20260901120000Led.fail').exists())
+
+    def test_process_file_removes_progress_snapshot_when_finished(self):
+        with tempfile.TemporaryDirectory() as root:
+            task_path = Path(root) / 'v20260901120000Snp.txt'
+            task_path.write_text('https://example.com/video', encoding='utf-8')
+            snapshot_path = Path(root) / 'v20260901120000Snp.progress.json'
+            snapshot_path.write_text('{"progress": {"percent": 100.0}}', encoding='utf-8')
+
+            with (
+                patch.dict(downloader.config, {'LOG_DIR': root}),
+                patch('downloader.time.sleep'),
+                patch.object(self.handler, 'download', return_value=True),
+            ):
+                self.handler.process_file(str(task_path))
+
+            self.assertTrue((Path(root) / 'v20260901120000Snp.ok').exists())
+            self.assertFalse(snapshot_path.exists())
+
+    def test_process_file_indexes_task_events_in_ledger(self):
+        with tempfile.TemporaryDirectory() as root:
+            task_path = Path(root) / 'v20260901120000Evt.txt'
+            task_path.write_text('https://example.com/video', encoding='utf-8')
+            writer = downloader.EventLog(root, 'downloader', 1024 * 1024, 2)
+            self.addCleanup(writer.close)
+
+            with (
+                patch('downloader.time.sleep'),
+                patch('downloader.event_log', writer),
+                patch.object(self.handler, 'download', return_value=False),
+            ):
+                self.handler.process_file(str(task_path))
+
+            db_path = downloader.task_store.ledger_path(root)
+            entries = downloader.task_store.get_task_events(db_path, 'v20260901120000Evt')
+            records = [
+                event_log.read_event(root, entry['segment'], entry['offset'])
+                for entry in entries
+            ]
+
+        self.assertEqual([entry['event'] for entry in entries], ['started', 'failed'])
+        self.assertEqual(records[0]['mode'], 'video')
+        self.assertEqual(records[1]['url'], 'https://example.com/video')
+        self.assertIn('elapsed_seconds', records[1])
+
     def test_runtime_command_adds_metadata_for_video_and_audio(self):
         with tempfile.TemporaryDirectory() as root:
             root_path = Path(root)
@@ -317,7 +571,7 @@ class TestDownloaderMove(unittest.TestCase):
                             return_value=None,
                         ),
                         patch.object(self.handler, 'move_files', return_value=True),
-                        patch('downloader.download_gate', MagicMock()),
+                        patch('downloader.download_gate', MagicMock(**{'acquire.return_value': 0})),
                     ):
                         result = self.handler.download(
                             'https://example.com/media',
@@ -429,7 +683,7 @@ class TestDownloaderMove(unittest.TestCase):
                     return_value=process,
                 ) as popen,
                 patch.object(self.handler, 'move_files', return_value=True),
-                patch('downloader.download_gate', MagicMock()),
+                patch('downloader.download_gate', MagicMock(**{'acquire.return_value': 0})),
             ):
                 result = self.handler.download(
                     'https://example.com/video',
@@ -444,6 +698,50 @@ class TestDownloaderMove(unittest.TestCase):
                 'ja',
             )
 
+    def test_download_publishes_progress_snapshot(self):
+        with tempfile.TemporaryDirectory() as root:
+            root_path = Path(root)
+            log_dir = root_path / 'logs'
+            tmp_dir = root_path / 'tmp'
+            log_dir.mkdir()
+            tmp_dir.mkdir()
+            (log_dir / 'v-progress.progress.json').write_text(
+                json.dumps({'progress': {'percent': 99.0}}),
+                encoding='utf-8',
+            )
+            process = MagicMock(
+                stdout=[
+                    'PYDL_PROGRESS|downloading|40.0%|4M|10M|1M/s|00:06|'
+                    'mp4|137|avc1.640028|none\n',
+                    '[Merger] Merging formats into "/tmp/video.mp4"\n',
+                ],
+                returncode=0,
+            )
+
+            with (
+                patch.dict(
+                    downloader.config,
+                    {'LOG_DIR': str(log_dir), 'TMP_DIR': str(tmp_dir)},
+                ),
+                patch('downloader.probe_subtitle_fallback', return_value=None),
+                patch('downloader.subprocess.Popen', return_value=process),
+                patch.object(self.handler, 'move_files', return_value=True),
+                patch('downloader.download_gate', MagicMock(**{'acquire.return_value': 0})),
+            ):
+                result = self.handler.download(
+                    'https://example.com/video',
+                    'v-progress',
+                    'video',
+                )
+
+            snapshot = json.loads(
+                (log_dir / 'v-progress.progress.json').read_text(encoding='utf-8')
+            )
+            self.assertTrue(result)
+            self.assertEqual(snapshot['task'], 'v-progress')
+            self.assertEqual(snapshot['progress']['percent'], 40.0)
+            self.assertEqual(snapshot['progress']['stage'], 'merge_media')
+
     def test_probe_uses_real_config_and_disables_configured_sleep(self):
         metadata = {
             'requested_subtitles': None,
@@ -470,6 +768,89 @@ class TestDownloaderMove(unittest.TestCase):
         self.assertIn('--simulate', cmd)
         self.assertIn('--dump-single-json', cmd)
 
+    def test_probe_saves_single_video_info_for_download(self):
+        metadata = {
+            'id': 'abc',
+            'requested_subtitles': {'zh-Hans': {'ext': 'vtt'}},
+            'formats': [{'format_id': '137', 'url': 'https://cdn.example.com/v'}],
+        }
+        completed = MagicMock(returncode=0, stdout=json.dumps(metadata))
+
+        with tempfile.TemporaryDirectory() as root:
+            info_path = Path(root) / 'task.info.json'
+            with patch('downloader.subprocess.run', return_value=completed):
+                result = downloader.probe_subtitle_fallback(
+                    'https://example.com/video',
+                    '/project/yt-dlp.local.conf',
+                    info_json_path=str(info_path),
+                )
+
+            self.assertIsNone(result)
+            self.assertEqual(
+                json.loads(info_path.read_text(encoding='utf-8')),
+                metadata,
+            )
+
+            playlist = MagicMock(
+                returncode=0,
+                stdout=json.dumps({'_type': 'playlist', 'entries': [metadata]}),
+            )
+            info_path.unlink()
+            with patch('downloader.subprocess.run', return_value=playlist):
+                downloader.probe_subtitle_fallback(
+                    'https://example.com/playlist',
+                    '/project/yt-dlp.local.conf',
+                    info_json_path=str(info_path),
+                )
+            self.assertFalse(info_path.exists())
+
+    def test_download_loads_probe_info_and_falls_back_to_url(self):
+        with tempfile.TemporaryDirectory() as root:
+            root_path = Path(root)
+            log_dir = root_path / 'logs'
+            tmp_dir = root_path / 'tmp'
+            log_dir.mkdir()
+            tmp_dir.mkdir()
+            info_path = tmp_dir / 'v-info.info.json'
+
+            def probe(url, conf_path, info_json_path=None):
+                Path(info_json_path).write_text('{"id": "abc"}', encoding='utf-8')
+                return None
+
+            failed = MagicMock(stdout=['ERROR: HTTP Error 403\n'], returncode=1)
+            succeeded = MagicMock(stdout=[], returncode=0)
+
+            with (
+                patch.dict(
+                    downloader.config,
+                    {'LOG_DIR': str(log_dir), 'TMP_DIR': str(tmp_dir)},
+                ),
+                patch('downloader.probe_subtitle_fallback', side_effect=probe),
+                patch(
+                    'downloader.subprocess.Popen',
+                    side_effect=[failed, succeeded],
+                ) as popen,
+                patch.object(self.handler, 'move_files', return_value=True),
+                patch('downloader.download_gate', MagicMock(**{'acquire.return_value': 0})),
+            ):
+                result = self.handler.download(
+                    'https://example.com/video',
+                    'v-info',
+                    'video',
+                )
+
+            self.assertTrue(result)
+            first_cmd = popen.call_args_list[0].args[0]
+            retry_cmd = popen.call_args_list[1].args[0]
+            self.assertEqual(first_cmd[-2:], ['--load-info-json', str(info_path)])
+            self.assertEqual(retry_cmd[-1], 'https://example.com/video')
+            self.assertNotIn('--load-info-json', retry_cmd)
+            self.assertFalse(info_path.exists())
+            self.assertIn(
+                'HTTP Error 403',
+                (log_dir / 'v-info.log').read_text(encoding='utf-8'),
+            )
+
 
 if __name__ == '__main__':
     unittest.main()
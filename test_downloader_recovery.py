@@ -0,0 +1,193 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import downloader
+import task_store
+from config_util import MOVE_STAGING_PREFIX
+
+
+class TestStartupRecovery(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        root = Path(self.temp_dir.name)
+        self.urls_dir = root / 'urls'
+        self.tmp_dir = root / 'tmp'
+        self.files_dir = root / 'files'
+        for directory in (self.urls_dir, self.tmp_dir, self.files_dir):
+            directory.mkdir()
+
+    def write_task(self, task_id, extension, url='https://example.com/video'):
+        path = self.urls_dir / f'{task_id}{extension}'
+        path.write_text(url, encoding='utf-8')
+        return path
+
+    def make_old(self, path, seconds):
+        old = time.time() - seconds
+        os.utime(path, (old, old))
+
+    def test_orphaned_downloading_task_is_requeued(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+        task_store.mark_downloading(db_path, 'v20260901120000Brk', 'https://example.com/v')
+        self.write_task('v20260901120000Brk', '.downloading')
+        self.write_task('v20260901120000Don', '.downloading')
+        self.write_task('v20260901120000Don', '.ok')
+
+        recovered = downloader.reset_orphaned_tasks(str(self.urls_dir))
+
+        self.assertEqual(recovered, ['v20260901120000Brk'])
+        self.assertTrue((self.urls_dir / 'v20260901120000Brk.txt').exists())
+        self.assertFalse((self.urls_dir / 'v20260901120000Brk.downloading').exists())
+        self.assertTrue((self.urls_dir / 'v20260901120000Don.downloading').exists())
+        self.assertEqual(
+            task_store.get_task(db_path, 'v20260901120000Brk')['state'],
+            'queued',
+        )
+
+    def test_startup_syncs_ledger_states_from_task_files(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+        task_store.mark_downloading(db_path, 'v20260901120000Stl', 'https://example.com/a')
+        task_store.mark_downloading(db_path, 'v20260901120000Req', 'https://example.com/b')
+        task_store.mark_finished(db_path, 'v20260901120000Req', False)
+        task_store.mark_downloading(db_path, 'v20260901120000Brk', 'https://example.com/c')
+        self.write_task('v20260901120000Stl', '.ok')
+        self.write_task('v20260901120000Req', '.txt')
+        self.write_task('v20260901120000Brk', '.downloading')
+
+        with patch.dict(downloader.config, {'LOG_DIR': str(self.tmp_dir)}):
+            recovered = downloader.recover_on_startup(
+                str(self.urls_dir),
+                str(self.tmp_dir),
+                str(self.files_dir),
+            )
+
+        self.assertEqual(recovered, ['v20260901120000Brk'])
+        tasks = task_store.get_tasks(db_path, [
+            'v20260901120000Stl', 'v20260901120000Req', 'v20260901120000Brk',
+        ])
+        self.assertEqual(
+            {task_id: task['state'] for task_id, task in tasks.items()},
+            {
+                'v20260901120000Stl': 'completed',
+                'v20260901120000Req': 'queued',
+                'v20260901120000Brk': 'queued',
+            },
+        )
+
+    def test_pending_tasks_are_enqueued_in_creation_order(self):
+        self.write_task('a20260901120005Bbb', '.txt')
+        self.write_task('v20260901120001Aaa', '.txt')
+        self.write_task('v20260901115959Zzz', '.ok')
+        scheduler = MagicMock()
+
+        count = downloader.enqueue_pending_tasks(str(self.urls_dir), scheduler)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            [Path(call.args[0]).name for call in scheduler.submit.call_args_list],
+            ['v20260901120001Aaa.txt', 'a20260901120005Bbb.txt'],
+        )
+
+    def test_stale_temp_files_are_cleaned(self):
+        active = self.tmp_dir / 'v20260901120000Act'
+        active.mkdir()
+        (active / 'part.mp4.part').write_bytes(b'x')
+        self.make_old(active, 10 * 86400)
+        empty = self.tmp_dir / 'v20260901120000Emp'
+        empty.mkdir()
+        kept = self.tmp_dir / 'v20260901120000Kep'
+        kept.mkdir()
+        (kept / 'video.mp4').write_bytes(b'x')
+        stale = self.tmp_dir / 'v20260901120000Old'
+        stale.mkdir()
+        (stale / 'video.mp4').write_bytes(b'x')
+        self.make_old(stale, 10 * 86400)
+        (self.tmp_dir / 'v20260901120000Fin.info.json').write_text('{}', encoding='utf-8')
+        (self.tmp_dir / 'unrelated').mkdir()
+        staging = self.files_dir / f'{MOVE_STAGING_PREFIX}abc'
+        staging.write_bytes(b'x')
+        self.make_old(staging, 2 * 3600)
+        fresh_staging = self.files_dir / f'{MOVE_STAGING_PREFIX}new'
+        fresh_staging.write_bytes(b'x')
+        download_staging = self.files_dir / downloader.DOWNLOAD_STAGING_DIRNAME
+        download_staging.mkdir()
+        self.make_old(download_staging, 2 * 3600)
+        log_dir = Path(self.temp_dir.name) / 'logs'
+        log_dir.mkdir()
+        (log_dir / 'v20260901120000Act.progress.json').write_text('{}', encoding='utf-8')
+        (log_dir / 'v20260901120000Fin.progress.json').write_text('{}', encoding='utf-8')
+        (log_dir / 'v20260901120000Fin.log').write_text('', encoding='utf-8')
+
+        removed = downloader.clean_stale_temp(
+            str(self.tmp_dir),
+            str(self.files_dir),
+            {'v20260901120000Act'},
+            72 * 3600,
+            log_dir=str(log_dir),
+        )
+
+        self.assertEqual(
+            sorted(Path(path).name for path in removed),
+            sorted([
+                'v20260901120000Emp',
+                'v20260901120000Old',
+                'v20260901120000Fin.info.json',
+                'v20260901120000Fin.progress.json',
+                f'{MOVE_STAGING_PREFIX}abc',
+            ]),
+        )
+        self.assertTrue((log_dir / 'v20260901120000Act.progress.json').exists())
+        self.assertTrue((log_dir / 'v20260901120000Fin.log').exists())
+        self.assertTrue(active.exists())
+        self.assertTrue(kept.exists())
+        self.assertTrue((self.tmp_dir / 'unrelated').exists())
+        self.assertTrue(fresh_staging.exists())
+        self.assertTrue(download_staging.exists())
+
+    def test_interrupted_download_resumes_with_original_prefix(self):
+        log_dir = Path(self.temp_dir.name) / 'logs'
+        log_dir.mkdir()
+        task_tmp_dir = self.tmp_dir / 'v20260901120000Brk'
+        task_tmp_dir.mkdir()
+        (task_tmp_dir / '09011200-title-abc.f137.mp4.part').write_bytes(b'x')
+        (log_dir / 'v20260901120000Brk.log').write_text('上次的日志\n', encoding='utf-8')
+        process = MagicMock(stdout=['[download] Resuming download\n'], returncode=0)
+        handler = downloader.DownloadHandler(scheduler=None)
+
+        with (
+            patch.dict(
+                downloader.config,
+                {
+                    'LOG_DIR': str(log_dir),
+                    'TMP_DIR': str(self.tmp_dir),
+                    'YT_DLP_OUTPUT_TEMPLATE': '%(title)s-%(id)s.%(ext)s',
+                },
+            ),
+            patch('downloader.subprocess.Popen', return_value=process) as popen,
+            patch('downloader.probe_subtitle_fallback', return_value=None),
+            patch('downloader.download_gate', MagicMock(**{'acquire.return_value': 0})),
+            patch.object(handler, 'move_files', return_value=True),
+        ):
+            result = handler.download(
+                'https://example.com/video',
+                'v20260901120000Brk',
+                'video',
+            )
+
+        cmd = popen.call_args.args[0]
+        self.assertTrue(result)
+        self.assertIn('--continue', cmd)
+        self.assertEqual(
+            cmd[cmd.index('-o') + 1],
+            str(task_tmp_dir / '09011200-%(title)s-%(id)s.%(ext)s'),
+        )
+        log_text = (log_dir / 'v20260901120000Brk.log').read_text(encoding='utf-8')
+        self.assertTrue(log_text.startswith('上次的日志\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import event_log
+import task_store
+
+
+class TestEventLog(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.log_dir = self.temp_dir.name
+
+    def test_emit_returns_offset_for_indexed_reads(self):
+        writer = event_log.EventLog(self.log_dir, 'downloader', 1024 * 1024, 2)
+        self.addCleanup(writer.close)
+
+        first = writer.emit('started', 'v20260901120000Evt', url='https://example.com/v')
+        second = writer.emit('moved', 'v20260901120000Evt', file='视频.mp4', bytes=42)
+
+        self.assertEqual(first, ('downloader-events.000001.jsonl', 0))
+        record = event_log.read_event(self.log_dir, *second)
+        self.assertEqual(record['event'], 'moved')
+        self.assertEqual(record['task'], 'v20260901120000Evt')
+        self.assertEqual(record['file'], '视频.mp4')
+        lines = (Path(self.log_dir) / first[0]).read_text(encoding='utf-8').splitlines()
+        self.assertEqual([json.loads(line)['event'] for line in lines], ['started', 'moved'])
+
+    def test_rotation_keeps_offsets_and_prunes_old_segments(self):
+        writer = event_log.EventLog(self.log_dir, 'downloader', 400, 1)
+        self.addCleanup(writer.close)
+
+        locations = [
+            writer.emit('progress', 'v20260901120000Rot', percent=number, padding='x' * 80)
+            for number in range(6)
+        ]
+
+        segments = [segment for segment, _offset in locations]
+        self.assertEqual(len(set(segments)), 3)
+        self.assertIsNone(event_log.read_event(self.log_dir, *locations[0]))
+        self.assertEqual(event_log.read_event(self.log_dir, *locations[-1])['percent'], 5)
+        self.assertEqual(
+            [Path(path).name for _sequence, path in event_log.list_segments(self.log_dir, 'downloader')],
+            ['downloader-events.000002.jsonl', 'downloader-events.000003.jsonl'],
+        )
+
+    def test_rotation_prunes_ledger_index_for_removed_segments(self):
+        urls_dir = Path(self.log_dir) / 'urls'
+        urls_dir.mkdir()
+        db_path = task_store.open_ledger(str(urls_dir))
+        task_id = 'v20260901120000Prn'
+        pruned = []
+
+        def prune(segments):
+            pruned.extend(segments)
+            task_store.prune_task_events(db_path, segments)
+
+        writer = event_log.EventLog(self.log_dir, 'downloader', 400, 1, on_prune=prune)
+        self.addCleanup(writer.close)
+        for number in range(6):
+            segment, offset = writer.emit(
+                'progress', task_id, percent=number, padding='x' * 80,
+            )
+            task_store.add_task_event(db_path, task_id, 'progress', segment, offset)
+
+        self.assertEqual(pruned, ['downloader-events.000001.jsonl'])
+        entries = task_store.get_task_events(db_path, task_id)
+        self.assertNotIn('downloader-events.000001.jsonl', {entry['segment'] for entry in entries})
+        self.assertEqual(
+            [
+                event_log.read_event(self.log_dir, entry['segment'], entry['offset'])['percent']
+                for entry in entries
+            ],
+            [2, 3, 4, 5],
+        )
+
+    def test_restart_continues_latest_segment(self):
+        writer = event_log.EventLog(self.log_dir, 'uploader', 1024, 2)
+        first = writer.emit('uploaded', file='first.mp4')
+        writer.close()
+
+        restarted = event_log.EventLog(self.log_dir, 'uploader', 1024, 2)
+        self.addCleanup(restarted.close)
+        segment, offset = restarted.emit('uploaded', file='next.mp4')
+
+        self.assertEqual(segment, first[0])
+        self.assertGreater(offset, 0)
+        self.assertEqual(event_log.read_event(self.log_dir, *first)['file'], 'first.mp4')
+
+    def test_read_event_rejects_unknown_segment_names(self):
+        self.assertIsNone(event_log.read_event(self.log_dir, '../downloader.log', 0))
+        self.assertIsNone(event_log.read_event(self.log_dir, 'downloader-events.000009.jsonl', 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
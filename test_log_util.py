@@ -0,0 +1,69 @@
+import logging
+import logging.handlers
+import tempfile
+import unittest
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pytz
+
+import log_util
+
+
+def make_record(created):
+    record = logging.LogRecord('test', logging.INFO, __file__, 0, 'message', None, None)
+    record.created = created
+    return record
+
+
+class TestTimezoneFormatter(unittest.TestCase):
+    def test_cached_offset_follows_daylight_saving_changes(self):
+        formatter = log_util.TimezoneFormatter(timezone='America/New_York')
+        zone = pytz.timezone('America/New_York')
+        # 2026-03-08 07:00 UTC 纽约进入夏令时，前后各取一个时刻
+        for created in (1772953199.5, 1772953200, 1772956800, 1790000000):
+            with self.subTest(created=created):
+                self.assertEqual(
+                    formatter.formatTime(make_record(created), '%Y-%m-%d %H:%M:%S %z'),
+                    datetime.fromtimestamp(created, zone).strftime('%Y-%m-%d %H:%M:%S %z'),
+                )
+
+    def test_default_format_uses_configured_timezone(self):
+        formatter = log_util.TimezoneFormatter(timezone='Asia/Shanghai')
+
+        self.assertEqual(
+            formatter.formatTime(make_record(0)),
+            '1970-01-01 08:00:00',
+        )
+
+
+class TestAsynchronousLogger(unittest.TestCase):
+    def test_records_are_written_by_background_listener(self):
+        with tempfile.TemporaryDirectory() as root:
+            logger = log_util.setup_logger(
+                name=f'test-{uuid.uuid4().hex}',
+                log_dir=root,
+                log_file='service.log',
+                max_bytes=1024 * 1024,
+                backup_count=1,
+                timezone='UTC',
+            )
+            logger.propagate = False
+            self.assertEqual(
+                [type(handler) for handler in logger.handlers],
+                [logging.handlers.QueueHandler],
+            )
+
+            logger.info('第 %d 条日志', 1)
+            handler = logger.handlers[0]
+            log_util.stop_listener(handler.listener)
+            logger.removeHandler(handler)
+
+            content = (Path(root) / 'service.log').read_text(encoding='utf-8')
+
+        self.assertIn('[INFO] 第 1 条日志', content)
+
+
+if __name__ == '__main__':
+    unittest.main()
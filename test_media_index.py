@@ -0,0 +1,113 @@
+import json
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import app as app_module
+import media_index
+from app import app
+
+
+def probe_result(payload):
+    return subprocess.CompletedProcess(
+        args=['ffprobe'],
+        returncode=0,
+        stdout=json.dumps(payload),
+        stderr='',
+    )
+
+
+class TestMediaIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        root = Path(self.temp_dir.name)
+        self.db_path = str(root / 'media_index.sqlite3')
+        self.files_dir = root / 'files'
+        self.files_dir.mkdir()
+        media_index.open_index(self.db_path)
+
+    def test_index_file_stores_probe_until_file_changes(self):
+        video = self.files_dir / 'video.mp4'
+        video.write_bytes(b'v' * 10)
+        payload = {'format': {'tags': {'title': '索引标题'}}}
+        runner = Mock(return_value=probe_result(payload))
+
+        media_index.index_file(self.db_path, str(video), ('format_tags',), runner=runner)
+        stat = video.stat()
+
+        self.assertEqual(
+            media_index.get_probe(
+                self.db_path, str(video), 'format_tags', stat.st_mtime_ns, stat.st_size,
+            ),
+            payload,
+        )
+        self.assertIsNone(
+            media_index.get_probe(
+                self.db_path, str(video), 'format_tags', stat.st_mtime_ns, stat.st_size + 1,
+            )
+        )
+        self.assertIn('-show_entries', runner.call_args.args[0])
+
+    def test_app_probe_reuses_index_across_process_cache(self):
+        video = self.files_dir / 'video.mp4'
+        video.write_bytes(b'v' * 10)
+        stat = video.stat()
+        payload = {'format': {'tags': {'title': '磁盘索引'}}}
+
+        with (
+            patch.dict(app_module.config, {'MEDIA_INDEX_DB_PATH': self.db_path}),
+            patch('app.subprocess.run', return_value=probe_result(payload)) as run,
+        ):
+            app_module._probe_media_metadata.cache_clear()
+            first = app_module._probe_media_metadata(
+                str(video), stat.st_mtime_ns, stat.st_size,
+            )
+            app_module._probe_media_metadata.cache_clear()
+            second = app_module._probe_media_metadata(
+                str(video), stat.st_mtime_ns, stat.st_size,
+            )
+        app_module._probe_media_metadata.cache_clear()
+
+        self.assertEqual(first['title'], '磁盘索引')
+        self.assertEqual(second, first)
+        self.assertEqual(run.call_count, 1)
+
+    def test_player_page_renders_from_prefetched_index(self):
+        video = self.files_dir / 'indexed.mp4'
+        video.write_bytes(b'v' * 10)
+        runner = Mock(side_effect=[
+            probe_result({'format': {'tags': {'title': '预先索引'}}}),
+            probe_result({'streams': []}),
+        ])
+        media_index.index_file(
+            self.db_path,
+            str(video),
+            ('format_tags', 'subtitle_streams'),
+            runner=runner,
+        )
+        app_module._probe_media_metadata.cache_clear()
+        app_module._probe_media_source_url.cache_clear()
+        app_module._probe_embedded_subtitles.cache_clear()
+        self.addCleanup(app_module._probe_media_metadata.cache_clear)
+        self.addCleanup(app_module._probe_media_source_url.cache_clear)
+        self.addCleanup(app_module._probe_embedded_subtitles.cache_clear)
+
+        with (
+            patch.dict(app_module.config, {'MEDIA_INDEX_DB_PATH': self.db_path}),
+            patch('app.FILES_DIR', str(self.files_dir)),
+            patch('app.subprocess.run') as run,
+            patch('app.media_index.get_probe') as get_probe,
+        ):
+            response = app.test_client().get('/player')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('正在播放: 预先索引', response.get_data(as_text=True))
+        run.assert_not_called()
+        get_probe.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
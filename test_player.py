@@ -18,7 +18,12 @@ class TestPlayerPage(unittest.TestCase):
         )
         self.config_patcher = patch.dict(
             app_module.config,
-            {'AI_SUMMARY_DB_PATH': self.summary_db_path},
+            {
+                'AI_SUMMARY_DB_PATH': self.summary_db_path,
+                'MEDIA_INDEX_DB_PATH': str(
+                    Path(self.summary_temp_dir.name) / 'media-index.sqlite3'
+                ),
+            },
         )
         self.config_patcher.start()
         self.addCleanup(self.config_patcher.stop)
@@ -1,5 +1,7 @@
 import subprocess
 import tempfile
+import threading
+import time
 import unittest
 from datetime import datetime
 from pathlib import Path
@@ -133,6 +135,10 @@ class TestResolvePlaylistUrls(unittest.TestCase):
 
 
 class TestExpandTaskUrls(unittest.TestCase):
+    def setUp(self):
+        app._playlist_cache.clear()
+        self.addCleanup(app._playlist_cache.clear)
+
     def test_single_video_url_returned_as_is(self):
         url = 'https://www.youtube.com/watch?v=abcDEF12345'
         urls, error = app.expand_task_urls(url)
@@ -190,6 +196,102 @@ class TestExpandTaskUrls(unittest.TestCase):
         self.assertIn('为空', error)
 
 
+    def test_playlist_resolution_is_cached_by_playlist_id(self):
+        entries = ['https://www.youtube.com/watch?v=a1']
+        with patch('app.resolve_playlist_urls', return_value=(entries, None)) as resolve:
+            first, _ = app.expand_task_urls(
+                'https://www.youtube.com/playlist?list=PLcache')
+            second, _ = app.expand_task_urls(
+                'https://www.youtube.com/watch?v=a1&list=PLcache')
+
+        self.assertEqual(first, entries)
+        self.assertEqual(second, entries)
+        self.assertEqual(resolve.call_count, 1)
+        self.assertEqual(app._playlist_cache.stats()['hits'], 1)
+
+    def test_playlist_failure_is_not_cached(self):
+        entries = ['https://www.youtube.com/watch?v=a1']
+        with patch(
+            'app.resolve_playlist_urls',
+            side_effect=[(None, '解析播放列表失败: boom'), (entries, None)],
+        ) as resolve:
+            _urls, error = app.expand_task_urls(
+                'https://www.youtube.com/playlist?list=PLretry')
+            urls, _error = app.expand_task_urls(
+                'https://www.youtube.com/playlist?list=PLretry')
+
+        self.assertIn('boom', error)
+        self.assertEqual(urls, entries)
+        self.assertEqual(resolve.call_count, 2)
+
+    def test_channel_tab_resolves_only_first_page_after_expiry(self):
+        url = 'https://www.youtube.com/@TED/videos'
+        previous = [
+            'https://www.youtube.com/watch?v=old2',
+            'https://www.youtube.com/watch?v=old1',
+        ]
+        page = ['https://www.youtube.com/watch?v=new1', *previous]
+        key = app.playlist_cache_key(url)
+
+        with (
+            patch.object(app._playlist_cache, 'ttl_seconds', 0),
+            patch('app.resolve_playlist_urls', return_value=(page, None)) as resolve,
+        ):
+            # TTL 为 0：记录立即过期，但仍可作为增量解析的基准
+            app._playlist_cache.put(key, (previous, None))
+            urls, error = app.expand_task_urls(url)
+
+        self.assertIsNone(error)
+        self.assertEqual(urls, page)
+        resolve.assert_called_once()
+        self.assertEqual(
+            resolve.call_args.kwargs['playlist_end'],
+            app.PLAYLIST_INCREMENTAL_PAGE_SIZE,
+        )
+
+    def test_incremental_merge_falls_back_when_anchor_is_missing(self):
+        self.assertIsNone(app.merge_incremental_playlist(['n1', 'n2'], ['o1']))
+        self.assertEqual(
+            app.merge_incremental_playlist(['n1', 'o1', 'o0'], ['o1', 'o0', 'x']),
+            ['n1', 'o1', 'o0', 'x'],
+        )
+        self.assertEqual(
+            app.playlist_cache_key('https://www.youtube.com/@TED/Videos/'),
+            app.playlist_cache_key('https://youtube.com/@ted/videos'),
+        )
+
+    def test_concurrent_playlist_requests_share_one_resolution(self):
+        started = threading.Event()
+        release = threading.Event()
+        entries = ['https://www.youtube.com/watch?v=a1']
+
+        def resolve(url, conf_path, playlist_end=None):
+            started.set()
+            release.wait(5)
+            return entries, None
+
+        results = []
+        with patch('app.resolve_playlist_urls', side_effect=resolve) as resolve_mock:
+            threads = [
+                threading.Thread(target=lambda: results.append(
+                    app.expand_task_urls('https://www.youtube.com/playlist?list=PLshare')
+                ))
+                for _ in range(3)
+            ]
+            threads[0].start()
+            self.assertTrue(started.wait(5))
+            for thread in threads[1:]:
+                thread.start()
+            while app._playlist_cache.stats()['shared'] < 2:
+                threading.Event().wait(0.01)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(resolve_mock.call_count, 1)
+        self.assertEqual(results, [(entries, None)] * 3)
+
+
 class TestCreateTasks(unittest.TestCase):
     def setUp(self):
         self.temp_dir = tempfile.TemporaryDirectory()
@@ -337,5 +439,296 @@ class TestIndexPlaylistSubmit(PlaylistSubmitTestCase):
         self.assertIn('解析播放列表失败: boom', response.get_data(as_text=True))
 
 
+class TestDuplicateTasks(PlaylistSubmitTestCase):
+    def setUp(self):
+        super().setUp()
+        self.files_dir = Path(self.temp_dir.name) / 'files'
+        self.files_dir.mkdir()
+        self.patch_files = patch.object(app, 'FILES_DIR', str(self.files_dir))
+        self.patch_files.start()
+        self.addCleanup(self.patch_files.stop)
+
+    def add_task(self, url, **extra):
+        response = self.client.post(
+            '/api/add_task',
+            json={'url': url, 'types': ['video'], **extra},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_resubmitted_video_reuses_active_task_unless_forced(self):
+        first = self.add_task('https://www.youtube.com/watch?v=abcDEF12345')
+        second = self.add_task('https://youtu.be/abcDEF12345?si=share')
+        forced = self.add_task('https://youtu.be/abcDEF12345', force=True)
+
+        self.assertEqual(second['tasks'], first['tasks'])
+        self.assertEqual(second['duplicates'], first['tasks'])
+        self.assertEqual(second['msg'], 'Task already exists')
+        self.assertNotEqual(forced['tasks'], first['tasks'])
+        self.assertEqual(len(list(self.urls_dir.glob('*.txt'))), 2)
+
+    def test_completed_task_is_reused_only_while_result_exists(self):
+        task_id = self.add_task('https://www.youtube.com/watch?v=abcDEF12345')['tasks'][0]
+        ledger = app.task_ledger_path()
+        app.task_store.mark_finished(ledger, task_id, True)
+        app.task_store.save_result(ledger, task_id, ['video.mp4'])
+        (self.files_dir / 'video.mp4').write_bytes(b'data')
+
+        reused = self.add_task('https://www.youtube.com/shorts/abcDEF12345')
+        (self.files_dir / 'video.mp4').unlink()
+        recreated = self.add_task('https://www.youtube.com/watch?v=abcDEF12345')
+
+        self.assertEqual(reused['tasks'], [task_id])
+        self.assertNotEqual(recreated['tasks'], [task_id])
+
+    def test_result_files_outside_files_dir_are_not_reused(self):
+        task_id = self.add_task('https://www.youtube.com/watch?v=abcDEF12345')['tasks'][0]
+        ledger = app.task_ledger_path()
+        app.task_store.mark_finished(ledger, task_id, True)
+        outside = Path(self.temp_dir.name) / 'outside.mp4'
+        outside.write_bytes(b'data')
+        app.task_store.save_result(ledger, task_id, ['../outside.mp4', str(outside)])
+
+        recreated = self.add_task('https://www.youtube.com/watch?v=abcDEF12345')
+
+        self.assertNotEqual(recreated['tasks'], [task_id])
+
+    def test_failed_task_and_other_mode_are_not_duplicates(self):
+        url = 'https://www.youtube.com/watch?v=abcDEF12345'
+        task_id = self.add_task(url)['tasks'][0]
+        audio = self.client.post(
+            '/api/add_task',
+            json={'url': url, 'types': ['audio']},
+        ).get_json()
+        app.task_store.mark_finished(app.task_ledger_path(), task_id, False)
+        retried = self.add_task(url)
+
+        self.assertTrue(audio['tasks'][0].startswith('a'))
+        self.assertEqual(audio['duplicates'], [])
+        self.assertNotEqual(retried['tasks'], [task_id])
+
+    def test_duplicate_entries_in_one_batch_share_a_task(self):
+        task_ids = app.create_tasks(
+            [
+                'https://www.youtube.com/watch?v=abcDEF12345',
+                'https://youtu.be/abcDEF12345',
+                'https://www.youtube.com/watch?v=zyxWVU98765',
+            ],
+            ['video'],
+        )
+
+        self.assertEqual(task_ids[0], task_ids[1])
+        self.assertNotEqual(task_ids[0], task_ids[2])
+        self.assertEqual(len(list(self.urls_dir.glob('*.txt'))), 2)
+
+
+class TestPlaylistJob(PlaylistSubmitTestCase):
+    def setUp(self):
+        super().setUp()
+        app._playlist_cache.clear()
+        self.addCleanup(app._playlist_cache.clear)
+
+    def wait_for_job(self, job_id):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            info = app.get_task_info(job_id)
+            if info['resolve_state'] != 'resolving':
+                return info
+            time.sleep(0.02)
+        self.fail(f'播放列表任务未结束: {job_id}')
+
+    def wait_for_shared_resolution(self):
+        deadline = time.monotonic() + 5
+        while app._playlist_cache.stats()['shared'] < 1:
+            if time.monotonic() > deadline:
+                self.fail('第二个播放列表任务没有等待进行中的解析')
+            time.sleep(0.01)
+
+    def test_add_task_returns_job_and_creates_tasks_in_background(self):
+        urls = [
+            'https://www.youtube.com/watch?v=a1',
+            'https://www.youtube.com/watch?v=b2',
+            'https://www.youtube.com/watch?v=c3',
+        ]
+        with patch('app.iter_playlist_urls', return_value=iter(urls)) as resolve:
+            response = self.client.post(
+                '/api/add_task',
+                json={
+                    'url': 'https://www.youtube.com/playlist?list=PL1',
+                    'types': ['video'],
+                },
+            )
+            data = response.get_json()
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(data['success'])
+            self.assertEqual(data['tasks'], [data['playlist_job']])
+            info = self.wait_for_job(data['playlist_job'])
+
+        self.assertEqual(resolve.call_args.args[2], 501)
+        self.assertEqual(info['kind'], 'playlist')
+        self.assertEqual(info['state'], 'downloading')
+        self.assertEqual(info['total'], 3)
+        self.assertEqual(info['counts']['queued'], 3)
+        self.assertEqual(
+            [
+                (self.urls_dir / f'{task}.txt').read_text(encoding='utf-8')
+                for task in info['tasks']
+            ],
+            urls,
+        )
+        self.assertEqual(
+            app._playlist_cache.peek('list:PL1', 60),
+            (urls, None),
+        )
+
+        ledger = app.task_ledger_path()
+        for task, succeeded in zip(info['tasks'], (True, True, False)):
+            app.task_store.mark_finished(ledger, task, succeeded)
+        response = self.client.post(
+            '/api/task_info',
+            json={'tasks': [data['playlist_job']]},
+        )
+        aggregate = response.get_json()['tasks'][0]
+        self.assertEqual(aggregate['state'], 'completed')
+        self.assertEqual(aggregate['counts']['completed'], 2)
+        self.assertEqual(aggregate['counts']['failed'], 1)
+        self.assertEqual(aggregate['progress']['percent'], 100.0)
+
+    def test_playlist_over_limit_is_truncated(self):
+        urls = [f'https://www.youtube.com/watch?v=v{index}' for index in range(5)]
+        with (
+            patch('app.iter_playlist_urls', return_value=iter(urls)),
+            patch.dict(app.config, {'PLAYLIST_MAX_ITEMS': 3}),
+        ):
+            job_id = app.submit_playlist_job(
+                'https://www.youtube.com/playlist?list=PL2',
+                ['audio'],
+            )
+            info = self.wait_for_job(job_id)
+
+        self.assertEqual(info['total'], 3)
+        self.assertTrue(info['truncated'])
+        self.assertIn('超过上限 3', info['msg'])
+        self.assertTrue(all(task.startswith('a') for task in info['tasks']))
+        self.assertIsNone(app._playlist_cache.peek('list:PL2', 60))
+
+    def test_resolve_failure_marks_job_failed(self):
+        def fail(*_args):
+            yield 'https://www.youtube.com/watch?v=a1'
+            raise app.PlaylistResolveError('解析播放列表失败: boom')
+
+        with patch('app.iter_playlist_urls', side_effect=fail):
+            job_id = app.submit_playlist_job(
+                'https://www.youtube.com/playlist?list=PL3',
+                ['video'],
+            )
+            info = self.wait_for_job(job_id)
+
+        self.assertEqual(info['resolve_state'], 'failed')
+        self.assertEqual(info['total'], 1)
+        self.assertEqual(info['msg'], '解析播放列表失败: boom')
+
+    def test_concurrent_jobs_for_same_playlist_share_one_enumeration(self):
+        urls = [
+            'https://www.youtube.com/watch?v=s1',
+            'https://www.youtube.com/watch?v=s2',
+        ]
+        started = threading.Event()
+        release = threading.Event()
+
+        def enumerate_playlist(*_args):
+            started.set()
+            release.wait(5)
+            yield from urls
+
+        with patch('app.iter_playlist_urls', side_effect=enumerate_playlist) as resolve:
+            first = app.submit_playlist_job(
+                'https://www.youtube.com/playlist?list=PLsame',
+                ['video'],
+            )
+            self.assertTrue(started.wait(5))
+            second = app.submit_playlist_job(
+                'https://www.youtube.com/playlist?list=PLsame&index=2',
+                ['audio'],
+            )
+            self.wait_for_shared_resolution()
+            release.set()
+            infos = [self.wait_for_job(first), self.wait_for_job(second)]
+
+        self.assertEqual(resolve.call_count, 1)
+        self.assertEqual([info['total'] for info in infos], [2, 2])
+        self.assertEqual(
+            [
+                (self.urls_dir / f'{task}.txt').read_text(encoding='utf-8')
+                for task in infos[1]['tasks']
+            ],
+            urls,
+        )
+        self.assertTrue(all(task.startswith('a') for task in infos[1]['tasks']))
+
+    def test_shared_truncated_result_is_truncated_for_waiting_job(self):
+        urls = [f'https://www.youtube.com/watch?v=t{index}' for index in range(5)]
+        started = threading.Event()
+        release = threading.Event()
+
+        def enumerate_playlist(*_args):
+            started.set()
+            release.wait(5)
+            yield from urls
+
+        with (
+            patch('app.iter_playlist_urls', side_effect=enumerate_playlist) as resolve,
+            patch.dict(app.config, {'PLAYLIST_MAX_ITEMS': 3}),
+        ):
+            first = app.submit_playlist_job(
+                'https://www.youtube.com/playlist?list=PLcut',
+                ['video'],
+            )
+            self.assertTrue(started.wait(5))
+            second = app.submit_playlist_job(
+                'https://www.youtube.com/playlist?list=PLcut',
+                ['audio'],
+            )
+            self.wait_for_shared_resolution()
+            release.set()
+            infos = [self.wait_for_job(first), self.wait_for_job(second)]
+
+        self.assertEqual(resolve.call_count, 1)
+        self.assertEqual([info['total'] for info in infos], [3, 3])
+        self.assertTrue(all(info['truncated'] for info in infos))
+        self.assertIsNone(app._playlist_cache.peek('list:PLcut', 60))
+
+    def test_iter_playlist_urls_streams_entries_and_reports_errors(self):
+        process = MagicMock()
+        process.stdout = iter([
+            'a1|https://www.youtube.com/watch?v=a1\n',
+            'ERROR: [youtube] b2: Video unavailable\n',
+            'b2|NA\n',
+        ])
+        process.wait.return_value = 1
+        process.poll.return_value = 1
+        with patch('app.subprocess.Popen', return_value=process) as popen:
+            entries = app.iter_playlist_urls(
+                'https://www.youtube.com/playlist?list=PL4',
+                'yt-dlp.conf',
+                11,
+            )
+            self.assertEqual(next(entries), 'https://www.youtube.com/watch?v=a1')
+            with self.assertRaises(app.PlaylistResolveError) as raised:
+                next(entries)
+
+        cmd = popen.call_args.args[0]
+        self.assertIn('--lazy-playlist', cmd)
+        self.assertEqual(cmd[cmd.index('--playlist-end') + 1], '11')
+        self.assertIn('Video unavailable', str(raised.exception))
+        process.kill.assert_not_called()
+
+    def test_unknown_playlist_job_is_missing(self):
+        info = app.get_task_info('p20260901120000zzz')
+
+        self.assertFalse(info['exists'])
+        self.assertEqual(info['state'], 'missing')
+
+
 if __name__ == '__main__':
     unittest.main()
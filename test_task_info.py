@@ -6,6 +6,7 @@ from pathlib import Path
 from unittest.mock import patch
 
 import app
+import event_log
 
 
 class TestTaskInfoAPI(unittest.TestCase):
@@ -118,6 +119,95 @@ class TestTaskInfoAPI(unittest.TestCase):
                 self.assertEqual(progress['percent'], 100)
                 self.assertEqual(progress['stage'], expected_stage)
 
+    def test_progress_log_is_read_outside_global_cursor_lock(self):
+        log_path = self.logs_dir / 'unlocked.log'
+        log_path.write_text(
+            'PYDL_PROGRESS|downloading|30.0%|3M|10M|1M/s|00:07|'
+            'mp4|137|avc1.640028|none\n',
+            encoding='utf-8',
+        )
+        real_open = open
+        lock_states = []
+
+        def tracking_open(path, *args, **kwargs):
+            if str(path) == str(log_path):
+                lock_states.append(app._task_progress_lock.locked())
+            return real_open(path, *args, **kwargs)
+
+        with patch('builtins.open', tracking_open):
+            progress = app.parse_task_progress(str(log_path))
+
+        self.assertEqual(progress['percent'], 30)
+        self.assertEqual(lock_states, [False])
+
+    def test_progress_cursor_parses_only_appended_lines(self):
+        log_path = self.logs_dir / 'append.log'
+        log_path.write_text(
+            'PYDL_PROGRESS|downloading|10.0%|1M|10M|1M/s|00:09|'
+            'mp4|137|avc1.640028|none\n',
+            encoding='utf-8',
+        )
+        self.assertEqual(app.parse_task_progress(str(log_path))['percent'], 10)
+
+        with open(log_path, 'a', encoding='utf-8') as log_file:
+            log_file.write('PYDL_PROGRESS|downloading|55.0%|5M|10M|1M/s|00:05|')
+        self.assertEqual(app.parse_task_progress(str(log_path))['percent'], 55)
+
+        with open(log_path, 'a', encoding='utf-8') as log_file:
+            log_file.write(
+                'mp4|137|avc1.640028|none\n'
+                '[Merger] Merging formats into "/tmp/video.mp4"\n'
+            )
+        progress = app.parse_task_progress(str(log_path))
+        self.assertEqual(progress['percent'], 55)
+        self.assertEqual(progress['stage'], 'merge_media')
+
+    def test_progress_cursor_restarts_after_log_is_rewritten(self):
+        log_path = self.logs_dir / 'rewrite.log'
+        log_path.write_text(
+            '[Merger] Merging formats into "/tmp/video.mp4"\n',
+            encoding='utf-8',
+        )
+        self.assertEqual(
+            app.parse_task_progress(str(log_path))['stage'],
+            'merge_media',
+        )
+
+        log_path.write_text(
+            'PYDL_PROGRESS|downloading|30.0%|3M|10M|1M/s|00:07|'
+            'mp4|137|avc1.640028|none\n',
+            encoding='utf-8',
+        )
+        progress = app.parse_task_progress(str(log_path))
+
+        self.assertEqual(progress['percent'], 30)
+        self.assertEqual(progress['stage'], 'download_video')
+
+    def test_downloading_task_prefers_published_progress_snapshot(self):
+        task_id = 'v20260901120000Snp'
+        self.write_task(task_id, '.downloading')
+        (self.logs_dir / f'{task_id}.log').write_text(
+            '[download]  10.0% of 10.00MiB at 1.00MiB/s ETA 00:09\n',
+            encoding='utf-8',
+        )
+        (self.logs_dir / f'{task_id}.progress.json').write_text(
+            json.dumps({
+                'task': task_id,
+                'progress': {
+                    'phase': 'downloading',
+                    'percent': 75.0,
+                    'stage': 'download_video',
+                },
+            }),
+            encoding='utf-8',
+        )
+
+        response = self.client.post('/api/task_info', json={'tasks': task_id})
+        progress = response.get_json()['tasks'][0]['progress']
+
+        self.assertEqual(progress['percent'], 75.0)
+        self.assertEqual(progress['stage'], 'download_video')
+
     def test_postprocessing_stage_overrides_previous_100_percent(self):
         log_path = self.logs_dir / 'merge.log'
         log_path.write_text(
@@ -320,6 +410,239 @@ class TestTaskInfoAPI(unittest.TestCase):
             '/player?file=%E6%81%A2%E5%A4%8D%E7%9A%84%E8%A7%86%E9%A2%91+(1).mp4',
         )
 
+    def test_completed_task_recovers_files_from_indexed_events(self):
+        task_id = 'v20260901120000Evt'
+        filename = '事件恢复.mp4'
+        files_dir = Path(self.temp_dir.name) / 'files'
+        files_dir.mkdir()
+        (files_dir / filename).touch()
+        self.write_task(task_id, '.ok')
+        db_path = app.task_store.open_ledger(str(self.urls_dir))
+        app.task_store.mark_downloading(db_path, task_id, 'https://example.com/video')
+        app.task_store.mark_finished(db_path, task_id, True)
+        writer = event_log.EventLog(str(self.logs_dir), 'downloader', 1024 * 1024, 2)
+        self.addCleanup(writer.close)
+        writer.emit('moved', 'v20260901120000Oth', file='其他任务.mp4')
+        for event, fields in (
+            ('started', {'url': 'https://example.com/video'}),
+            ('moved', {'file': filename, 'bytes': 0, 'method': 'link'}),
+        ):
+            segment, offset = writer.emit(event, task_id, **fields)
+            app.task_store.add_task_event(db_path, task_id, event, segment, offset)
+
+        with patch.object(app, 'FILES_DIR', str(files_dir)):
+            info = self.client.post('/api/task_info', json={'tasks': task_id})
+            events = self.client.get(f'/api/task_events/{task_id}')
+        task = info.get_json()['tasks'][0]
+
+        self.assertEqual(task['files'], [filename])
+        self.assertEqual(
+            [event['event'] for event in events.get_json()['events']],
+            ['started', 'moved'],
+        )
+        self.assertEqual(self.client.get('/api/task_events/bad').status_code, 400)
+
+    def test_task_events_skip_segments_removed_by_rotation(self):
+        task_id = 'v20260901120000Gon'
+        db_path = app.task_store.open_ledger(str(self.urls_dir))
+        writer = event_log.EventLog(str(self.logs_dir), 'downloader', 1024 * 1024, 2)
+        self.addCleanup(writer.close)
+        segment, offset = writer.emit('started', task_id, url='https://example.com/video')
+        app.task_store.add_task_event(db_path, task_id, 'started', segment, offset)
+        app.task_store.add_task_event(
+            db_path, task_id, 'moved', 'downloader-events.000000.jsonl', 0,
+        )
+
+        with patch('app.read_event', wraps=event_log.read_event) as read:
+            records = app.read_task_events(task_id)
+
+        self.assertEqual([record['event'] for record in records], ['started'])
+        read.assert_called_once_with(str(self.logs_dir), segment, offset)
+
+    def test_ledger_url_is_used_with_task_file(self):
+        task_id = 'v20260901120000Led'
+        self.write_task(task_id, '.downloading')
+        db_path = app.task_store.open_ledger(str(self.urls_dir))
+        app.task_store.mark_downloading(
+            db_path,
+            task_id,
+            'https://example.com/ledger',
+        )
+
+        response = self.client.post('/api/task_info', json={'tasks': task_id})
+        task = response.get_json()['tasks'][0]
+
+        self.assertTrue(task['exists'])
+        self.assertEqual(task['state'], 'downloading')
+        self.assertEqual(task['url'], 'https://example.com/ledger')
+
+    def test_task_file_overrides_stale_ledger_state(self):
+        db_path = app.task_store.open_ledger(str(self.urls_dir))
+        cases = (
+            # 台账停在下载中，但文件已改名为 .ok（mark_finished 写入失败）
+            ('v20260901120000Stl', 'downloading', '.ok', 'completed'),
+            # 手工把 .fail 改回 .txt 重新排队
+            ('v20260901120000Req', 'failed', '.txt', 'queued'),
+        )
+        for task_id, ledger_state, extension, _expected in cases:
+            app.task_store.mark_downloading(db_path, task_id, 'https://example.com/video')
+            if ledger_state == 'failed':
+                app.task_store.mark_finished(db_path, task_id, False)
+            self.write_task(task_id, extension)
+        task_ids = [task_id for task_id, *_ in cases]
+
+        batched = self.client.post('/api/task_info', json={'tasks': task_ids})
+        with app.app.test_request_context():
+            single = [app.get_task_info(task_id) for task_id in task_ids]
+
+        self.assertEqual(batched.get_json()['tasks'], single)
+        for info, (task_id, _ledger_state, _extension, expected) in zip(single, cases):
+            with self.subTest(task=task_id):
+                self.assertTrue(info['exists'])
+                self.assertEqual(info['state'], expected)
+
+    def test_ledger_row_without_task_file_is_missing(self):
+        task_id = 'v20260901120000Del'
+        db_path = app.task_store.open_ledger(str(self.urls_dir))
+        app.task_store.mark_downloading(db_path, task_id, 'https://example.com/video')
+        app.task_store.mark_finished(db_path, task_id, True)
+
+        batched = self.client.post('/api/task_info', json={'tasks': task_id})
+        with app.app.test_request_context():
+            single = app.get_task_info(task_id)
+
+        self.assertEqual(batched.get_json()['tasks'], [single])
+        self.assertFalse(single['exists'])
+        self.assertEqual(single['state'], 'missing')
+
+    def test_created_tasks_are_recorded_in_ledger(self):
+        task_ids = app.create_tasks(['https://example.com/new'], ['audio'])
+
+        db_path = app.task_store.ledger_path(str(self.urls_dir))
+        task = app.task_store.get_task(db_path, task_ids[0])
+        self.assertEqual(task['state'], 'queued')
+        self.assertEqual(task['mode'], 'audio')
+        self.assertEqual(task['url'], 'https://example.com/new')
+
+    def test_batched_lookup_matches_single_task_lookup(self):
+        queued_id = 'v20260901120000Que'
+        completed_id = 'a20260901120000Fin'
+        legacy_id = 'v20260901120000Leg'
+        self.write_task(queued_id, '.txt')
+        self.write_task(completed_id, '.ok')
+        self.write_task(legacy_id, '.ok')
+        files_dir = Path(self.temp_dir.name) / 'files'
+        files_dir.mkdir()
+        (files_dir / 'final.mp3').write_bytes(b'a' * 1024)
+        (self.urls_dir / f'{completed_id}.result.json').write_text(
+            json.dumps({'files': ['final.mp3', 'missing.srt']}),
+            encoding='utf-8',
+        )
+        legacy_path = files_dir / 'legacy.mp4'
+        legacy_path.write_bytes(b'v' * 4096)
+        (self.logs_dir / 'downloader.log').write_text(
+            (
+                '2026-09-01 12:00:00 [INFO] 已移动文件: '
+                f'/tmp/{legacy_id}/legacy.mp4 -> {legacy_path}\n'
+            ),
+            encoding='utf-8',
+        )
+        task_ids = [queued_id, completed_id, legacy_id, 'v20260901120000Nop', '../x']
+
+        with patch.object(app, 'FILES_DIR', str(files_dir)):
+            response = self.client.post(
+                '/api/task_info',
+                json={'tasks': task_ids},
+            )
+            with app.app.test_request_context():
+                single = [app.get_task_info(task_id) for task_id in task_ids]
+        data = response.get_json()
+
+        self.assertEqual(data['tasks'], single)
+        self.assertEqual(data['tasks'][1]['files'], ['final.mp3'])
+        self.assertEqual(data['tasks'][1]['progress']['final_size_bytes'], 1024)
+        self.assertEqual(data['tasks'][2]['files'], ['legacy.mp4'])
+        self.assertFalse(data['tasks'][3]['exists'])
+        self.assertIn('elapsed_ms', data)
+        self.assertTrue(
+            response.headers['Server-Timing'].startswith('task_info;dur=')
+        )
+
+    def test_task_stream_pushes_only_changed_tasks(self):
+        running_id = 'v20260901120000Run'
+        finished_id = 'a20260901120000Don'
+        self.write_task(running_id, '.downloading')
+        self.write_task(finished_id, '.ok')
+
+        with (
+            patch.object(app, 'TASK_STREAM_INTERVAL_SECONDS', 0),
+            patch.object(app, 'TASK_INFO_CACHE_TTL_SECONDS', 0),
+        ):
+            response = self.client.get(
+                f'/api/task_stream?tasks={running_id},{finished_id}',
+                buffered=False,
+            )
+            iterator = iter(response.response)
+            first = json.loads(next(iterator))
+            second = json.loads(next(iterator))
+            (self.urls_dir / f'{running_id}.downloading').rename(
+                self.urls_dir / f'{running_id}.ok'
+            )
+            app.task_store.mark_finished(
+                app.task_store.ledger_path(str(self.urls_dir)),
+                running_id,
+                True,
+            )
+            changed = json.loads(next(iterator))
+            done = json.loads(next(iterator))
+
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual((first['task'], first['state']), (running_id, 'downloading'))
+        self.assertEqual((second['task'], second['state']), (finished_id, 'completed'))
+        self.assertEqual((changed['task'], changed['state']), (running_id, 'completed'))
+        self.assertEqual(done, {'type': 'done'})
+
+    def test_task_stream_expands_playlist_job_tasks(self):
+        ledger = app.task_store.ledger_path(str(self.urls_dir))
+        app.task_store.open_ledger(str(self.urls_dir))
+        child_id = 'v20260901120000Chd'
+        self.write_task(child_id, '.ok')
+        app.task_store.create_tasks(ledger, [
+            (child_id, 'video', 'https://example.com/video'),
+        ])
+        app.task_store.mark_finished(ledger, child_id, True)
+        app.task_store.create_playlist_job(
+            ledger,
+            'p20260901120000Lst',
+            'https://www.youtube.com/playlist?list=PL1',
+            ['video'],
+        )
+        app.task_store.add_playlist_tasks(ledger, 'p20260901120000Lst', [child_id])
+        app.task_store.finish_playlist_job(ledger, 'p20260901120000Lst')
+
+        with (
+            patch.object(app, 'TASK_STREAM_INTERVAL_SECONDS', 0),
+            patch.object(app, 'TASK_INFO_CACHE_TTL_SECONDS', 0),
+        ):
+            response = self.client.get(
+                '/api/task_stream?tasks=p20260901120000Lst',
+                buffered=False,
+            )
+            events = [json.loads(line) for line in response.response]
+
+        playlist, child, done = events
+        self.assertEqual(playlist['kind'], 'playlist')
+        self.assertEqual(playlist['tasks'], [child_id])
+        self.assertEqual(playlist['state'], 'completed')
+        self.assertEqual((child['task'], child['state']), (child_id, 'completed'))
+        self.assertEqual(done, {'type': 'done'})
+
+    def test_task_stream_requires_tasks(self):
+        response = self.client.get('/api/task_stream')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.get_json()['success'])
+
     def test_rejects_invalid_task_id_without_path_lookup(self):
         response = self.client.post(
             '/api/task_info',
@@ -330,6 +653,38 @@ class TestTaskInfoAPI(unittest.TestCase):
         self.assertFalse(task['exists'])
         self.assertEqual(task['msg'], 'Invalid task id')
 
+    def test_reports_retry_attempts_from_ledger(self):
+        task_id = 'v20260723120000Rty'
+        self.write_task(task_id, '.downloading')
+        db_path = app.task_store.open_ledger(str(self.urls_dir))
+        app.task_store.mark_downloading(db_path, task_id, 'https://example.com/video')
+        app.task_store.record_attempt(
+            db_path,
+            task_id,
+            1,
+            'ERROR: [generic] video: Connection reset by peer',
+        )
+        (self.logs_dir / f'{task_id}.progress.json').write_text(
+            json.dumps({
+                "task": task_id,
+                "progress": {
+                    "percent": 40.0,
+                    "phase": "retry_wait",
+                    "stage": "retry_wait",
+                    "attempt": 1,
+                    "max_attempts": 3,
+                },
+            }),
+            encoding='utf-8',
+        )
+
+        response = self.client.post('/api/task_info', json={'tasks': [task_id]})
+        task = response.get_json()['tasks'][0]
+
+        self.assertEqual(task['attempts'], 1)
+        self.assertIn('Connection reset', task['last_error'])
+        self.assertEqual(task['progress']['stage'], 'retry_wait')
+
     def test_accepts_legacy_numeric_task_suffix(self):
         task_id = 'a202505161122552581'
         self.write_task(task_id, '.txt')
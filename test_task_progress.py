@@ -0,0 +1,70 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import task_progress
+
+
+class TestProgressPublisher(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.log_dir = Path(self.temp_dir.name)
+
+    def read_snapshot(self, task_id):
+        return task_progress.read_progress_snapshot(
+            task_progress.progress_snapshot_path(str(self.log_dir), task_id)
+        )
+
+    def test_throttles_updates_within_the_same_stage(self):
+        publisher = task_progress.ProgressPublisher(
+            str(self.log_dir),
+            'v1',
+            min_interval=60,
+        )
+        publisher.feed('[download]  10.0% of 10.00MiB at 1.00MiB/s ETA 00:09')
+        publisher.feed('[download]  20.0% of 10.00MiB at 1.00MiB/s ETA 00:08')
+
+        self.assertEqual(self.read_snapshot('v1')['percent'], 10.0)
+
+        publisher.flush()
+        self.assertEqual(self.read_snapshot('v1')['percent'], 20.0)
+
+    def test_stage_change_is_published_immediately(self):
+        publisher = task_progress.ProgressPublisher(
+            str(self.log_dir),
+            'v2',
+            min_interval=60,
+        )
+        publisher.feed('[download] 100.0% of 10.00MiB at 1.00MiB/s ETA 00:00')
+        publisher.feed('[Merger] Merging formats into "/tmp/video.mp4"')
+
+        snapshot = self.read_snapshot('v2')
+        self.assertEqual(snapshot['percent'], 100.0)
+        self.assertEqual(snapshot['stage'], 'merge_media')
+
+    def test_snapshot_is_replaced_atomically(self):
+        publisher = task_progress.ProgressPublisher(str(self.log_dir), 'v3')
+        publisher.feed('[download]  10.0% of 10.00MiB at 1.00MiB/s ETA 00:09')
+
+        with patch('task_progress.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                publisher.feed('[Merger] Merging formats into "/tmp/video.mp4"')
+
+        self.assertEqual(self.read_snapshot('v3')['stage'], 'downloading')
+        self.assertEqual(
+            [path.name for path in self.log_dir.iterdir()],
+            ['v3.progress.json'],
+        )
+
+    def test_invalid_snapshot_is_ignored(self):
+        path = self.log_dir / 'v4.progress.json'
+        path.write_text(json.dumps({'progress': None}), encoding='utf-8')
+
+        self.assertIsNone(task_progress.read_progress_snapshot(str(path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
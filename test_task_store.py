@@ -0,0 +1,314 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import task_store
+
+
+class TestTaskStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.urls_dir = Path(self.temp_dir.name)
+
+    def test_initializes_wal_schema(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+
+        self.assertEqual(Path(db_path).name, task_store.LEDGER_FILENAME)
+        with task_store.connect(db_path) as db:
+            self.assertEqual(
+                db.execute('PRAGMA user_version').fetchone()[0],
+                task_store.SCHEMA_VERSION,
+            )
+            self.assertEqual(
+                db.execute('PRAGMA journal_mode').fetchone()[0].lower(),
+                'wal',
+            )
+
+    def test_all_writers_start_immediate_transactions(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+        task_id = 'v20260901120000Wrt'
+        real_connect = task_store.sqlite3.connect
+        statements = []
+
+        def traced_connect(*args, **kwargs):
+            connection = real_connect(*args, **kwargs)
+            connection.set_trace_callback(statements.append)
+            return connection
+
+        writers = [
+            lambda: task_store.create_tasks(db_path, [(task_id, 'video', 'https://example.com/v')]),
+            lambda: task_store.mark_downloading(db_path, task_id, 'https://example.com/v'),
+            lambda: task_store.record_attempt(db_path, task_id, 1),
+            lambda: task_store.requeue_tasks(db_path, [task_id]),
+            lambda: task_store.mark_finished(db_path, task_id, True),
+            lambda: task_store.sync_task_states(db_path, {task_id: 'failed'}),
+            lambda: task_store.save_result(db_path, task_id, ['v.mp4']),
+            lambda: task_store.add_result_files(db_path, task_id, ['v.srt']),
+            lambda: task_store.add_task_event(db_path, task_id, 'moved', 'segment', 0),
+            lambda: task_store.prune_task_events(db_path, ['segment']),
+        ]
+        for writer in writers:
+            statements.clear()
+            with patch('task_store.sqlite3.connect', side_effect=traced_connect):
+                writer()
+            writes = [
+                statement for statement in statements
+                if not statement.startswith('PRAGMA')
+            ]
+            self.assertEqual(writes[0], 'BEGIN IMMEDIATE')
+
+    def test_write_transaction_rolls_back_on_error(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+
+        with self.assertRaises(RuntimeError):
+            with task_store.write_transaction(db_path) as db:
+                db.execute(
+                    "INSERT INTO tasks (task_id, mode, url, state, created_at, updated_at)"
+                    " VALUES ('v20260901120000Rbk', 'video', 'u', 'queued', 0, 0)"
+                )
+                raise RuntimeError('中断写入')
+
+        self.assertIsNone(task_store.get_task(db_path, 'v20260901120000Rbk'))
+
+    def test_playlist_job_records_tasks_in_order(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+        task_store.create_playlist_job(
+            db_path,
+            'p20260901120000AbC',
+            'https://example.com/playlist?list=PL1',
+            ['video', 'audio'],
+        )
+        task_store.add_playlist_tasks(db_path, 'p20260901120000AbC', ['v2', 'a2'])
+        task_store.add_playlist_tasks(db_path, 'p20260901120000AbC', ['v1'])
+
+        job = task_store.get_playlist_jobs(db_path, ['p20260901120000AbC'])[
+            'p20260901120000AbC'
+        ]
+        self.assertEqual(job['state'], 'resolving')
+        self.assertEqual(job['types'], ['video', 'audio'])
+        self.assertEqual(job['tasks'], ['v2', 'a2', 'v1'])
+
+        task_store.finish_playlist_job(
+            db_path,
+            'p20260901120000AbC',
+            error='播放列表超过上限',
+            truncated=True,
+        )
+        job = task_store.get_playlist_jobs(db_path, ['p20260901120000AbC'])[
+            'p20260901120000AbC'
+        ]
+        self.assertEqual(job['state'], 'completed')
+        self.assertTrue(job['truncated'])
+        self.assertIsNotNone(job['finished_at'])
+        self.assertEqual(task_store.get_playlist_jobs(db_path, ['pMissing']), {})
+
+    def test_upgrade_backfills_media_keys(self):
+        db_path = task_store.ledger_path(str(self.urls_dir))
+        with task_store.connect(db_path) as db:
+            db.executescript(
+                """
+                CREATE TABLE tasks (
+                    task_id TEXT PRIMARY KEY,
+                    mode TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL,
+                    started_at INTEGER,
+                    finished_at INTEGER,
+                    result_files TEXT,
+                    summary TEXT
+                );
+                CREATE TABLE playlist_jobs (job_id TEXT PRIMARY KEY);
+                CREATE TABLE playlist_tasks (job_id TEXT, position INTEGER, task_id TEXT);
+                INSERT INTO tasks VALUES (
+                    'v20260901120000AbC', 'video',
+                    'https://youtu.be/abcDEF12345', 'completed',
+                    1, 1, NULL, 1, '["old.mp4"]', NULL
+                );
+                INSERT INTO tasks VALUES (
+                    'v20260901120000Oth', 'video',
+                    'https://example.com/video', 'queued',
+                    1, 1, NULL, NULL, NULL, NULL
+                );
+                PRAGMA user_version = 2;
+                """
+            )
+
+        task_store.init_db(db_path)
+
+        task = task_store.get_task(db_path, 'v20260901120000AbC')
+        self.assertEqual(task['media_key'], 'youtube:abcDEF12345')
+        self.assertIsNone(task_store.get_task(db_path, 'v20260901120000Oth')['media_key'])
+        self.assertEqual(
+            task_store.find_task_by_result_file(db_path, 'old.mp4'),
+            'v20260901120000AbC',
+        )
+
+    def test_find_media_tasks_prefers_active_tasks(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+        task_store.create_tasks(db_path, [
+            ('v20260901120000Old', 'video', 'https://youtu.be/abcDEF12345'),
+            ('v20260901120000New', 'video', 'https://www.youtube.com/watch?v=abcDEF12345'),
+            ('a20260901120000Aud', 'audio', 'https://youtu.be/abcDEF12345'),
+            ('v20260901120000Bad', 'video', 'https://youtu.be/abcDEF12345'),
+        ])
+        task_store.mark_finished(db_path, 'v20260901120000Old', True)
+        task_store.mark_finished(db_path, 'v20260901120000Bad', False)
+
+        found = task_store.find_media_tasks(
+            db_path,
+            'video',
+            ['youtube:abcDEF12345', None],
+        )
+
+        self.assertEqual(
+            [task['task_id'] for task in found['youtube:abcDEF12345']],
+            ['v20260901120000New', 'v20260901120000Old'],
+        )
+
+    def test_task_lifecycle_is_recorded(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+        task_store.create_tasks(db_path, [
+            ('v20260901120000AbC', 'video', 'https://example.com/v'),
+        ])
+        self.assertEqual(
+            task_store.get_task(db_path, 'v20260901120000AbC')['state'],
+            'queued',
+        )
+
+        task_store.mark_downloading(
+            db_path,
+            'v20260901120000AbC',
+            'https://example.com/v',
+        )
+        task_store.save_result(
+            db_path,
+            'v20260901120000AbC',
+            ['video.mp4'],
+            summary={'final_size_bytes': 10},
+        )
+        task_store.mark_finished(db_path, 'v20260901120000AbC', True)
+
+        task = task_store.get_task(db_path, 'v20260901120000AbC')
+        self.assertEqual(task['state'], 'completed')
+        self.assertEqual(task['mode'], 'video')
+        self.assertEqual(task['result_files'], ['video.mp4'])
+        self.assertEqual(task['summary'], {'final_size_bytes': 10})
+        self.assertIsNotNone(task['started_at'])
+        self.assertIsNotNone(task['finished_at'])
+
+    def test_result_files_are_indexed_by_filename(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+        task_store.mark_downloading(db_path, 'v20260901120000Old', 'https://example.com/a')
+        task_store.mark_downloading(db_path, 'v20260901120000New', 'https://example.com/b')
+
+        # 文件移入时即可查到所属任务，不必等待任务完成
+        task_store.add_result_files(db_path, 'v20260901120000Old', ['video.mp4', 'video.srt'])
+        self.assertEqual(
+            task_store.find_task_by_result_file(db_path, 'video.srt'),
+            'v20260901120000Old',
+        )
+
+        task_store.save_result(db_path, 'v20260901120000New', ['video.mp4'])
+
+        self.assertEqual(
+            task_store.find_task_by_result_file(db_path, 'video.mp4'),
+            'v20260901120000New',
+        )
+        self.assertIsNone(task_store.find_task_by_result_file(db_path, 'other.mp4'))
+
+    def test_first_open_imports_existing_task_files(self):
+        (self.urls_dir / 'a20260901120000Old.txt').write_text(
+            'https://example.com/a',
+            encoding='utf-8',
+        )
+        (self.urls_dir / 'v20260901120000Ok1.ok').write_text(
+            'https://example.com/v',
+            encoding='utf-8',
+        )
+        (self.urls_dir / 'v20260901120000Ok1.result.json').write_text(
+            json.dumps({'files': ['final.mp4'], 'summary': {'elapsed_seconds': 3}}),
+            encoding='utf-8',
+        )
+        (self.urls_dir / 'notes.txt').write_text('ignored', encoding='utf-8')
+
+        db_path = task_store.open_ledger(str(self.urls_dir))
+        tasks = task_store.get_tasks(
+            db_path,
+            ['a20260901120000Old', 'v20260901120000Ok1', 'v20260901120000Nop'],
+        )
+
+        self.assertEqual(set(tasks), {'a20260901120000Old', 'v20260901120000Ok1'})
+        self.assertEqual(tasks['a20260901120000Old']['state'], 'queued')
+        self.assertEqual(tasks['a20260901120000Old']['mode'], 'audio')
+        self.assertEqual(tasks['v20260901120000Ok1']['state'], 'completed')
+        self.assertEqual(tasks['v20260901120000Ok1']['result_files'], ['final.mp4'])
+        self.assertEqual(
+            task_store.find_task_by_result_file(db_path, 'final.mp4'),
+            'v20260901120000Ok1',
+        )
+        self.assertEqual(
+            tasks['v20260901120000Ok1']['summary'],
+            {'elapsed_seconds': 3},
+        )
+
+    def test_import_keeps_existing_ledger_rows(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+        task_store.create_tasks(db_path, [
+            ('v20260901120000Dup', 'video', 'https://example.com/v'),
+        ])
+        task_store.mark_downloading(
+            db_path,
+            'v20260901120000Dup',
+            'https://example.com/v',
+        )
+        (self.urls_dir / 'v20260901120000Dup.txt').write_text(
+            'https://example.com/v',
+            encoding='utf-8',
+        )
+
+        imported = task_store.import_urls_dir(db_path, str(self.urls_dir))
+
+        self.assertEqual(imported, 0)
+        self.assertEqual(
+            task_store.get_task(db_path, 'v20260901120000Dup')['state'],
+            'downloading',
+        )
+
+
+    def test_sync_task_states_follows_task_files(self):
+        db_path = task_store.open_ledger(str(self.urls_dir))
+        task_store.create_tasks(db_path, [
+            ('v20260901120000Stl', 'video', 'https://example.com/a'),
+            ('v20260901120000Req', 'video', 'https://example.com/b'),
+            ('v20260901120000Sam', 'video', 'https://example.com/c'),
+        ])
+        task_store.mark_downloading(db_path, 'v20260901120000Stl', 'https://example.com/a')
+        task_store.mark_downloading(db_path, 'v20260901120000Req', 'https://example.com/b')
+        task_store.mark_finished(db_path, 'v20260901120000Req', False)
+
+        changed = task_store.sync_task_states(db_path, {
+            'v20260901120000Stl': 'completed',
+            'v20260901120000Req': 'queued',
+            'v20260901120000Sam': 'queued',
+            'v20260901120000Nop': 'queued',
+        })
+
+        self.assertEqual(changed, ['v20260901120000Stl', 'v20260901120000Req'])
+        tasks = task_store.get_tasks(db_path, [
+            'v20260901120000Stl', 'v20260901120000Req', 'v20260901120000Nop',
+        ])
+        self.assertEqual(tasks['v20260901120000Stl']['state'], 'completed')
+        self.assertIsNotNone(tasks['v20260901120000Stl']['finished_at'])
+        self.assertEqual(tasks['v20260901120000Req']['state'], 'queued')
+        self.assertIsNone(tasks['v20260901120000Req']['started_at'])
+        self.assertIsNone(tasks['v20260901120000Req']['finished_at'])
+        self.assertNotIn('v20260901120000Nop', tasks)
+
+
+if __name__ == '__main__':
+    unittest.main()
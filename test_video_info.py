@@ -1,8 +1,10 @@
 import unittest
 import json
 import subprocess
+import threading
 from unittest.mock import patch
 
+import app as app_module
 from app import app
 
 class TestVideoInfoAPI(unittest.TestCase):
@@ -11,6 +13,8 @@ class TestVideoInfoAPI(unittest.TestCase):
         self.app = app.test_client()
         # 设置测试模式
         self.app.testing = True
+        app_module.clear_video_info_cache()
+        self.addCleanup(app_module.clear_video_info_cache)
 
     def test_missing_url(self):
         """测试缺少url参数的情况"""
@@ -79,6 +83,8 @@ class TestVideoInfoAPI(unittest.TestCase):
 
         for info, expected in cases:
             with self.subTest(expected=expected):
+                # 每组数据使用同一 URL，需清空缓存才会重新调用 yt-dlp
+                app_module.clear_video_info_cache()
                 run.return_value = subprocess.CompletedProcess(
                     args=[],
                     returncode=0,
@@ -99,6 +105,89 @@ class TestVideoInfoAPI(unittest.TestCase):
                 self.assertEqual(response.status_code, 200)
                 self.assertEqual(data['uploader'], expected)
 
+    @patch('app.subprocess.run')
+    def test_video_info_is_cached_by_normalized_url(self, run):
+        """同一视频的不同链接形式命中缓存，不再重复调用 yt-dlp。"""
+        run.return_value = subprocess.CompletedProcess(
+            args=[],
+            returncode=0,
+            stdout=json.dumps({'title': 'cached', 'formats': []}),
+            stderr='',
+        )
+
+        first = self.app.post(
+            '/api/video_info',
+            json={'url': 'https://www.youtube.com/watch?v=abcdefghijk'},
+        )
+        second = self.app.post(
+            '/api/video_info',
+            json={'url': 'https://youtu.be/abcdefghijk'},
+        )
+        stats = self.app.get('/api/video_info/cache_stats').get_json()
+
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(first.headers['X-Video-Info-Cache'], 'miss')
+        self.assertEqual(second.headers['X-Video-Info-Cache'], 'hit')
+        self.assertEqual(second.get_json()['title'], 'cached')
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+
+    @patch('app.subprocess.run')
+    def test_video_info_failures_are_not_cached(self, run):
+        run.side_effect = [
+            subprocess.CalledProcessError(1, ['yt-dlp'], stderr='ERROR: 暂时失败'),
+            subprocess.CompletedProcess(
+                args=[],
+                returncode=0,
+                stdout=json.dumps({'title': 'ok', 'formats': []}),
+                stderr='',
+            ),
+        ]
+
+        failed = self.app.post('/api/video_info', json={'url': 'https://example.com/v'})
+        succeeded = self.app.post('/api/video_info', json={'url': 'https://example.com/v'})
+
+        self.assertEqual(failed.status_code, 500)
+        self.assertIn('暂时失败', failed.get_json()['msg'])
+        self.assertEqual(succeeded.status_code, 200)
+        self.assertEqual(run.call_count, 2)
+
+    def test_concurrent_video_info_requests_share_one_extraction(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def extract(url):
+            calls.append(url)
+            started.set()
+            release.wait(5)
+            return {'success': True, 'title': 'shared'}
+
+        results = []
+        with patch('app.extract_video_info', side_effect=extract):
+            leader = threading.Thread(
+                target=lambda: results.append(app_module.get_video_info('https://example.com/v')),
+            )
+            leader.start()
+            self.assertTrue(started.wait(5))
+            follower = threading.Thread(
+                target=lambda: results.append(app_module.get_video_info('https://example.com/v')),
+            )
+            follower.start()
+            while app_module.video_info_cache_stats()['shared'] < 1:
+                threading.Event().wait(0.01)
+            release.set()
+            leader.join(5)
+            follower.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(
+            sorted(status for _info, status in results),
+            ['miss', 'shared'],
+        )
+        self.assertTrue(all(info['title'] == 'shared' for info, _status in results))
+
     def test_valid_video(self):
         """测试有效的视频URL"""
         # 使用一个已知存在的视频
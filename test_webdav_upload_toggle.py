@@ -4,6 +4,8 @@ import unittest
 from pathlib import Path
 from unittest.mock import patch
 
+import event_log
+import task_store
 import webdav_uploader
 import start
 from config_util import DEFAULT_CONFIG, is_webdav_upload_enabled
@@ -126,6 +128,48 @@ start_services
             client.check.assert_not_called()
             client.upload_sync.assert_not_called()
 
+    def test_upload_events_are_indexed_under_owning_task(self):
+        handler = webdav_uploader.WebDAVUploadHandler()
+
+        with tempfile.TemporaryDirectory() as root:
+            root_path = Path(root)
+            urls_dir = root_path / 'urls'
+            urls_dir.mkdir()
+            media_file = root_path / '09011200-上传.mp4'
+            media_file.write_bytes(b'video')
+            task_id = 'v20260901120000Upl'
+            db_path = task_store.open_ledger(str(urls_dir))
+            task_store.mark_downloading(db_path, task_id, 'https://example.com/video')
+            # 任务仍在下载中（字幕等其他产物尚未移动），已移入的文件也能查到所属任务
+            task_store.add_result_files(db_path, task_id, [media_file.name])
+            writer = event_log.EventLog(root, 'uploader', 1024 * 1024, 2)
+            self.addCleanup(writer.close)
+
+            with (
+                patch.dict(
+                    webdav_uploader.config,
+                    {
+                        'ENABLE_WEBDAV_UPLOAD': True,
+                        'DELETE_AFTER_UPLOAD': False,
+                        'WEBDAV_UPLOAD_EXCLUDE_KEYWORDS': [],
+                        'URLS_DIR': str(urls_dir),
+                    },
+                ),
+                patch.object(webdav_uploader, 'event_log', writer),
+                patch.object(webdav_uploader, 'video_webdav') as client,
+                patch('webdav_uploader.bark_notify'),
+            ):
+                client.check.return_value = False
+                handler.process_file(str(media_file))
+
+            entries = task_store.get_task_events(db_path, task_id)
+            record = event_log.read_event(root, entries[0]['segment'], entries[0]['offset'])
+
+        client.upload_sync.assert_called_once()
+        self.assertEqual([entry['event'] for entry in entries], ['uploaded'])
+        self.assertEqual(record['task'], task_id)
+        self.assertEqual(record['file'], '09011200-上传.mp4')
+
     def test_excluded_filename_keeps_local_file_and_logs_keyword(self):
         handler = webdav_uploader.WebDAVUploadHandler()
 
@@ -0,0 +1,163 @@
+import importlib.util
+import json
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import ytdlp_engine
+
+
+class TestYtDlpEngine(unittest.TestCase):
+    def test_split_lines_uses_universal_newlines_across_chunks(self):
+        lines, rest = ytdlp_engine.split_lines('', 'a\r')
+        self.assertEqual((lines, rest), ([], 'a\r'))
+        lines, rest = ytdlp_engine.split_lines(rest, '\nb\rc')
+        self.assertEqual((lines, rest), (['a\n', 'b\n'], 'c'))
+        lines, rest = ytdlp_engine.split_lines(rest, '', final=True)
+        self.assertEqual((lines, rest), (['c'], ''))
+
+    def test_subprocess_mode_keeps_original_calls(self):
+        completed = MagicMock(returncode=0, stdout='{}')
+        config = {'YT_DLP_ENGINE': 'subprocess'}
+
+        with (
+            patch('ytdlp_engine.subprocess.run', return_value=completed) as run,
+            patch('ytdlp_engine.subprocess.Popen') as popen,
+        ):
+            result = ytdlp_engine.run(['yt-dlp', 'url'], config, timeout=5)
+            ytdlp_engine.popen(['yt-dlp', 'url'], config)
+
+        self.assertIs(result, completed)
+        run.assert_called_once_with(
+            ['yt-dlp', 'url'],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        self.assertEqual(popen.call_args.kwargs['stderr'], subprocess.STDOUT)
+        self.assertEqual(ytdlp_engine.engine_mode({}), 'subprocess')
+        self.assertEqual(
+            ytdlp_engine.engine_mode({'YT_DLP_ENGINE': 'Embedded'}),
+            'embedded',
+        )
+
+    @unittest.skipUnless(importlib.util.find_spec('yt_dlp'), '需要安装 yt-dlp')
+    def test_embedded_engine_reuses_worker_and_matches_cli_output(self):
+        engine = ytdlp_engine.YtDlpEngine(idle_workers=1)
+        self.addCleanup(engine.close)
+
+        with tempfile.TemporaryDirectory() as root:
+            info_path = Path(root) / 'video.info.json'
+            info_path.write_text(
+                json.dumps({
+                    'id': 'abc123',
+                    'title': '测试视频',
+                    'extractor': 'generic',
+                    'extractor_key': 'Generic',
+                    'webpage_url': 'https://example.com/watch/abc123',
+                    'formats': [{
+                        'format_id': '18',
+                        'url': 'https://example.com/abc123.mp4',
+                        'ext': 'mp4',
+                    }],
+                }),
+                encoding='utf-8',
+            )
+            cmd = [
+                'yt-dlp', '--ignore-config', '--load-info-json', str(info_path),
+                '--simulate', '--print', '%(id)s|%(title)s',
+            ]
+
+            first = engine.run(cmd, timeout=60)
+            pids = engine.worker_pids()
+            second = engine.run(cmd, timeout=60)
+
+        self.assertEqual(first.returncode, 0)
+        self.assertEqual(first.stdout, 'abc123|测试视频\n')
+        self.assertEqual(second.stdout, first.stdout)
+        self.assertEqual(second.stderr, '')
+        self.assertEqual(engine.worker_pids(), pids)
+
+        process = engine.popen(['yt-dlp', '--ignore-config', '--no-such-option'])
+        output = ''.join(process.stdout)
+        self.assertEqual(process.wait(), 2)
+        self.assertIn('yt-dlp: error: no such option: --no-such-option', output)
+
+        with self.assertRaises(subprocess.TimeoutExpired):
+            engine.run(['yt-dlp', '--ignore-config', '--version'], timeout=0)
+        self.assertEqual(engine.worker_pids(), [])
+
+    @unittest.skipUnless(importlib.util.find_spec('yt_dlp'), '需要安装 yt-dlp')
+    def test_embedded_engine_forwards_fd_output_of_child_processes(self):
+        engine = ytdlp_engine.YtDlpEngine(idle_workers=1)
+        self.addCleanup(engine.close)
+
+        with tempfile.TemporaryDirectory() as root:
+            info_path = Path(root) / 'video.info.json'
+            info_path.write_text(
+                json.dumps({
+                    'id': 'abc123',
+                    'title': 'fd',
+                    'extractor': 'generic',
+                    'extractor_key': 'Generic',
+                    'webpage_url': 'https://example.com/watch/abc123',
+                    'formats': [{
+                        'format_id': '18',
+                        'url': 'https://example.com/abc123.mp4',
+                        'ext': 'mp4',
+                    }],
+                }),
+                encoding='utf-8',
+            )
+            # --exec 的 shell 命令直接继承 worker 的 fd 1/2，与 ffmpeg 相同
+            cmd = [
+                'yt-dlp', '--ignore-config', '--load-info-json', str(info_path),
+                '--skip-download', '-o', str(Path(root) / '%(id)s.%(ext)s'),
+                '--exec', 'before_dl:echo fd-stdout; echo fd-stderr >&2; true',
+            ]
+
+            process = engine.popen(cmd)
+            output = ''.join(process.stdout)
+            result = engine.run(cmd, timeout=60)
+
+        self.assertEqual(process.wait(), 0)
+        self.assertIn('fd-stdout\n', output)
+        self.assertIn('fd-stderr\n', output)
+        self.assertIn('fd-stdout\n', result.stdout)
+        self.assertIn('fd-stderr\n', result.stderr)
+
+    def test_worker_count_is_capped(self):
+        workers = []
+
+        def start_worker():
+            worker = MagicMock(tasks=0)
+            worker.alive.return_value = True
+            workers.append(worker)
+            return worker
+
+        engine = ytdlp_engine.YtDlpEngine(idle_workers=0, max_workers=2)
+
+        with patch('ytdlp_engine._Worker', side_effect=start_worker):
+            first = engine.acquire()
+            second = engine.acquire()
+            with self.assertRaises(ytdlp_engine.queue.Empty):
+                engine.acquire(timeout=0.05)
+            with self.assertRaises(subprocess.TimeoutExpired):
+                engine.run(['yt-dlp', '--version'], timeout=0.05)
+            # 归还（即使因空闲数为 0 而关闭）后腾出名额
+            engine.release(first, True)
+            third = engine.acquire(timeout=1)
+
+        self.assertEqual(len(workers), 3)
+        first.close.assert_called_once_with()
+        engine.release(second, False)
+        engine.release(third, True)
+        self.assertEqual(engine._workers, 0)
+        self.assertEqual(ytdlp_engine.max_worker_count({'MAX_WORKERS': 6}), 6)
+        self.assertEqual(ytdlp_engine.max_worker_count({}), ytdlp_engine.DEFAULT_MAX_WORKERS)
+
+
+if __name__ == '__main__':
+    unittest.main()
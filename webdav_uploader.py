@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import os
+import sqlite3
 import time
 import re
 from watchdog.observers import Observer
@@ -9,9 +10,11 @@ from webdav3.client import Client
 from bark_util import bark_notify
 import threading
 from config_util import MOVE_STAGING_PREFIX, load_config
+from event_log import EventLog
 from log_util import setup_logger
 import requests
 import pytz
+import task_store
 
 # 加载配置
 config = load_config()
@@ -30,6 +33,71 @@ logger = setup_logger(
     timezone=config.get("TIMEZONE", "UTC")
 )
 
+
+def upload_ledger_path():
+    """返回 downloader 维护的任务台账路径；台账尚不存在或不可用时返回 None。"""
+    if not os.path.exists(task_store.ledger_path(config["URLS_DIR"])):
+        return None
+    try:
+        return task_store.open_ledger(config["URLS_DIR"])
+    except (OSError, sqlite3.Error, RuntimeError) as exc:
+        logger.warning(f"打开任务台账失败: {exc}")
+        return None
+
+
+def find_upload_task(filename):
+    """按任务台账记录的产物文件名找到上传文件所属的任务 ID；找不到时返回 None。"""
+    db_path = upload_ledger_path()
+    if not db_path:
+        return None
+    try:
+        return task_store.find_task_by_result_file(db_path, filename)
+    except sqlite3.Error as exc:
+        logger.warning(f"查询上传文件所属任务失败: {filename} ({exc})")
+        return None
+
+
+def prune_event_index(segments):
+    """事件日志轮转删除分段后，同步删除任务台账中指向这些分段的索引。"""
+    db_path = upload_ledger_path()
+    if not db_path:
+        return
+    try:
+        task_store.prune_task_events(db_path, segments)
+    except sqlite3.Error as exc:
+        logger.warning(f"清理任务事件索引失败: {exc}")
+
+
+# 结构化事件日志：记录每个文件的上传结果、字节数与耗时
+event_log = EventLog(
+    config["LOG_DIR"],
+    'uploader',
+    config["MAX_LOG_SIZE"],
+    config["BACKUP_COUNT"],
+    on_prune=prune_event_index,
+)
+
+
+def emit_event(event, task_id=None, **fields):
+    """写入结构化上传事件；属于某个任务时把事件位置登记到任务台账。
+
+    写入失败只记录警告，不影响上传流程。
+    """
+    try:
+        segment, offset = event_log.emit(event, task_id, **fields)
+    except OSError as exc:
+        logger.warning(f"写入事件日志失败: {event} ({exc})")
+        return
+    if not task_id:
+        return
+    db_path = upload_ledger_path()
+    if not db_path:
+        return
+    try:
+        task_store.add_task_event(db_path, task_id, event, segment, offset)
+    except sqlite3.Error as exc:
+        logger.warning(f"登记任务事件失败: {task_id} {event} ({exc})")
+
 # 初始化WebDAV客户端（分别为视频和音频）
 video_webdav = None
 audio_webdav = None
@@ -350,6 +418,16 @@ class WebDAVUploadHandler(FileSystemEventHandler):
             speed = file_size_mb / elapsed if elapsed > 0 else 0
 
             logger.info(f"上传完成: {remote_path}，耗时: {elapsed:.2f} 秒，平均速度: {speed:.2f} MB/s | 类型: {category} | 服务器: {webdav_host}")
+            emit_event(
+                'uploaded',
+                find_upload_task(original_filename),
+                file=original_filename,
+                remote_path=remote_path,
+                category=category,
+                bytes=file_size,
+                seconds=round(elapsed, 3),
+                bytes_per_second=file_size / elapsed if elapsed > 0 else 0.0,
+            )
             bark_notify(
                 config['BARK_DEVICE_TOKEN'],
                 title=f"上传完成{file_size_mb:.2f} MB [{category}] [{webdav_host}]",
@@ -381,6 +459,15 @@ class WebDAVUploadHandler(FileSystemEventHandler):
                         content=f"文件 {os.path.basename(file_path)} 上传失败，已达到最大重试次数"
                     )
                     retry_count.pop(file_path, None)
+            emit_event(
+                'upload_failed',
+                find_upload_task(original_filename),
+                file=original_filename,
+                category=category,
+                attempt=count,
+                final=count >= UPLOAD_MAX_RETRIES,
+                error=str(e),
+            )
 
 def cleanup_expired_files(directory, days):
     """
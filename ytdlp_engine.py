@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+"""yt-dlp 执行引擎：每次启动子进程，或在常驻 worker 进程内直接调用 yt_dlp。
+
+默认的 subprocess 模式与以往完全一致。embedded 模式下，worker 进程只在
+启动时导入一次 yt_dlp 与全部提取器，之后逐个执行命令行参数；输出按行
+回传，调用方拿到的 CompletedProcess / Popen 兼容对象与子进程模式相同，
+因此 --progress-template 进度行、--dump-single-json 等解析逻辑无需改动。
+"""
+
+import atexit
+import codecs
+import io
+import json
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+
+ENGINE_SUBPROCESS = 'subprocess'
+ENGINE_EMBEDDED = 'embedded'
+# 最多保留的空闲常驻进程数。
+DEFAULT_IDLE_WORKERS = 2
+# 同时存在的常驻进程上限（空闲与执行中合计），默认与下载线程数 MAX_WORKERS 一致；
+# 达到上限时新命令等待空闲进程，而不是继续启动新进程。
+DEFAULT_MAX_WORKERS = 4
+# 单个 worker 执行的命令数上限，超出后重建，避免 yt-dlp 全局状态或内存持续累积。
+WORKER_MAX_TASKS = 50
+WORKER_SHUTDOWN_TIMEOUT_SECONDS = 2
+YT_DLP_EXECUTABLE = 'yt-dlp'
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def engine_mode(config):
+    mode = str(config.get('YT_DLP_ENGINE') or ENGINE_SUBPROCESS).strip().lower()
+    return ENGINE_EMBEDDED if mode == ENGINE_EMBEDDED else ENGINE_SUBPROCESS
+
+
+def idle_worker_count(config):
+    try:
+        return max(0, int(config.get('YT_DLP_ENGINE_WORKERS', DEFAULT_IDLE_WORKERS)))
+    except (TypeError, ValueError):
+        return DEFAULT_IDLE_WORKERS
+
+
+def max_worker_count(config):
+    try:
+        return max(1, int(config.get('MAX_WORKERS', DEFAULT_MAX_WORKERS)))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_WORKERS
+
+
+def normalize_newlines(text):
+    """与 subprocess 文本模式一致，把 \\r\\n 和 \\r 统一为 \\n。"""
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def split_lines(pending, chunk, final=False):
+    """按通用换行拆分输出，返回 (完整行列表, 剩余未完成部分)。"""
+    text = pending + chunk
+    hold = ''
+    if not final and text.endswith('\r'):
+        # \r 可能是 \r\n 的前半部分，等待下一块再判断
+        text, hold = text[:-1], '\r'
+    parts = normalize_newlines(text).split('\n')
+    lines = [f'{part}\n' for part in parts[:-1]]
+    rest = parts[-1] + hold
+    if final and rest:
+        lines.append(normalize_newlines(rest))
+        rest = ''
+    return lines, rest
+
+
+class _MessageWriter(io.TextIOBase):
+    """worker 进程内替换 sys.stdout/sys.stderr，把输出按块发回父进程。"""
+
+    def __init__(self, send, stream):
+        super().__init__()
+        self.send = send
+        self.stream = stream
+        self.pending = []
+
+    @property
+    def encoding(self):
+        return 'utf-8'
+
+    def isatty(self):
+        return False
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.pending.append(text)
+        if '\n' in text or '\r' in text:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            chunk = ''.join(self.pending)
+            self.pending = []
+            self.send({'stream': self.stream, 'text': chunk})
+
+
+def _run_command(send, argv):
+    import yt_dlp
+
+    stdout = _MessageWriter(send, 'stdout')
+    stderr = _MessageWriter(send, 'stderr')
+    saved = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        try:
+            yt_dlp.main(argv)
+            returncode = 0
+        except SystemExit as exc:
+            returncode = exc.code
+            if returncode is None:
+                returncode = 0
+            elif not isinstance(returncode, int):
+                # 与解释器行为一致：非整数退出值打印到 stderr 并以 1 退出
+                stderr.write(f'{returncode}\n')
+                returncode = 1
+        except Exception:
+            stderr.write(traceback.format_exc())
+            returncode = 1
+        stdout.flush()
+        stderr.flush()
+    finally:
+        sys.stdout, sys.stderr = saved
+    return returncode
+
+
+class _FdForwarder:
+    """worker 进程内接管 fd 1/2，把直接写 fd 的输出（ffmpeg 等子进程、扩展模块）
+    按 stdout/stderr 发回父进程，与子进程模式一样进入任务日志。
+
+    后台线程在输出到达时转发；每条命令结束前调用 drain()，保证命令期间写入的
+    输出先于 exit 消息送达。
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.lock = threading.Lock()
+        self.streams = {}
+        for target_fd, stream in ((1, 'stdout'), (2, 'stderr')):
+            read_fd, write_fd = os.pipe()
+            os.set_blocking(read_fd, False)
+            os.dup2(write_fd, target_fd)
+            os.close(write_fd)
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            self.streams[read_fd] = (stream, decoder)
+        threading.Thread(
+            target=self._forward,
+            name='yt-dlp-engine-fd-forwarder',
+            daemon=True,
+        ).start()
+
+    def _read_available(self, read_fd):
+        stream, decoder = self.streams[read_fd]
+        chunks = []
+        while True:
+            try:
+                data = os.read(read_fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            chunks.append(decoder.decode(data))
+        text = ''.join(chunks)
+        if text:
+            self.send({'stream': stream, 'text': text})
+
+    def _forward(self):
+        while True:
+            readable, _, _ = select.select(list(self.streams), [], [])
+            with self.lock:
+                for read_fd in readable:
+                    self._read_available(read_fd)
+
+    def drain(self):
+        with self.lock:
+            for read_fd in self.streams:
+                self._read_available(read_fd)
+
+
+def worker_main():
+    """worker 进程入口：预先导入全部提取器，然后逐行读取命令并执行。
+
+    协议走进程原本的 stdin/stdout，每行一个 JSON；fd 1/2 改为管道并由
+    _FdForwarder 转发，防止扩展模块或子进程直接写 fd 破坏协议或绕过任务日志。
+    """
+    protocol = os.fdopen(os.dup(1), 'w', encoding='utf-8', buffering=1)
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            protocol.write(json.dumps(message, ensure_ascii=False) + '\n')
+            protocol.flush()
+
+    forwarder = _FdForwarder(send)
+
+    # 帮助与错误信息中的程序名与命令行版本保持一致
+    sys.argv[0] = YT_DLP_EXECUTABLE
+
+    import yt_dlp  # noqa: F401
+    from yt_dlp.extractor import gen_extractor_classes
+    from yt_dlp.globals import plugin_dirs
+    from yt_dlp.plugins import load_all_plugins
+
+    gen_extractor_classes()
+    # 插件（如 PO Token provider）只能注册一次；启动时按默认目录加载后，
+    # 关闭 yt_dlp.main 每次调用时的重复加载，已注册的插件保持有效。
+    plugin_dirs.value = ['default']
+    load_all_plugins()
+    os.environ['YTDLP_NO_PLUGINS'] = '1'
+    forwarder.drain()
+    send({'ready': True})
+    for line in sys.stdin:
+        try:
+            argv = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(argv, list):
+            break
+        returncode = _run_command(send, argv)
+        forwarder.drain()
+        send({'exit': returncode})
+
+
+class _Worker:
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--worker'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            encoding='utf-8',
+            bufsize=1,
+        )
+        self.messages = queue.Queue()
+        self.tasks = 0
+        self.ready = False
+        threading.Thread(
+            target=self._read_messages,
+            name='yt-dlp-engine-reader',
+            daemon=True,
+        ).start()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def _read_messages(self):
+        for line in self.process.stdout:
+            try:
+                self.messages.put(json.loads(line))
+            except ValueError:
+                continue
+        self.messages.put(None)
+
+    def receive(self, timeout=None):
+        """读取下一条消息；超时抛出 queue.Empty，worker 退出抛出 EOFError。"""
+        message = self.messages.get(timeout=timeout)
+        if message is None:
+            self.messages.put(None)
+            raise EOFError('yt-dlp worker 已退出')
+        return message
+
+    def start_command(self, argv):
+        # 就绪前 worker 启动阶段的零散输出不属于任何命令，直接丢弃
+        while not self.ready:
+            self.ready = bool(self.receive().get('ready'))
+        self.tasks += 1
+        self.process.stdin.write(json.dumps(list(argv), ensure_ascii=False) + '\n')
+        self.process.stdin.flush()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(WORKER_SHUTDOWN_TIMEOUT_SECONDS)
+        except subprocess.TimeoutExpired:
+            self.kill()
+
+    def kill(self):
+        self.process.kill()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+
+
+class EmbeddedProcess:
+    """与 subprocess.Popen(stdout=PIPE, stderr=STDOUT, text) 用法兼容的最小接口。"""
+
+    def __init__(self, engine, cmd):
+        self.args = cmd
+        self.returncode = None
+        self._engine = engine
+        self._worker = None
+        self.stdout = self._lines()
+
+    def _lines(self):
+        worker = self._worker = self._engine.acquire()
+        reusable = False
+        pending = ''
+        try:
+            worker.start_command(self.args[1:])
+            while True:
+                message = worker.receive()
+                if 'exit' in message:
+                    self.returncode = message['exit']
+                    reusable = True
+                    break
+                lines, pending = split_lines(pending, message.get('text', ''))
+                yield from lines
+            lines, pending = split_lines(pending, '', final=True)
+            yield from lines
+        except (EOFError, OSError):
+            # worker 意外退出，按被信号终止的子进程处理
+            self.returncode = -9
+        finally:
+            if self.returncode is None:
+                self.returncode = -9
+            self._engine.release(worker, reusable)
+
+    def wait(self, timeout=None):
+        for _line in self.stdout:
+            pass
+        return self.returncode
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        """结束正在执行的命令；对应 worker 随之退出，不再复用。"""
+        if self._worker is not None:
+            self._worker.kill()
+
+
+class YtDlpEngine:
+    """常驻 yt-dlp worker 进程池。
+
+    空闲进程最多保留 idle_workers 个，同时存在的进程（空闲与执行中合计）
+    不超过 max_workers 个；达到上限时 acquire() 等待其他命令归还进程。
+    """
+
+    def __init__(self, idle_workers=DEFAULT_IDLE_WORKERS, max_tasks_per_worker=WORKER_MAX_TASKS,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        self.idle_workers = idle_workers
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_workers = max(1, max_workers)
+        self._idle = []
+        self._workers = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        """取得一个 worker；达到进程上限且 timeout 内没有归还时抛出 queue.Empty。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._available:
+            while True:
+                if self._closed:
+                    raise RuntimeError('yt-dlp 引擎已关闭')
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive():
+                        return worker
+                    worker.kill()
+                    self._workers -= 1
+                if self._workers < self.max_workers:
+                    self._workers += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._available.wait(remaining)
+        try:
+            return _Worker()
+        except BaseException:
+            self._retired()
+            raise
+
+    def _retired(self):
+        with self._available:
+            self._workers -= 1
+            self._available.notify()
+
+    def release(self, worker, reusable):
+        if (
+            reusable
+            and worker.alive()
+            and worker.tasks < self.max_tasks_per_worker
+        ):
+            with self._available:
+                if not self._closed and len(self._idle) < self.idle_workers:
+                    self._idle.append(worker)
+                    self._available.notify()
+                    return
+            worker.close()
+        elif reusable and worker.alive():
+            worker.close()
+        else:
+            worker.kill()
+        self._retired()
+
+    def prestart(self, count=None):
+        """预先启动常驻进程，把首次导入提取器的开销移出任务路径。"""
+        count = self.idle_workers if count is None else count
+        with self._lock:
+            missing = max(0, min(count, self.max_workers) - len(self._idle))
+        workers = []
+        for _ in range(missing):
+            try:
+                workers.append(self.acquire(timeout=0))
+            except queue.Empty:
+                break
+        for worker in workers:
+            self.release(worker, True)
+
+    def worker_pids(self):
+        with self._lock:
+            return [worker.pid for worker in self._idle]
+
+    def popen(self, cmd):
+        return EmbeddedProcess(self, cmd)
+
+    def run(self, cmd, timeout=None, check=False):
+        """执行一次 yt-dlp，返回 text 模式的 CompletedProcess。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            worker = self.acquire(timeout)
+        except queue.Empty:
+            raise subprocess.TimeoutExpired(cmd, timeout) from None
+        reusable = False
+        output = {'stdout': [], 'stderr': []}
+        returncode = None
+        try:
+            worker.start_command(cmd[1:])
+            while returncode is None:
+                remaining = None
+                if deadline is not None:
+                    remaining = max(0, deadline - time.monotonic())
+                try:
+                    message = worker.receive(remaining)
+                except queue.Empty:
+                    raise subprocess.TimeoutExpired(
+                        cmd,
+                        timeout,
+                        output=''.join(output['stdout']),
+                        stderr=''.join(output['stderr']),
+                    ) from None
+                if 'exit' in message:
+                    returncode = message['exit']
+                    reusable = True
+                elif message.get('stream') in output:
+                    output[message['stream']].append(message.get('text', ''))
+        except (EOFError, OSError):
+            returncode = -9
+        finally:
+            self.release(worker, reusable)
+
+        result = subprocess.CompletedProcess(
+            cmd,
+            returncode,
+            normalize_newlines(''.join(output['stdout'])),
+            normalize_newlines(''.join(output['stderr'])),
+        )
+        if check:
+            result.check_returncode()
+        return result
+
+    def close(self):
+        with self._available:
+            self._closed = True
+            workers, self._idle = self._idle, []
+            self._workers -= len(workers)
+            self._available.notify_all()
+        for worker in workers:
+            worker.close()
+
+
+def get_engine(config):
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = YtDlpEngine(
+                idle_workers=idle_worker_count(config),
+                max_workers=max_worker_count(config),
+            )
+            atexit.register(_engine.close)
+        return _engine
+
+
+def _uses_engine(cmd, config):
+    return (
+        engine_mode(config) == ENGINE_EMBEDDED
+        and bool(cmd)
+        and cmd[0] == YT_DLP_EXECUTABLE
+    )
+
+
+def run(cmd, config, **kwargs):
+    """按配置执行 yt-dlp 并捕获输出；kwargs 仅支持 timeout 与 check。"""
+    if _uses_engine(cmd, config):
+        return get_engine(config).run(cmd, **kwargs)
+    return subprocess.run(cmd, capture_output=True, text=True, **kwargs)
+
+
+def popen(cmd, config):
+    """按配置启动 yt-dlp，stdout 合并 stderr 并按行读取。"""
+    if _uses_engine(cmd, config):
+        return get_engine(config).popen(cmd)
+    return subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+        bufsize=1,  # 对应 Popen 的行缓冲
+    )
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--worker']:
+        worker_main()
+    else:
+        sys.exit('用法: ytdlp_engine.py --worker（由 YtDlpEngine 启动）')